@@ -2,10 +2,15 @@
 
 __version__ = "0.6.2"
 
+from rdflib import plugin
+from rdflib.store import Store
+
 from .sparql_router import SparqlRouter
 from .sparql_endpoint import SparqlEndpoint
 from .dataset_ext import DatasetExt
 
+plugin.register("Compact", Store, "rdflib_endpoint.compact_store", "CompactStore")
+
 __all__ = [
     "DatasetExt",
     "SparqlEndpoint",
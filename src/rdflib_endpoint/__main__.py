@@ -1,12 +1,17 @@
-import glob
 import sys
-from typing import List
+import time
+from typing import List, Optional
 
 import click
 import uvicorn
 from rdflib import Dataset
 
 from rdflib_endpoint import SparqlEndpoint
+from rdflib_endpoint.loader import LoadedFile, LoadProgress, expand_files, load_files, load_in_background
+from rdflib_endpoint.mapped_store import INDEX_EXT, MappedStore, write_index
+from rdflib_endpoint.snapshot import dataset_quads, load_with_snapshot
+from rdflib_endpoint.streaming import can_stream, stream_convert
+from rdflib_endpoint.watcher import FileWatcher
 
 
 @click.group()
@@ -18,62 +23,180 @@ def cli() -> None:
 @click.argument("files", nargs=-1)
 @click.option("--host", default="localhost", help="Host of the SPARQL endpoint")
 @click.option("--port", default=8000, help="Port of the SPARQL endpoint")
-@click.option("--store", default="default", help="Store used by RDFLib: default or Oxigraph")
+@click.option("--store", default="default", help="Store used by RDFLib: default, Oxigraph or Compact")
 @click.option("--enable-update", is_flag=True, help="Enable SPARQL updates")
-def serve(files: List[str], host: str, port: int, store: str, enable_update: bool) -> None:
-    run_serve(files, host, port, store, enable_update)
+@click.option("--jobs", "-j", default=1, help="Number of processes used to parse the files concurrently")
+@click.option(
+    "--snapshot-dir",
+    default=None,
+    help="Directory where to store a binary snapshot of the loaded files, used instead of parsing them at next start if they did not change",
+)
+@click.option(
+    "--background",
+    is_flag=True,
+    help="Start the server right away and load the files in the background, SPARQL requests get a 503 until loaded",
+)
+@click.option("--serve-partial", is_flag=True, help="Answer queries on the partially loaded data with --background")
+@click.option(
+    "--watch",
+    is_flag=True,
+    help="Watch the files, and reload only the files that change on disk (tracks 8 bytes per quad)",
+)
+@click.option(
+    "--void",
+    is_flag=True,
+    help="Compute VoID statistics of the data, served in the service description and at .well-known/void under the endpoint path",
+)
+@click.option(
+    "--optimize-joins",
+    is_flag=True,
+    help="Order the triple patterns of queries by their number of results estimated from statistics of the data",
+)
+@click.option(
+    "--memory-budget",
+    default=None,
+    type=int,
+    help="Megabytes of solutions each ORDER BY sorts in memory, beyond which they are sorted in temporary files",
+)
+def serve(
+    files: List[str],
+    host: str,
+    port: int,
+    store: str,
+    enable_update: bool,
+    jobs: int,
+    snapshot_dir: Optional[str],
+    background: bool,
+    serve_partial: bool,
+    watch: bool,
+    void: bool,
+    optimize_joins: bool,
+    memory_budget: Optional[int],
+) -> None:
+    run_serve(
+        files,
+        host,
+        port,
+        store,
+        enable_update,
+        jobs,
+        snapshot_dir,
+        background,
+        serve_partial,
+        watch,
+        void,
+        optimize_joins,
+        memory_budget,
+    )
 
 
-def run_serve(files: List[str], host: str, port: int, store: str = "default", enable_update: bool = False) -> None:
-    if store == "oxigraph":
+def run_serve(
+    files: List[str],
+    host: str,
+    port: int,
+    store: str = "default",
+    enable_update: bool = False,
+    jobs: int = 1,
+    snapshot_dir: Optional[str] = None,
+    background: bool = False,
+    serve_partial: bool = False,
+    watch: bool = False,
+    void: bool = False,
+    optimize_joins: bool = False,
+    memory_budget: Optional[int] = None,
+) -> None:
+    if store in ("oxigraph", "compact"):
         store = store.capitalize()
-    g = Dataset(store=store, default_union=True)
-    for glob_file in files:
-        file_list = glob.glob(glob_file)
-        for file in file_list:
-            g.parse(file)
-            click.echo(
-                click.style("INFO", fg="green")
-                + ":     📥️ Loaded triples from "
-                + click.style(str(file), bold=True)
-                + ", for a total of "
-                + click.style(str(len(g)), bold=True)
-            )
+    files = expand_files(files)
+    if watch:
+        # Watched files are parsed again when they change, they are loaded apart from the other loading modes
+        if background or snapshot_dir:
+            raise click.UsageError("--watch cannot be combined with --background or --snapshot-dir")
+        if any(file.endswith(INDEX_EXT) for file in files):
+            raise click.UsageError(f"--watch cannot be used to serve {INDEX_EXT} index files")
+    if serve_partial and not background:
+        raise click.UsageError("--serve-partial requires --background")
+    if background and any(file.endswith(INDEX_EXT) for file in files):
+        # Index files are memory-mapped at once, there is nothing to load in the background
+        raise click.UsageError(f"--background cannot be used to serve {INDEX_EXT} index files")
+    loading: Optional[LoadProgress] = None
+    watcher: Optional[FileWatcher] = None
+    if watch:
+        g = Dataset(store=store, default_union=True)
+        watcher = FileWatcher(g, files)
+        watcher.load(jobs=jobs, on_loaded=echo_loaded_file)
+    elif background:
+        g = Dataset(store=store, default_union=True)
+        loading = load_in_background(g, files, jobs=jobs, snapshot_dir=snapshot_dir, on_loaded=echo_loaded_file)
+        click.echo(click.style("INFO", fg="green") + f":     ⏳️ Loading {len(files)} files in the background")
+    elif len(files) == 1 and files[0].endswith(INDEX_EXT):
+        # Index files are memory-mapped instead of being loaded
+        g = Dataset(store=MappedStore(files[0]), default_union=True)
+        click.echo(
+            click.style("INFO", fg="green") + ":     🗺️ Memory-mapped index file " + click.style(files[0], bold=True)
+        )
+    elif snapshot_dir:
+        g = Dataset(store=store, default_union=True)
+        if load_with_snapshot(g, files, snapshot_dir, jobs=jobs, on_loaded=echo_loaded_file):
+            click.echo(click.style("INFO", fg="green") + ":     ⚡️ Source files unchanged, loaded from snapshot")
+    else:
+        g = Dataset(store=store, default_union=True)
+        load_files(g, files, jobs=jobs, on_loaded=echo_loaded_file)
+    if not background:
+        echo_total_triples(g)
 
     app = SparqlEndpoint(
         graph=g,
         enable_update=enable_update,
+        loading=loading,
+        serve_partial=serve_partial,
+        watcher=watcher,
+        void_statistics=void,
+        optimize_joins=optimize_joins,
+        memory_budget=memory_budget * 1024 * 1024 if memory_budget is not None else None,
     )
     uvicorn.run(app, host=host, port=port)
 
 
-@cli.command(help="Merge and convert local RDF files to another format easily")
+@cli.command(help=f"Merge and convert local RDF files to another format easily, or to a {INDEX_EXT} index file")
 @click.argument("files", nargs=-1)
 @click.option("--output", default="localhost", help="Host of the SPARQL endpoint")
-@click.option("--store", default="default", help="Store used by RDFLib: default or Oxigraph")
-def convert(files: List[str], output: str, store: str) -> None:
-    run_convert(files, output, store)
-
-
-def run_convert(files: List[str], output: str, store: str = "default") -> None:
-    if store == "oxigraph":
+@click.option("--store", default="default", help="Store used by RDFLib: default, Oxigraph or Compact")
+@click.option("--jobs", "-j", default=1, help="Number of processes used to parse the files concurrently")
+def convert(files: List[str], output: str, store: str, jobs: int) -> None:
+    run_convert(files, output, store, jobs)
+
+
+def run_convert(files: List[str], output: str, store: str = "default", jobs: int = 1) -> None:
+    files = expand_files(files)
+    if can_stream(files, output):
+        # Line-based formats are converted one line at a time, without loading the files in memory
+        start = time.perf_counter()
+        total = stream_convert(files, output, on_converted=echo_loaded_file)
+        seconds = time.perf_counter() - start
+        click.echo(
+            click.style("INFO", fg="green")
+            + ":     🌊️ Streamed a total of "
+            + click.style(f"{total:,}", bold=True)
+            + f" statements in {seconds:.2f}s ({total / seconds if seconds else 0:,.0f} statements/s)"
+        )
+        return
+
+    if store in ("oxigraph", "compact"):
         store = store.capitalize()
     g = Dataset(store=store, default_union=True)
-    for glob_file in files:
-        file_list = glob.glob(glob_file)
-        for file in file_list:
-            g.parse(file)
-            click.echo(
-                click.style("INFO", fg="green")
-                + ":     📥️ Loaded triples from "
-                + click.style(str(file), bold=True)
-                + ", for a total of "
-                + click.style(str(len(g)), bold=True)
-            )
+    load_files(g, files, jobs=jobs, on_loaded=echo_loaded_file)
+    echo_total_triples(g)
+
+    if output.endswith(INDEX_EXT):
+        write_index(output, dataset_quads(g))
+        return
 
     out_format = "ttl"
     if output.endswith(".nt"):
         out_format = "nt"
+    elif output.endswith(".nq"):
+        out_format = "nquads"
     elif output.endswith(".xml") or output.endswith(".rdf"):
         out_format = "xml"
     elif output.endswith(".json") or output.endswith(".jsonld"):
@@ -84,5 +207,29 @@ def run_convert(files: List[str], output: str, store: str = "default") -> None:
     g.serialize(output, format=out_format)
 
 
+def echo_loaded_file(loaded: LoadedFile) -> None:
+    """Report the parsing throughput of a loaded file."""
+    triples = f"{loaded.triples:,} triples" if loaded.triples is not None else "triples"
+    throughput = f"{loaded.mb_per_second:.2f} MB/s"
+    if loaded.triples_per_second is not None:
+        throughput += f", {loaded.triples_per_second:,.0f} triples/s"
+    click.echo(
+        click.style("INFO", fg="green")
+        + f":     📥️ Loaded {triples} from "
+        + click.style(str(loaded.file), bold=True)
+        + f" in {loaded.seconds:.2f}s ({throughput})"
+    )
+
+
+def echo_total_triples(g: Dataset) -> None:
+    """Report the total number of triples loaded."""
+    click.echo(
+        click.style("INFO", fg="green")
+        + ":     📦️ Loaded a total of "
+        + click.style(f"{len(g):,}", bold=True)
+        + " triples"
+    )
+
+
 if __name__ == "__main__":
     sys.exit(cli())
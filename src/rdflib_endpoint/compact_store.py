@@ -0,0 +1,340 @@
+"""Dictionary-encoded in-memory RDFLib store, using a fraction of the memory of the default `Memory` store.
+
+Terms are interned to integer IDs, and quads are stored as sorted permutations of their IDs in arrays of
+unsigned 64-bit integers, searched by bisection:
+
+- `SPOG`, `POSG` and `OSPG` answer triple patterns with any combination of bound terms
+- `GSPO` answers patterns on a named graph where only the graph is bound
+
+Each permutation packs the 4 IDs of a quad in 2 integers: `first << 32 | second` and `third << 32 | fourth`,
+so that a quad costs 16 bytes per permutation, instead of several hundred bytes of nested dictionaries.
+
+The store is optimized for bulk loading and read-mostly workloads: added and removed quads are buffered,
+and merged in the sorted permutations at the next read.
+"""
+
+from __future__ import annotations
+
+import threading
+from array import array
+from bisect import bisect_left, bisect_right
+from typing import Any, Iterator, Sequence, Tuple
+
+from rdflib import Graph, URIRef
+from rdflib.graph import DATASET_DEFAULT_GRAPH_ID
+from rdflib.store import Store
+from rdflib.term import Node
+
+QuadIds = Tuple[int, int, int, int]
+
+_ID_MASK = (1 << 32) - 1
+_PAIR_MASK = (1 << 64) - 1
+
+# Positions of the subject, predicate, object and graph of a quad in each permutation
+_ORDERS = ((0, 1, 2, 3), (1, 2, 0, 3), (2, 0, 1, 3), (3, 0, 1, 2))
+
+
+class _Permutation:
+    """Quads sorted on one order of their positions, stored as 2 parallel arrays of packed IDs."""
+
+    def __init__(self, order: tuple[int, ...], high: Sequence[int] | None = None, low: Sequence[int] | None = None):
+        self.order = order
+        self.inverse = tuple(order.index(position) for position in range(4))
+        self.high = high if high is not None else array("Q")
+        self.low = low if low is not None else array("Q")
+
+    def __len__(self) -> int:
+        return len(self.high)
+
+    def key(self, quad: QuadIds) -> int:
+        """Pack a quad in a single 128-bit integer sorted in the order of this permutation."""
+        first, second, third, fourth = (quad[position] for position in self.order)
+        return (first << 96) | (second << 64) | (third << 32) | fourth
+
+    def quad(self, index: int) -> QuadIds:
+        """Get the quad at an index of the permutation."""
+        high, low = self.high[index], self.low[index]
+        ordered = (high >> 32, high & _ID_MASK, low >> 32, low & _ID_MASK)
+        inverse = self.inverse
+        return ordered[inverse[0]], ordered[inverse[1]], ordered[inverse[2]], ordered[inverse[3]]
+
+    def prefix_length(self, pattern: Sequence[int | None]) -> int:
+        """Number of leading positions of the permutation which are bound in the pattern."""
+        length = 0
+        for position in self.order:
+            if pattern[position] is None:
+                break
+            length += 1
+        return length
+
+    def search(self, prefix: Sequence[int]) -> tuple[int, int]:
+        """Get the range of indexes of the quads starting with the given IDs, in the order of this permutation."""
+        high, low = self.high, self.low
+        if not prefix:
+            return 0, len(high)
+        if len(prefix) == 1:
+            return bisect_left(high, prefix[0] << 32), bisect_left(high, (prefix[0] + 1) << 32)
+        packed = (prefix[0] << 32) | prefix[1]
+        start = bisect_left(high, packed)
+        end = bisect_right(high, packed, start)
+        if len(prefix) == 2:
+            return start, end
+        if len(prefix) == 3:
+            return bisect_left(low, prefix[2] << 32, start, end), bisect_left(low, (prefix[2] + 1) << 32, start, end)
+        packed = (prefix[2] << 32) | prefix[3]
+        start = bisect_left(low, packed, start, end)
+        return start, bisect_right(low, packed, start, end)
+
+    def merge(self, added: list[QuadIds], removed: list[QuadIds]) -> _Permutation:
+        """Get a new permutation with quads added and removed.
+
+        Small changes are spliced in the existing arrays, large changes (e.g. bulk loading) rebuild them with a sort.
+        """
+        changes = sorted([(self.key(quad), True) for quad in added] + [(self.key(quad), False) for quad in removed])
+        if len(changes) > len(self) // 8:
+            removed_keys = {key for key, is_added in changes if not is_added}
+            keys = [(high << 64) | low for high, low in zip(self.high, self.low)]
+            if removed_keys:
+                keys = [key for key in keys if key not in removed_keys]
+            keys.extend(key for key, is_added in changes if is_added)
+            keys.sort()
+            return _Permutation(
+                self.order, array("Q", [key >> 64 for key in keys]), array("Q", [key & _PAIR_MASK for key in keys])
+            )
+
+        new_high, new_low = array("Q"), array("Q")
+        start = 0
+        for key, is_added in changes:
+            high, low = key >> 64, key & _PAIR_MASK
+            high_start = bisect_left(self.high, high, start)
+            index = bisect_left(self.low, low, high_start, bisect_right(self.high, high, high_start))
+            new_high += self.high[start:index]
+            new_low += self.low[start:index]
+            if is_added:
+                new_high.append(high)
+                new_low.append(low)
+                start = index
+            else:
+                start = index + 1
+        new_high += self.high[start:]
+        new_low += self.low[start:]
+        return _Permutation(self.order, new_high, new_low)
+
+
+class CompactStore(Store):
+    """Context-aware in-memory store interning terms to integer IDs, and indexing quads in sorted arrays.
+
+    Use it with `Dataset(store="Compact")`, or `rdflib-endpoint serve --store compact`.
+    """
+
+    context_aware = True
+    formula_aware = False
+    graph_aware = True
+    transaction_aware = False
+
+    def __init__(self, configuration: str | None = None, identifier: Node | None = None):
+        super().__init__(configuration)
+        self.identifier = identifier
+        self._ids: dict[Node, int] = {}
+        self._terms: list[Node] = []
+        self._permutations = tuple(_Permutation(order) for order in _ORDERS)
+        self._added: set[QuadIds] = set()
+        self._removed: set[QuadIds] = set()
+        self._graphs: dict[int, Graph] = {}
+        self._graph_sizes: dict[int, int] = {}
+        self._triples_count: int | None = 0
+        self._lock = threading.RLock()
+        self._namespace: dict[str, URIRef] = {}
+        self._prefix: dict[URIRef, str] = {}
+
+    def add(self, triple: tuple[Node, Node, Node], context: Graph | None, quoted: bool = False) -> None:
+        """Add a triple to a graph of the store."""
+        Store.add(self, triple, context, quoted)
+        with self._lock:
+            subject, predicate, obj = (self._encode(term) for term in triple)
+            quad = (subject, predicate, obj, self._graph_id(context))
+            if quad in self._added:
+                return
+            if quad in self._removed:
+                self._removed.discard(quad)
+            elif self._contains(quad):
+                return
+            else:
+                self._added.add(quad)
+            self._graph_sizes[quad[3]] = self._graph_sizes.get(quad[3], 0) + 1
+            self._triples_count = None
+
+    def remove(
+        self, triple_pattern: tuple[Node | None, Node | None, Node | None], context: Graph | None = None
+    ) -> None:
+        """Remove the triples matching a pattern, from the given graph or from all graphs."""
+        with self._lock:
+            for quad in list(self._match(triple_pattern, context)):
+                self._removed.add(quad)
+                self._graph_sizes[quad[3]] -= 1
+                self._triples_count = None
+
+    def triples(
+        self, triple_pattern: tuple[Node | None, Node | None, Node | None], context: Graph | None = None
+    ) -> Iterator[tuple[tuple[Node, Node, Node], Iterator[Graph]]]:
+        """Iterate over the triples matching a pattern, with the graphs they are part of."""
+        terms = self._terms
+        if context is not None:
+            for subject, predicate, obj, _graph in self._match(triple_pattern, context):
+                yield (terms[subject], terms[predicate], terms[obj]), iter((context,))
+            return
+        # Without context the permutation used ends with the graph, so all graphs of a triple are consecutive
+        graphs = self._graphs
+        previous: tuple[int, int, int] | None = None
+        contexts: list[Graph] = []
+        for subject, predicate, obj, graph in self._match(triple_pattern, None):
+            if previous != (subject, predicate, obj):
+                if previous is not None:
+                    yield (terms[previous[0]], terms[previous[1]], terms[previous[2]]), iter(contexts)
+                previous, contexts = (subject, predicate, obj), []
+            contexts.append(graphs[graph])
+        if previous is not None:
+            yield (terms[previous[0]], terms[previous[1]], terms[previous[2]]), iter(contexts)
+
+    def __len__(self, context: Graph | None = None) -> int:
+        """Number of triples in a graph, or of distinct triples in the store."""
+        if context is not None:
+            graph_id = self._lookup(getattr(context, "identifier", context))
+            return self._graph_sizes.get(graph_id, 0) if graph_id is not None else 0
+        self._flush()
+        with self._lock:
+            if self._triples_count is None:
+                spog = self._permutations[0]
+                high, low = spog.high, spog.low
+                count = 0
+                previous: tuple[int, int] | None = None
+                for i in range(len(high)):
+                    triple = (high[i], low[i] >> 32)
+                    if triple != previous:
+                        count += 1
+                        previous = triple
+                self._triples_count = count
+            return self._triples_count
+
+    def contexts(self, triple: tuple[Node | None, Node | None, Node | None] | None = None) -> Iterator[Graph]:
+        """Iterate over the graphs of the store, or the graphs containing a triple."""
+        if triple is None or triple == (None, None, None):
+            return iter(list(self._graphs.values()))
+        graph_ids = {quad[3] for quad in self._match(triple, None)}
+        return iter([self._graphs[graph_id] for graph_id in graph_ids])
+
+    def add_graph(self, graph: Graph) -> None:
+        """Register a graph, even if it is empty."""
+        with self._lock:
+            self._graph_id(graph)
+
+    def remove_graph(self, graph: Graph) -> None:
+        """Remove a graph and all its triples."""
+        with self._lock:
+            self.remove((None, None, None), graph)
+            graph_id = self._lookup(graph.identifier)
+            if graph_id is not None:
+                self._graphs.pop(graph_id, None)
+                self._graph_sizes.pop(graph_id, None)
+
+    def bind(self, prefix: str, namespace: URIRef, override: bool = True) -> None:
+        bound_namespace = self._namespace.get(prefix)
+        bound_prefix = self._prefix.get(namespace)
+        if bound_prefix is None and bound_namespace is not None:
+            bound_prefix = self._prefix.get(bound_namespace)
+        if override:
+            if bound_prefix is not None:
+                del self._namespace[bound_prefix]
+            if bound_namespace is not None:
+                del self._prefix[bound_namespace]
+            self._prefix[namespace] = prefix
+            self._namespace[prefix] = namespace
+        else:
+            namespace = bound_namespace if bound_namespace is not None else namespace
+            prefix = bound_prefix if bound_prefix is not None else prefix
+            self._prefix[namespace] = prefix
+            self._namespace[prefix] = namespace
+
+    def namespace(self, prefix: str) -> URIRef | None:
+        return self._namespace.get(prefix)
+
+    def prefix(self, namespace: URIRef) -> str | None:
+        return self._prefix.get(namespace)
+
+    def namespaces(self) -> Iterator[tuple[str, URIRef]]:
+        yield from list(self._namespace.items())
+
+    def query(self, *args: Any, **kwargs: Any) -> Any:
+        """Queries are evaluated by the RDFLib SPARQL engine on top of `triples()`."""
+        raise NotImplementedError
+
+    def update(self, *args: Any, **kwargs: Any) -> None:
+        """Updates are evaluated by the RDFLib SPARQL engine on top of `add()` and `remove()`."""
+        raise NotImplementedError
+
+    def _lookup(self, term: Node) -> int | None:
+        """Get the ID of a term, None if it is not in the dictionary."""
+        return self._ids.get(term)
+
+    def _encode(self, term: Node) -> int:
+        """Get the ID of a term, adding it to the dictionary if new."""
+        term_id = self._ids.get(term)
+        if term_id is None:
+            term_id = len(self._terms)
+            if term_id > _ID_MASK:
+                raise ValueError("The compact store cannot hold more than 2^32 distinct terms")
+            self._ids[term] = term_id
+            self._terms.append(term)
+        return term_id
+
+    def _graph_id(self, context: Graph | None) -> int:
+        """Get the ID of a graph, registering it if new. Triples added without graph go to the default graph."""
+        if context is None:
+            context = Graph(store=self, identifier=DATASET_DEFAULT_GRAPH_ID)
+        graph_id = self._encode(context.identifier)
+        if graph_id not in self._graphs:
+            self._graphs[graph_id] = context
+            self._graph_sizes[graph_id] = 0
+        return graph_id
+
+    def _contains(self, quad: QuadIds) -> bool:
+        """Check if a quad is in the sorted permutations, ignoring buffered changes."""
+        start, end = self._permutations[0].search(quad)
+        return start < end
+
+    def _flush(self) -> None:
+        """Merge the buffered added and removed quads in the sorted permutations."""
+        if not self._added and not self._removed:
+            return
+        with self._lock:
+            if not self._added and not self._removed:
+                return
+            added, removed = list(self._added), list(self._removed)
+            self._permutations = tuple(permutation.merge(added, removed) for permutation in self._permutations)
+            self._added, self._removed = set(), set()
+
+    def _match(
+        self, triple_pattern: tuple[Node | None, Node | None, Node | None], context: Graph | None
+    ) -> Iterator[QuadIds]:
+        """Iterate over the IDs of the quads matching a pattern, using the permutation with the longest bound prefix."""
+        pattern: list[int | None] = []
+        for term in (*triple_pattern, None if context is None else getattr(context, "identifier", context)):
+            if term is None:
+                pattern.append(None)
+                continue
+            term_id = self._lookup(term)
+            if term_id is None:
+                return
+            pattern.append(term_id)
+        self._flush()
+        # Iterate on a snapshot of the permutations, so that changes made while iterating are not visible
+        permutation = max(self._permutations, key=lambda permutation: permutation.prefix_length(pattern))
+        prefix_length = permutation.prefix_length(pattern)
+        bound = permutation.order[:prefix_length]
+        start, end = permutation.search([pattern[position] for position in bound])  # type: ignore[misc]
+        filters = [(position, term_id) for position, term_id in enumerate(pattern) if term_id is not None]
+        filters = [(position, term_id) for position, term_id in filters if position not in bound]
+        for index in range(start, end):
+            quad = permutation.quad(index)
+            if all(quad[position] == term_id for position, term_id in filters):
+                yield quad
@@ -0,0 +1,97 @@
+"""Evaluate SPARQL queries concurrently, sharing the evaluation of identical queries received at the same time.
+
+Queries are evaluated in a pool of threads instead of the event loop, so that the endpoint keeps answering other
+requests during long queries. Changes of the dataset (SPARQL updates and reloaded files) wait for the queries being
+evaluated, and new queries wait for the changes, so that queries never see partial changes.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import contextlib
+import threading
+from typing import Any, Awaitable, Callable, Hashable, Iterator
+
+
+class ReadWriteLock:
+    """Lock held by any number of readers at the same time, or by a single writer.
+
+    Writers waiting for the lock go before readers arriving after them, so that a steady flow of queries does not
+    delay updates forever. Background readers (e.g. query jobs) may hold the lock for minutes: while one of them
+    holds it, a waiting writer cannot get it anyway, so new readers are not kept waiting behind the writer.
+    """
+
+    def __init__(self) -> None:
+        self._condition = threading.Condition()
+        self._readers = 0
+        self._background_readers = 0
+        self._writing = False
+        self._waiting_writers = 0
+
+    @contextlib.contextmanager
+    def read(self, background: bool = False) -> Iterator[None]:
+        """Hold the lock with other readers, `background` for the long readers which should not delay the others."""
+        with self._condition:
+            # Background readers always wait for the writers, so that writers still get the lock between jobs
+            while self._writing or (self._waiting_writers and (background or not self._background_readers)):
+                self._condition.wait()
+            self._readers += 1
+            if background:
+                self._background_readers += 1
+        try:
+            yield
+        finally:
+            with self._condition:
+                self._readers -= 1
+                if background:
+                    self._background_readers -= 1
+                if not self._readers:
+                    self._condition.notify_all()
+
+    @contextlib.contextmanager
+    def write(self) -> Iterator[None]:
+        """Hold the lock alone, once the current readers and writers released it."""
+        with self._condition:
+            self._waiting_writers += 1
+            while self._writing or self._readers:
+                self._condition.wait()
+            self._waiting_writers -= 1
+            self._writing = True
+        try:
+            yield
+        finally:
+            with self._condition:
+                self._writing = False
+                self._condition.notify_all()
+
+
+class SingleFlight:
+    """Share the result of a coroutine between the concurrent calls with the same key.
+
+    The first call runs the coroutine in a task, and the calls with the same key made before it completes wait for
+    the same task, instead of running the coroutine again. Cancelling one of the calls does not cancel the task.
+    """
+
+    def __init__(self) -> None:
+        self._flights: dict[Hashable, asyncio.Future[Any]] = {}
+        self.runs = 0
+        """Number of coroutines run."""
+        self.coalesced = 0
+        """Number of calls which waited for the result of a coroutine run by a previous call."""
+
+    async def run(self, key: Hashable, func: Callable[[], Awaitable[Any]]) -> Any:
+        """Get the result of `func`, run once for all the concurrent calls with the same key."""
+        flight = self._flights.get(key)
+        if flight is None:
+            flight = asyncio.ensure_future(func())
+            self._flights[key] = flight
+            self.runs += 1
+
+            def land(_flight: asyncio.Future[Any]) -> None:
+                if self._flights.get(key) is flight:
+                    del self._flights[key]
+
+            flight.add_done_callback(land)
+        else:
+            self.coalesced += 1
+        return await asyncio.shield(flight)
@@ -8,21 +8,64 @@ from __future__ import annotations
 
 import contextlib
 import inspect
+import logging
+import threading
+from contextvars import Context, ContextVar, copy_context
 from dataclasses import asdict, is_dataclass
-from typing import Any, Callable, Generator
+from typing import Any, Callable, Generator, Iterable, Iterator, Mapping
 
-from rdflib import RDF, Dataset, Graph, Literal, Namespace, URIRef, Variable
+from rdflib import RDF, BNode, Dataset, Graph, Literal, Namespace, URIRef, Variable
 from rdflib.plugins.sparql import CUSTOM_EVALS
 from rdflib.plugins.sparql.evaluate import evalBGP, evalPart
 from rdflib.plugins.sparql.evalutils import _eval
 from rdflib.plugins.sparql.parserutils import CompValue
-from rdflib.plugins.sparql.sparql import FrozenBindings, QueryContext, SPARQLError
+from rdflib.plugins.sparql.sparql import AlreadyBound, FrozenBindings, QueryContext, SPARQLError
 from rdflib.term import Identifier
 
+from rdflib_endpoint.function_guard import FunctionGuard
 from rdflib_endpoint.gen_docs import CustomFunction, generate_docs, snake_to_camel, snake_to_pascal
 
 DEFAULT_NAMESPACE = Namespace("urn:sparql-function:")
 
+_active_custom_evals: ContextVar[tuple[dict[str, Callable[..., Any]], ...]] = ContextVar(
+    "rdflib_endpoint_custom_evals", default=()
+)
+
+
+@contextlib.contextmanager
+def scoped_custom_evals(custom_evals: dict[str, Callable[..., Any]]) -> Iterator[None]:
+    """Activate custom evaluation functions only for the queries evaluated within this context.
+
+    Nested contexts are tried first, e.g. the functions of a DatasetExt before the ones of the router querying it.
+    """
+    _install_scoped_custom_evals()
+    token = _active_custom_evals.set((custom_evals, *_active_custom_evals.get()))
+    try:
+        yield
+    finally:
+        _active_custom_evals.reset(token)
+
+
+def _eval_scoped_custom_evals(ctx: QueryContext, part: CompValue) -> Any:
+    """Dispatch to the custom evaluation functions active in the current context.
+
+    This is the only function registered in the process-global rdflib `CUSTOM_EVALS`, so that functions do not
+    leak across datasets and routers, and each query only pays dispatch for the functions it is evaluated with.
+    The functions are not looked up on `ctx.dataset`, which rdflib replaces for queries with `FROM` clauses.
+    """
+    for custom_evals in _active_custom_evals.get():
+        for eval_func in custom_evals.values():
+            try:
+                return eval_func(ctx, part)
+            except NotImplementedError:
+                pass
+    raise NotImplementedError()
+
+
+def _install_scoped_custom_evals() -> None:
+    """Register the scoped custom evaluation dispatcher in rdflib, once per process."""
+    CUSTOM_EVALS.setdefault("rdflib_endpoint", _eval_scoped_custom_evals)
+
 
 def _to_node(value: Any) -> Identifier:
     """Convert Python value to RDF node."""
@@ -44,6 +87,41 @@ def _to_python(value: Any) -> Any:
     return value
 
 
+def _normalize_results(result: Any) -> list[Any]:
+    """Normalize the value returned by a custom function to a list of results."""
+    if inspect.isgenerator(result):
+        return list(result)
+    if isinstance(result, list):
+        return result
+    return [result]
+
+
+def _iter_results(result: Any, on_error: Callable[[Exception], None]) -> Iterator[Any]:
+    """Iterate over the value returned by a custom function, generators are consumed as the results are used.
+
+    Errors raised while generating the results are passed to `on_error`, and end the results if it returns.
+    """
+    if not inspect.isgenerator(result):
+        yield from result if isinstance(result, list) else [result]
+        return
+    while True:
+        try:
+            res = next(result)
+        except StopIteration:
+            return
+        except Exception as exc:
+            on_error(exc)
+            return
+        yield res
+
+
+def _raise_sparql_error(exc: Exception) -> None:
+    """Raise an error of a custom function as a SPARQL error."""
+    if isinstance(exc, SPARQLError):
+        raise exc
+    raise SPARQLError(str(exc)) from exc
+
+
 def _get_expr_args(expr: Any) -> list[Any]:
     """Extract arguments from a SPARQL expression object."""
     if hasattr(expr, "expr"):
@@ -66,16 +144,65 @@ def _func_name(func: Callable[..., Any]) -> str:
     return getattr(func, "__name__", repr(func))
 
 
+def _triples_vars(triples: list[tuple[Identifier, Identifier, Identifier]]) -> set[Identifier]:
+    """Get the variables (and blank nodes, which act as variables in a BGP) used in a list of triples."""
+    return {node for triple in triples for node in triple if isinstance(node, (Variable, BNode))}
+
+
+def _prefer_function_first(
+    ctx: QueryContext,
+    input_nodes: list[Identifier],
+    output_nodes: list[Identifier],
+    other_vars: set[Identifier],
+    cardinality: int | None,
+) -> bool:
+    """Decide if a function should be called before evaluating the rest of its BGP (bind join).
+
+    The function can only be called first when none of its inputs are produced by the other triples of the BGP.
+    It is then worth it when its outputs join into the other triples (they are pushed down into `evalBGP`),
+    or when the registration-time `cardinality` hint says it returns at most one result per call.
+    """
+    if not other_vars:
+        return True
+    if any(ctx[node] is None and node in other_vars for node in input_nodes):
+        return False
+    if any(node in other_vars for node in output_nodes):
+        return True
+    return cardinality is not None and cardinality <= 1
+
+
+def _push_bindings(ctx: QueryContext, bindings: Mapping[Identifier, Identifier]) -> QueryContext | None:
+    """Push a new query context with the given bindings, returns None if they conflict with the current ones."""
+    child_ctx = ctx.push()
+    try:
+        for var, value in bindings.items():
+            child_ctx[var] = value
+    except AlreadyBound:
+        return None
+    return child_ctx
+
+
 class DatasetExt(Dataset):
     """Dataset with decorator-based custom SPARQL evaluation function registration."""
 
     _tmp_graph_uris: set[Identifier]
     _custom_functions: dict[str, CustomFunction]
+    _reverse_indexes: dict[URIRef, dict[Identifier, list[Identifier]]]
+    _unindexed_subjects: dict[URIRef, list[Identifier]]
+    _reverse_index_lock: threading.Lock
+    _function_guards: dict[str, FunctionGuard]
+    _custom_evals: dict[str, Callable[..., Any]]
 
     def __init__(self, *args: Any, **kwargs: Any) -> None:
         super().__init__(*args, **kwargs)
         self._tmp_graph_uris = set()
         self._custom_functions = {}
+        self._reverse_indexes = {}
+        self._unindexed_subjects = {}
+        self._reverse_index_lock = threading.Lock()
+        self._function_guards = {}
+        self._custom_evals = {}
+        _install_scoped_custom_evals()
 
     def _register_custom_function(
         self,
@@ -93,6 +220,58 @@ class DatasetExt(Dataset):
         """Return custom functions registered via DatasetExt decorators."""
         return [meta.func for meta in self._custom_functions.values()]
 
+    def _add_function_guard(
+        self,
+        func: Callable[..., Any],
+        timeout: float | None,
+        max_concurrency: int | None,
+        failure_threshold: int | None,
+        cooldown: float,
+    ) -> FunctionGuard:
+        """Create the guard protecting the calls to a decorated function."""
+        guard = FunctionGuard(_func_name(func), timeout, max_concurrency, failure_threshold, cooldown)
+        self._function_guards[_func_name(func)] = guard
+        return guard
+
+    def get_function_stats(self) -> dict[str, dict[str, Any]]:
+        """Return the call counters and circuit breaker state of each custom function."""
+        return {name: guard.stats() for name, guard in self._function_guards.items()}
+
+    def _get_reverse_index(
+        self,
+        predicate_iri: URIRef,
+        func: Callable[..., Any],
+        guard: FunctionGuard,
+        subjects: Iterable[Any],
+    ) -> dict[Identifier, list[Identifier]]:
+        """Get the object to subjects index of a predicate function, built on first use by calling it on every subject.
+
+        The subjects whose call failed (e.g. timed out, or rejected by the circuit breaker) are indexed again on the
+        next use, so that a transient failure does not leave the index incomplete. The index is built by one query
+        thread at a time.
+        """
+        with self._reverse_index_lock:
+            index = self._reverse_indexes.get(predicate_iri)
+            if index is None:
+                index = self._reverse_indexes[predicate_iri] = {}
+                pending = [_to_node(subject) for subject in subjects]
+            else:
+                pending = self._unindexed_subjects.get(predicate_iri, [])
+            failed = []
+            for subject_node in pending:
+                try:
+                    results = _normalize_results(guard(func, _to_python(subject_node)))
+                except Exception as exc:
+                    logging.error(
+                        f"Error in custom predicate {_func_name(func)}, indexing {subject_node} again later: {exc}"
+                    )
+                    failed.append(subject_node)
+                    continue
+                for res in results:
+                    index.setdefault(_to_node(res), []).append(subject_node)
+            self._unindexed_subjects[predicate_iri] = failed
+        return index
+
     def _register_tmp_graph(self, graph_uri: Identifier) -> None:
         """Register a temporary graph URI for cleanup."""
         self._tmp_graph_uris.add(graph_uri)
@@ -110,7 +289,34 @@ class DatasetExt(Dataset):
 
     def query(self, *args: Any, **kwargs: Any) -> Any:
         try:
-            return super().query(*args, **kwargs)
+            with scoped_custom_evals(self._custom_evals):
+                result = super().query(*args, **kwargs)
+                # SELECT solutions are evaluated as they are read, in the context activating the custom functions
+                context = copy_context()
+        except BaseException:
+            self._cleanup_tmp_graphs()
+            raise
+        bindings = getattr(result, "_genbindings", None)
+        if bindings is None:
+            self._cleanup_tmp_graphs()
+        else:
+            # The temporary graphs are removed once all the solutions are read
+            result.bindings = self._cleanup_tmp_graphs_after(bindings, context)
+        return result
+
+    def update(self, *args: Any, **kwargs: Any) -> None:
+        with scoped_custom_evals(self._custom_evals):
+            super().update(*args, **kwargs)
+
+    def _cleanup_tmp_graphs_after(self, bindings: Iterator[Any], context: Context) -> Generator[Any, None, None]:
+        """Generate the solutions of a query in the given context, and clean up the temporary graphs once they are all generated."""
+        try:
+            while True:
+                try:
+                    solution = context.run(next, bindings)
+                except StopIteration:
+                    return
+                yield solution
         finally:
             self._cleanup_tmp_graphs()
 
@@ -118,19 +324,33 @@ class DatasetExt(Dataset):
         self,
         namespace: Namespace = DEFAULT_NAMESPACE,
         use_subject: bool = False,
+        cardinality: int | None = None,
+        timeout: float | None = None,
+        max_concurrency: int | None = None,
+        failure_threshold: int | None = None,
+        cooldown: float = 30.0,
     ) -> Callable[[Callable[..., Any]], Callable[..., Any]]:
         """Decorator to register a custom triple pattern evaluated by a python function.
 
         The function is selected by a subject typed as the class named after the
         function (PascalCase) in the provided namespace.
 
+        When the function inputs are constants (or already bound), the function is called first and its
+        outputs are pushed into the evaluation of the other triples of the BGP, instead of scanning them unconstrained.
+
         Args:
             namespace: Base namespace used to infer input/output predicate IRIs.
             use_subject: Whether to use the subject of the triple as the first input argument.
+            cardinality: Expected number of results returned by one call of the function, used to choose the evaluation order.
+            timeout: Maximum duration of a function call in seconds.
+            max_concurrency: Maximum number of concurrent calls to the function.
+            failure_threshold: Number of consecutive errors after which calls fail fast for `cooldown` seconds.
+            cooldown: Duration in seconds during which calls fail fast once `failure_threshold` is reached.
         """
         ns_uri_str = str(namespace)
 
         def decorator(func: Callable[..., Any]) -> Callable[..., Any]:
+            guard = self._add_function_guard(func, timeout, max_concurrency, failure_threshold, cooldown)
             # Extract argument predicates from arg names (and defaults)
             arg_predicates: dict[str, URIRef] = {}
             arg_defaults: dict[str, Any] = {}
@@ -199,75 +419,86 @@ class DatasetExt(Dataset):
                     ):
                         output_vars[pred] = obj
 
-                # Get initial bindings from other triples (this chains to other custom evals)
-                initial_bindings = list(evalBGP(ctx, other_triples)) if other_triples else [ctx.solution()]
-
-                # Process our function for each binding
-                for bindings in initial_bindings:
-                    # Extract inputs
-                    inputs: dict[str, Any] = {}
-                    if use_subject and subject_arg_name is not None:
-                        subject_value = (
-                            bindings.get(func_subject) if isinstance(func_subject, Variable) else func_subject
-                        )
-                        if subject_value is None:
+                input_nodes = [obj for _, obj in input_triples]
+                if use_subject:
+                    input_nodes.append(func_subject)
+                if _prefer_function_first(
+                    ctx, input_nodes, list(output_vars.values()), _triples_vars(other_triples), cardinality
+                ):
+                    # Bind join: call the function once, then push its outputs into the other triples
+                    for new_bindings in _call_function(ctx.solution(), func_subject, input_triples, output_vars):
+                        child_ctx = _push_bindings(ctx, new_bindings)
+                        if child_ctx is not None:
+                            yield from evalBGP(child_ctx, other_triples)
+                    return
+
+                # Get initial bindings from other triples, then process our function for each binding
+                for bindings in evalBGP(ctx, other_triples):
+                    for new_bindings in _call_function(bindings, func_subject, input_triples, output_vars):
+                        yield FrozenBindings(ctx, new_bindings)
+
+            def _call_function(
+                bindings: FrozenBindings,
+                func_subject: Identifier,
+                input_triples: list[tuple[str, Identifier]],
+                output_vars: dict[URIRef, Variable],
+            ) -> Generator[dict[Variable, Identifier], None, None]:
+                """Call the function with inputs extracted from the given bindings, and generate the new bindings."""
+                # Extract inputs
+                inputs: dict[str, Any] = {}
+                if use_subject and subject_arg_name is not None:
+                    subject_value = bindings.get(func_subject) if isinstance(func_subject, Variable) else func_subject
+                    if subject_value is None:
+                        return
+                    inputs[subject_arg_name] = _to_python(subject_value)
+                for arg_name, obj in input_triples:
+                    value = bindings.get(obj) if isinstance(obj, Variable) else obj
+                    if value is None:
+                        if arg_name in arg_defaults:
+                            inputs[arg_name] = arg_defaults[arg_name]
                             continue
-                        inputs[subject_arg_name] = _to_python(subject_value)
-                    missing_required = False
-                    for arg_name, obj in input_triples:
-                        value = bindings.get(obj) if isinstance(obj, Variable) else obj
-                        if value is None:
-                            if arg_name in arg_defaults:
-                                inputs[arg_name] = arg_defaults[arg_name]
+                        return
+                    inputs[arg_name] = _to_python(value)
+                # Fill defaults for missing inputs
+                for arg_name, default_value in arg_defaults.items():
+                    if arg_name not in inputs:
+                        inputs[arg_name] = default_value
+                # Skip if missing required inputs
+                if any(arg_name not in inputs for arg_name in arg_predicates):
+                    return
+                # Call the function
+                try:
+                    result = guard(func, **inputs)
+                except Exception as e:
+                    logging.error(f"Error in custom function {_func_name(func)}: {e}")
+                    return
+                # Generators, streamed by the guard, are consumed as the bindings are generated
+                results = _iter_results(
+                    result, lambda e: logging.error(f"Error in custom function {_func_name(func)}: {e}")
+                )
+                results = (asdict(r) if is_dataclass(r) and not isinstance(r, type) else r for r in results)
+
+                # Generate bindings for each result
+                for res in results:
+                    new_bindings: dict[Variable, Identifier] = dict(bindings)
+                    if isinstance(res, dict):
+                        for key, value in res.items():
+                            if isinstance(value, list):
+                                raise SPARQLError(
+                                    "Pattern function list outputs are not supported; return a list of results instead"
+                                )
+                            out_pred = namespace[snake_to_camel(str(key))]
+                            if out_pred not in output_vars:
                                 continue
-                            missing_required = True
-                            break
-                        inputs[arg_name] = _to_python(value)
-                    if missing_required:
-                        continue
-                    # Fill defaults for missing inputs
-                    for arg_name, default_value in arg_defaults.items():
-                        if arg_name not in inputs:
-                            inputs[arg_name] = default_value
-                    # Skip if missing required inputs
-                    if any(arg_name not in inputs for arg_name in arg_predicates):
-                        continue
-                    # Call the function
-                    try:
-                        result = func(**inputs)
-                    except Exception as e:
-                        print(f"Error in custom function {_func_name(func)}: {e}")
-                        continue
-                    # Normalize results to list
-                    if inspect.isgenerator(result):
-                        results = list(result)
-                    elif isinstance(result, list):
-                        results = result
+                            new_bindings[output_vars[out_pred]] = _to_node(value)
                     else:
-                        results = [result]
-                    results = [asdict(r) if is_dataclass(r) and not isinstance(r, type) else r for r in results]
-
-                    # Yield bindings for each result
-                    for res in results:
-                        new_bindings: dict[Variable, Identifier] = dict(bindings)
-                        if isinstance(res, dict):
-                            for key, value in res.items():
-                                if isinstance(value, list):
-                                    raise SPARQLError(
-                                        "Pattern function list outputs are not supported; return a list of results instead"
-                                    )
-                                out_pred = namespace[snake_to_camel(str(key))]
-                                if out_pred not in output_vars:
-                                    continue
-                                new_bindings[output_vars[out_pred]] = _to_node(value)
-                        else:
-                            if len(output_vars) == 1:
-                                out_pred = next(iter(output_vars))
-                                new_bindings[output_vars[out_pred]] = _to_node(res)
-                        yield FrozenBindings(ctx, new_bindings)
+                        if len(output_vars) == 1:
+                            out_pred = next(iter(output_vars))
+                            new_bindings[output_vars[out_pred]] = _to_node(res)
+                    yield new_bindings
 
-            # Register with RDFLib using function name as key
-            CUSTOM_EVALS[f"type_{_func_name(func)}"] = _with_filter_support(custom_eval_func)
+            # Register in the dataset custom evals using function name as key
+            self._custom_evals[f"type_{_func_name(func)}"] = _with_filter_support(custom_eval_func)
             self._register_custom_function(func, "type_function", namespace, class_iri)
             return func
 
@@ -276,6 +507,13 @@ class DatasetExt(Dataset):
     def predicate_function(
         self,
         namespace: Namespace = DEFAULT_NAMESPACE,
+        cardinality: int | None = None,
+        inverse: Callable[[Any], Any] | None = None,
+        index_subjects: Iterable[Any] | None = None,
+        timeout: float | None = None,
+        max_concurrency: int | None = None,
+        failure_threshold: int | None = None,
+        cooldown: float = 30.0,
     ) -> Callable[[Callable[..., Any]], Callable[..., Any]]:
         # ) -> Callable[[Callable[[str], str | list[str]]], Callable[[str], str | list[str]]]:
         """Decorator to register a custom predicate evaluated by a python function.
@@ -283,11 +521,24 @@ class DatasetExt(Dataset):
         The function takes the subject as input and returns the object(s).
         The predicate IRI is generated from the function name (camelCase) + namespace.
 
+        Patterns where only the object is bound (e.g. `?s func:hasLabel "foo"`) are answered with the `inverse`
+        function if provided, otherwise with a reverse index built on first use by calling the function on each
+        of the `index_subjects`.
+
         Args:
             namespace: Base namespace used to infer the predicate IRI. Default to `urn:sparql-function:`
+            cardinality: Expected number of objects returned for one subject, used to choose the evaluation order.
+            inverse: A function taking an object as input and returning the subject(s).
+            index_subjects: The subjects used to build a reverse index when no `inverse` function is provided.
+            timeout: Maximum duration of a function call in seconds.
+            max_concurrency: Maximum number of concurrent calls to the function.
+            failure_threshold: Number of consecutive errors after which calls fail fast for `cooldown` seconds.
+            cooldown: Duration in seconds during which calls fail fast once `failure_threshold` is reached.
         """
+        has_inverse = inverse is not None or index_subjects is not None
 
         def decorator(func: Callable[[str], str | list[str]]) -> Callable[[str], str | list[str]]:
+            guard = self._add_function_guard(func, timeout, max_concurrency, failure_threshold, cooldown)
             # Generate predicate IRI from function name
             predicate_iri = namespace[snake_to_camel(_func_name(func))]
 
@@ -307,47 +558,88 @@ class DatasetExt(Dataset):
                 """Evaluate a custom predicate pattern call."""
                 our_triples = [triple for triple in triples if triple[1] == predicate_iri]
                 other_triples = [triple for triple in triples if triple[1] != predicate_iri]
-                initial_bindings = list(evalBGP(ctx, other_triples)) if other_triples else [ctx.solution()]
-                for bindings in initial_bindings:
-                    binding_candidates: list[FrozenBindings] = [bindings]
-                    for subj, _, obj in our_triples:
-                        next_candidates: list[FrozenBindings] = []
-                        for binding in binding_candidates:
-                            subj_value = binding.get(subj) if isinstance(subj, Variable) else subj
-                            if subj_value is None:
-                                continue
-                            try:
-                                result = func(_to_python(subj_value))
-                            except Exception as exc:
-                                print(f"Error in custom predicate {_func_name(func)}: {exc}")
+                # Triples with only the object bound, or produced by the other triples, are resolved through the
+                # inverse lookup
+                other_vars = _triples_vars(other_triples)
+                input_nodes: list[Identifier] = []
+                output_nodes: list[Identifier] = []
+                for subj, _, obj in our_triples:
+                    if (
+                        has_inverse
+                        and ctx[subj] is None
+                        and (ctx[obj] is not None or (obj in other_vars and subj not in other_vars))
+                    ):
+                        input_nodes.append(obj)
+                        output_nodes.append(subj)
+                    else:
+                        input_nodes.append(subj)
+                        output_nodes.append(obj)
+                if _prefer_function_first(ctx, input_nodes, output_nodes, other_vars, cardinality):
+                    # Bind join: resolve our predicates first, then push the objects into the other triples
+                    for bindings in _call_predicate(ctx, ctx.solution(), our_triples):
+                        child_ctx = _push_bindings(ctx, bindings)
+                        if child_ctx is not None:
+                            yield from evalBGP(child_ctx, other_triples)
+                    return
+
+                for bindings in evalBGP(ctx, other_triples):
+                    yield from _call_predicate(ctx, bindings, our_triples)
+
+            def _call_predicate(
+                ctx: QueryContext,
+                bindings: FrozenBindings,
+                our_triples: list[tuple[Identifier, Identifier, Identifier]],
+            ) -> list[FrozenBindings]:
+                """Call the function for each of our triples, chaining the bindings from one triple to the next."""
+                binding_candidates: list[FrozenBindings] = [bindings]
+                for subj, _, obj in our_triples:
+                    next_candidates: list[FrozenBindings] = []
+                    for binding in binding_candidates:
+                        subj_value = binding.get(subj) if isinstance(subj, Variable) else subj
+                        if subj_value is None:
+                            obj_value = binding.get(obj) if isinstance(obj, Variable) else obj
+                            if obj_value is None or not has_inverse:
                                 continue
+                            for subj_node in _lookup_subjects(obj_value):
+                                new_bindings = dict(binding)
+                                new_bindings[subj] = subj_node
+                                next_candidates.append(FrozenBindings(ctx, new_bindings))
+                            continue
+                        try:
+                            results = _normalize_results(guard(func, _to_python(subj_value)))
+                        except Exception as exc:
+                            logging.error(f"Error in custom predicate {_func_name(func)}: {exc}")
+                            continue
 
-                            if inspect.isgenerator(result):
-                                results = list(result)
-                            elif isinstance(result, list):
-                                results = result
+                        for res in results:
+                            node = _to_node(res)
+                            if isinstance(obj, Variable):
+                                if obj in binding and binding[obj] != node:
+                                    continue
+                                new_bindings = dict(binding)
+                                new_bindings[obj] = node
+                                next_candidates.append(FrozenBindings(ctx, new_bindings))
                             else:
-                                results = [result]
-
-                            for res in results:
-                                node = _to_node(res)
-                                if isinstance(obj, Variable):
-                                    if obj in binding and binding[obj] != node:
-                                        continue
-                                    new_bindings = dict(binding)
-                                    new_bindings[obj] = node
-                                    next_candidates.append(FrozenBindings(ctx, new_bindings))
-                                else:
-                                    if node == obj:
-                                        next_candidates.append(binding)
-                        binding_candidates = next_candidates
-                        if not binding_candidates:
-                            break
-
-                    yield from binding_candidates
-
-            # Register with RDFLib
-            CUSTOM_EVALS[f"predicate_{_func_name(func)}"] = _with_filter_support(custom_eval_func)
+                                if node == obj:
+                                    next_candidates.append(binding)
+                    binding_candidates = next_candidates
+                    if not binding_candidates:
+                        break
+                return binding_candidates
+
+            def _lookup_subjects(obj_value: Identifier) -> list[Identifier]:
+                """Get the subjects for a given object, using the inverse function or the reverse index."""
+                if inverse is None:
+                    return self._get_reverse_index(predicate_iri, func, guard, index_subjects or []).get(obj_value, [])
+                try:
+                    results = _normalize_results(guard(inverse, _to_python(obj_value)))
+                except Exception as exc:
+                    logging.error(f"Error in custom predicate inverse {_func_name(inverse)}: {exc}")
+                    return []
+                return [_to_node(res) for res in results]
+
+            # Register in the dataset custom evals
+            self._custom_evals[f"predicate_{_func_name(func)}"] = _with_filter_support(custom_eval_func)
             self._register_custom_function(func, "predicate_function", namespace, predicate_iri)
             return func
 
@@ -356,6 +648,10 @@ class DatasetExt(Dataset):
     def extension_function(
         self,
         namespace: Namespace = DEFAULT_NAMESPACE,
+        timeout: float | None = None,
+        max_concurrency: int | None = None,
+        failure_threshold: int | None = None,
+        cooldown: float = 30.0,
     ) -> Callable[[Callable[..., Any]], Callable[..., Any]]:
         """Decorator to register a custom [SPARQL extension function](https://www.w3.org/TR/sparql12-query/#extensionFunctions).
 
@@ -364,20 +660,27 @@ class DatasetExt(Dataset):
 
         Args:
             namespace: Base namespace used to infer the function IRI.
+            timeout: Maximum duration of a function call in seconds.
+            max_concurrency: Maximum number of concurrent calls to the function.
+            failure_threshold: Number of consecutive errors after which calls fail fast for `cooldown` seconds.
+            cooldown: Duration in seconds during which calls fail fast once `failure_threshold` is reached.
         """
 
         def decorator(func: Callable[..., Any]) -> Callable[..., Any]:
+            guard = self._add_function_guard(func, timeout, max_concurrency, failure_threshold, cooldown)
             iri_value = namespace[snake_to_camel(_func_name(func))]
 
-            def _eval_extension_function(ctx: QueryContext, part: CompValue) -> list[Any]:
+            def _eval_extension_function(ctx: QueryContext, part: CompValue) -> Iterator[FrozenBindings]:
                 """Evaluate a custom extension function call."""
                 if part.name != "Extend":
                     raise NotImplementedError()
                 if not (hasattr(part.expr, "iri") and part.expr.iri == iri_value):
                     raise NotImplementedError()
+                return _extension_function_results(ctx, part)
 
+            def _extension_function_results(ctx: QueryContext, part: CompValue) -> Iterator[FrozenBindings]:
+                """Generate the solutions of a custom extension function call, without keeping them in memory."""
                 expr_args = _get_expr_args(part.expr)
-                query_results: list[Any] = []
                 for eval_part in evalPart(ctx, part.p):
                     eval_ctx = eval_part.forget(ctx, _except=part._vars)
                     args = []
@@ -388,19 +691,12 @@ class DatasetExt(Dataset):
                         args.append(_to_python(arg_value))
 
                     try:
-                        result = func(*args)
+                        result = guard(func, *args)
                     except Exception as exc:
                         raise SPARQLError(str(exc)) from exc
 
-                    # Normalize results to list
-                    if inspect.isgenerator(result):
-                        results = list(result)
-                    elif isinstance(result, list):
-                        results = result
-                    else:
-                        results = [result]
-
-                    for res in results:
+                    # Generators, streamed by the guard, are consumed as the solutions are generated
+                    for res in _iter_results(result, _raise_sparql_error):
                         if is_dataclass(res) and not isinstance(res, type):
                             res_dict = asdict(res)
                             if not res_dict:
@@ -415,12 +711,11 @@ class DatasetExt(Dataset):
                                     continue
                                 var_name = f"{base_label}{snake_to_pascal(field_name)}"
                                 bindings[Variable(var_name)] = _to_node(field_value)
-                            query_results.append(eval_part.merge(bindings))
+                            yield eval_part.merge(bindings)
                         else:
-                            query_results.append(eval_part.merge({part.var: _to_node(res)}))
-                return query_results
+                            yield eval_part.merge({part.var: _to_node(res)})
 
-            CUSTOM_EVALS[str(iri_value)] = _with_filter_support(_eval_extension_function)
+            self._custom_evals[str(iri_value)] = _with_filter_support(_eval_extension_function)
             self._register_custom_function(func, "extension_function", namespace, iri_value)
             return func
 
@@ -429,6 +724,10 @@ class DatasetExt(Dataset):
     def graph_function(
         self,
         namespace: Namespace = DEFAULT_NAMESPACE,
+        timeout: float | None = None,
+        max_concurrency: int | None = None,
+        failure_threshold: int | None = None,
+        cooldown: float = 30.0,
     ) -> Callable[[Callable[..., Any]], Callable[..., Any]]:
         """Decorator to register a custom graph-producing SPARQL extension function.
 
@@ -437,9 +736,14 @@ class DatasetExt(Dataset):
 
         Args:
             namespace: Base namespace used to infer the function and graph IRIs.
+            timeout: Maximum duration of a function call in seconds.
+            max_concurrency: Maximum number of concurrent calls to the function.
+            failure_threshold: Number of consecutive errors after which calls fail fast for `cooldown` seconds.
+            cooldown: Duration in seconds during which calls fail fast once `failure_threshold` is reached.
         """
 
         def decorator(func: Callable[..., Any]) -> Callable[..., Any]:
+            guard = self._add_function_guard(func, timeout, max_concurrency, failure_threshold, cooldown)
             iri_value = namespace[snake_to_camel(_func_name(func))]
             graph_uri = namespace[f"graph/{_func_name(func)}"]
 
@@ -462,7 +766,7 @@ class DatasetExt(Dataset):
                         args.append(_to_python(arg_value))
 
                     try:
-                        added_graph: Graph = func(*args)
+                        added_graph: Graph = guard(func, *args)
                     except Exception as exc:
                         raise SPARQLError(str(exc)) from exc
 
@@ -476,7 +780,7 @@ class DatasetExt(Dataset):
                     query_results.append(eval_part.merge({part.var: _to_node(graph_uri)}))
                 return query_results
 
-            CUSTOM_EVALS[str(iri_value)] = _with_filter_support(_eval_graph_function)
+            self._custom_evals[str(iri_value)] = _with_filter_support(_eval_graph_function)
             self._register_custom_function(func, "graph_function", namespace, iri_value)
             return func
 
@@ -568,13 +872,23 @@ def _with_filter_support(eval_func: Callable[..., Any]) -> Callable[..., Any]:
         first_results = eval_func(first_ctx, part.p)  # raises NotImplementedError if not handled
         if len(binding_sets) == 1:
             return first_results
-        # Multiple binding sets (OR): collect all results
-        all_results = list(first_results)
-        for binding_set in binding_sets[1:]:
-            child_ctx = ctx.push()
-            for var, val in binding_set.items():
-                child_ctx[var] = val
-            all_results.extend(eval_func(child_ctx, part.p))
-        return iter(all_results)
+        # Multiple binding sets (OR): chain the results, evaluated one binding set after the other
+        return _chain_binding_sets(eval_func, ctx, part, first_results, binding_sets[1:])
 
     return wrapper
+
+
+def _chain_binding_sets(
+    eval_func: Callable[..., Any],
+    ctx: QueryContext,
+    part: CompValue,
+    first_results: Iterable[Any],
+    binding_sets: list[dict[Variable, Identifier]],
+) -> Iterator[Any]:
+    """Generate the results of a Filter part for each of its equality binding sets, without keeping them in memory."""
+    yield from first_results
+    for binding_set in binding_sets:
+        child_ctx = ctx.push()
+        for var, val in binding_set.items():
+            child_ctx[var] = val
+        yield from eval_func(child_ctx, part.p)
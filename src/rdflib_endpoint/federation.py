@@ -0,0 +1,781 @@
+"""Send the SERVICE clauses of federated queries to remote SPARQL endpoints with a pooled HTTP client.
+
+RDFLib sends each SERVICE sub-query with `urllib`, opening a new connection for each call, and waits for each
+response before evaluating the next SERVICE clause. The `Federation` keeps the connections to the remote endpoints
+alive in a pool, limits the number of concurrent requests and the time spent waiting for each remote endpoint,
+and parses the bindings of the JSON results as they are received.
+
+SERVICE clauses joined or united with each other do not depend on each other's results, so their requests are sent
+concurrently, and their results are joined in Python.
+
+A SERVICE clause joined with local solutions depending on them (a bind join) is not sent once for each local
+solution: the values of the local solutions are sent by batches in a VALUES clause, along with the index of their
+VALUES row, so that each result is only joined with the local solutions it was computed for.
+
+SERVICE clauses calling the endpoint itself are replaced by their graph pattern, evaluated in-process on the graph of
+the endpoint, without sending a request to itself and serializing the results.
+
+The responses of remote endpoints can be kept in a `ServiceCache`, so that the same sub-queries sent again to the
+same endpoint, e.g. by dashboards refreshing their federated queries, are answered without calling the endpoint.
+"""
+
+from __future__ import annotations
+
+import codecs
+import collections
+import concurrent.futures
+import contextlib
+import hashlib
+import json
+import logging
+import os
+import re
+import threading
+import time
+from functools import reduce
+from typing import Any, Dict, Iterable, Iterator
+from urllib.parse import SplitResult, urlsplit
+
+from pyparsing import ParseResults, original_text_for
+from rdflib import BNode, Literal, URIRef, Variable
+from rdflib.plugins.sparql import parser
+from rdflib.plugins.sparql.algebra import (
+    _addVars,
+    _traverseAgg,
+    analyse,
+    simplify,
+    translateGroupGraphPattern,
+    translateQuery,
+    traverse,
+)
+from rdflib.plugins.sparql.evaluate import evalPart
+from rdflib.plugins.sparql.parserutils import CompValue
+from rdflib.plugins.sparql.sparql import AlreadyBound, FrozenBindings, Query, QueryContext, SPARQLError
+from rdflib.term import Node
+
+from rdflib_endpoint import __version__
+from rdflib_endpoint.utils import normalize_query
+
+Row = Dict[Variable, Node]
+
+_SERVICE_STRING = re.compile(r"^\s*service\s+(silent\s+)?(?:<([^>]*)>|[?$](\w+))\s*\{(.*)\}\s*$", re.I | re.S)
+_BODY_VARIABLE = re.compile(r"[?$](\w+)")
+_BINDINGS_START = re.compile(r'"bindings"\s*:\s*\[')
+_SEPARATORS = re.compile(r"[\s,]*")
+# Index of the row of the VALUES clause sent with a batch of local solutions, returned with each result
+_VALUES_ROW = Variable("__values_row")
+
+
+class ServiceCache:
+    """Cache of the responses of remote endpoints to SERVICE sub-queries, keyed on the endpoint IRI and the
+    normalized text of the sub-query.
+
+    - `ttl`: number of seconds a response is reused, overridden for specific remote endpoints by the `cache_ttl`
+      setting of the `Federation`, 0 to not cache their responses
+    - `max_bytes`: size of the responses kept in memory, the least recently used responses are evicted beyond it
+    - `directory`: directory where responses are also written, to reuse them after a restart until they expire
+    """
+
+    def __init__(self, ttl: float = 300.0, max_bytes: int = 64 * 1024 * 1024, directory: str | None = None) -> None:
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.directory = directory
+        # Content and expiration time of each response, from the least to the most recently used
+        self._entries: collections.OrderedDict[tuple[str, str], tuple[bytes, float]] = collections.OrderedDict()
+        self._bytes = 0
+        self._stats = {"hits": 0, "disk_hits": 0, "misses": 0, "evictions": 0}
+        self._lock = threading.Lock()
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+            self._remove_expired_files()
+
+    def _path(self, key: tuple[str, str]) -> str:
+        digest = hashlib.sha256("\n".join(key).encode()).hexdigest()
+        return os.path.join(self.directory or "", f"{digest}.json")
+
+    def _read_file(self, key: tuple[str, str]) -> tuple[bytes, float] | None:
+        """Read a response written by this or a previous process, None if it is missing, expired or invalid."""
+        path = self._path(key)
+        try:
+            with open(path, "rb") as f:
+                header = json.loads(f.readline())
+                content = f.read()
+        except (OSError, ValueError):
+            return None
+        if [header.get("endpoint"), header.get("query")] != list(key):
+            return None
+        if header.get("expires", 0) <= time.time():
+            _remove_file(path)
+            return None
+        return content, header["expires"]
+
+    def _write_file(self, key: tuple[str, str], content: bytes, expires: float) -> None:
+        """Atomically write a response with its endpoint, query and expiration time in a JSON header line."""
+        path = self._path(key)
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        try:
+            with open(tmp_path, "wb") as f:
+                f.write(json.dumps({"endpoint": key[0], "query": key[1], "expires": expires}).encode() + b"\n")
+                f.write(content)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            logging.warning(f"Could not write the SERVICE response to the cache directory: {e}")
+            _remove_file(tmp_path)
+
+    def _remove_expired_files(self) -> None:
+        now = time.time()
+        for name in os.listdir(self.directory or ""):
+            path = os.path.join(self.directory or "", name)
+            if name.endswith(".tmp"):
+                _remove_file(path)
+                continue
+            try:
+                with open(path, "rb") as f:
+                    expires = json.loads(f.readline()).get("expires", 0)
+            except (OSError, ValueError, AttributeError):
+                continue
+            if expires <= now:
+                _remove_file(path)
+
+    def _store(self, key: tuple[str, str], content: bytes, expires: float) -> None:
+        """Keep a response in memory, evicting the least recently used ones beyond the memory budget."""
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self._bytes -= len(previous[0])
+            if len(content) > self.max_bytes:
+                return
+            self._entries[key] = (content, expires)
+            self._bytes += len(content)
+            while self._bytes > self.max_bytes:
+                _evicted_key, (evicted, _expires) = self._entries.popitem(last=False)
+                self._bytes -= len(evicted)
+                self._stats["evictions"] += 1
+
+    def get(self, endpoint: str, query: str) -> bytes | None:
+        """Get the cached response of an endpoint to a query, None if it is not cached or expired."""
+        key = (endpoint, normalize_query(query))
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[1] > time.time():
+                self._entries.move_to_end(key)
+                self._stats["hits"] += 1
+                return entry[0]
+            if entry is not None:
+                del self._entries[key]
+                self._bytes -= len(entry[0])
+        entry = self._read_file(key) if self.directory else None
+        if entry is None:
+            with self._lock:
+                self._stats["misses"] += 1
+            return None
+        self._store(key, *entry)
+        with self._lock:
+            self._stats["hits"] += 1
+            self._stats["disk_hits"] += 1
+        return entry[0]
+
+    def put(self, endpoint: str, query: str, content: bytes, ttl: float | None = None) -> None:
+        """Cache the response of an endpoint to a query for `ttl` seconds, or the default TTL of the cache."""
+        ttl = self.ttl if ttl is None else ttl
+        if ttl <= 0:
+            return
+        key = (endpoint, normalize_query(query))
+        expires = time.time() + ttl
+        self._store(key, content, expires)
+        if self.directory:
+            self._write_file(key, content, expires)
+
+    def clear(self) -> None:
+        """Remove all the cached responses, from memory and from the cache directory."""
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+        if self.directory:
+            for name in os.listdir(self.directory):
+                if name.endswith((".json", ".tmp")):
+                    _remove_file(os.path.join(self.directory, name))
+
+    def stats(self) -> dict[str, Any]:
+        """Get the hits, misses and evictions of the cache, its hit rate, and the size of the responses in memory."""
+        with self._lock:
+            lookups = self._stats["hits"] + self._stats["misses"]
+            return {
+                **self._stats,
+                "hit_rate": self._stats["hits"] / lookups if lookups else 0.0,
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+            }
+
+
+def _remove_file(path: str) -> None:
+    with contextlib.suppress(OSError):
+        os.remove(path)
+
+
+class Federation:
+    """Send the SERVICE sub-queries of federated queries to remote SPARQL endpoints.
+
+    - `timeout`: maximum number of seconds to wait for a remote endpoint, to connect or between two received chunks
+    - `max_concurrency`: maximum number of in-flight requests to each remote endpoint, additional requests wait
+      (up to `timeout`) for a slot
+    - `max_connections`: maximum number of connections opened to all the remote endpoints, kept alive between requests
+    - `batch_size`: number of local solutions whose values are sent in the VALUES clause of a single request,
+      when joining them with a SERVICE clause depending on them
+    - `cache`: `ServiceCache` reusing the responses of the remote endpoints to the same sub-queries
+    - `endpoints`: `timeout`, `max_concurrency`, `batch_size` and `cache_ttl` of specific remote endpoints,
+      overriding the defaults, e.g. `{"https://query.wikidata.org/sparql": {"timeout": 60, "cache_ttl": 3600}}`
+
+    Requires the `httpx` package, installed with the `federation` extra.
+    """
+
+    def __init__(
+        self,
+        timeout: float = 30.0,
+        max_concurrency: int = 4,
+        max_connections: int = 20,
+        batch_size: int = 100,
+        cache: ServiceCache | None = None,
+        endpoints: dict[str, dict[str, Any]] | None = None,
+    ) -> None:
+        self.timeout = timeout
+        self.max_concurrency = max_concurrency
+        self.max_connections = max_connections
+        self.batch_size = batch_size
+        self.cache = cache
+        self.endpoints = endpoints or {}
+        self._stats: dict[str, dict[str, int]] = {}
+        self._semaphores: dict[str, threading.BoundedSemaphore] = {}
+        self._lock = threading.Lock()
+        self._client: Any = None
+        self._executor: concurrent.futures.ThreadPoolExecutor | None = None
+
+    def _setting(self, endpoint: str, name: str) -> Any:
+        """Get a setting of a remote endpoint, or its default value."""
+        return self.endpoints.get(endpoint, {}).get(name, getattr(self, name))
+
+    def _cache_ttl(self, endpoint: str) -> float:
+        """Get the number of seconds the responses of a remote endpoint are cached, 0 when they are not."""
+        if self.cache is None:
+            return 0
+        return self.endpoints.get(endpoint, {}).get("cache_ttl", self.cache.ttl)
+
+    def _get_client(self) -> Any:
+        """Get the HTTP client shared by all requests, created on first use."""
+        import httpx  # noqa: PLC0415
+
+        with self._lock:
+            if self._client is None:
+                self._client = httpx.Client(
+                    limits=httpx.Limits(
+                        max_connections=self.max_connections, max_keepalive_connections=self.max_connections
+                    ),
+                    headers={"user-agent": f"rdflib-endpoint/{__version__}"},
+                    follow_redirects=True,
+                )
+            return self._client
+
+    def _get_executor(self) -> concurrent.futures.ThreadPoolExecutor:
+        """Get the thread pool sending concurrent requests, created on first use."""
+        with self._lock:
+            if self._executor is None:
+                self._executor = concurrent.futures.ThreadPoolExecutor(
+                    max_workers=self.max_connections, thread_name_prefix="rdflib-endpoint-federation"
+                )
+            return self._executor
+
+    def _endpoint_state(self, endpoint: str) -> tuple[dict[str, int], threading.BoundedSemaphore]:
+        """Get the counters and concurrency slots of a remote endpoint, created on first request."""
+        with self._lock:
+            if endpoint not in self._stats:
+                self._stats[endpoint] = {
+                    "requests": 0,
+                    "cache_hits": 0,
+                    "errors": 0,
+                    "timeouts": 0,
+                    "rows": 0,
+                    "in_flight": 0,
+                    "max_in_flight": 0,
+                }
+                self._semaphores[endpoint] = threading.BoundedSemaphore(self._setting(endpoint, "max_concurrency"))
+            return self._stats[endpoint], self._semaphores[endpoint]
+
+    def stats(self) -> dict[str, dict[str, int]]:
+        """Get the request counters of each remote endpoint."""
+        with self._lock:
+            return {endpoint: dict(stats) for endpoint, stats in self._stats.items()}
+
+    def query(self, endpoint: str, query: str) -> list[Row]:
+        """Send a SELECT query to a remote endpoint, and get its results, parsed while they are received.
+
+        Responses in the cache are used without calling the remote endpoint, and successful responses are cached.
+        The raw response is only kept when it is put in the cache.
+        """
+        import httpx  # noqa: PLC0415
+
+        stats, semaphore = self._endpoint_state(endpoint)
+        cache_ttl = self._cache_ttl(endpoint)
+        cache = self.cache if cache_ttl > 0 else None
+        if cache is not None:
+            cached_content = cache.get(endpoint, query)
+            if cached_content is not None:
+                # The whole response is there already, no need to parse it incrementally
+                rows = [_parse_row(binding) for binding in json.loads(cached_content)["results"]["bindings"]]
+                with self._lock:
+                    stats["cache_hits"] += 1
+                    stats["rows"] += len(rows)
+                return rows
+        timeout = self._setting(endpoint, "timeout")
+        if not semaphore.acquire(timeout=timeout):
+            with self._lock:
+                stats["errors"] += 1
+            raise SPARQLError(f"Too many concurrent requests to the SERVICE {endpoint}")
+        with self._lock:
+            stats["requests"] += 1
+            stats["in_flight"] += 1
+            stats["max_in_flight"] = max(stats["max_in_flight"], stats["in_flight"])
+        try:
+            headers = {"accept": "application/sparql-results+json"}
+            # GET is easier to cache so prefer it when the query is not too long
+            if len(query) < 600:
+                request = self._get_client().stream(
+                    "GET", endpoint, params={"query": query}, headers=headers, timeout=timeout
+                )
+            else:
+                request = self._get_client().stream(
+                    "POST", endpoint, data={"query": query}, headers=headers, timeout=timeout
+                )
+            chunks: list[bytes] = []
+            with request as response:
+                if response.status_code != 200:
+                    raise SPARQLError(f"SERVICE {endpoint} responded with HTTP {response.status_code}")
+                content = response.iter_bytes()
+                if cache is not None:
+                    # Only the responses put in the cache are kept
+                    content = _keep(content, chunks)
+                rows = [_parse_row(binding) for binding in _iter_json_bindings(content)]
+        except httpx.TimeoutException as e:
+            with self._lock:
+                stats["errors"] += 1
+                stats["timeouts"] += 1
+            raise SPARQLError(f"SERVICE {endpoint} timed out after {timeout}s") from e
+        except Exception:
+            with self._lock:
+                stats["errors"] += 1
+            raise
+        finally:
+            with self._lock:
+                stats["in_flight"] -= 1
+            semaphore.release()
+        with self._lock:
+            stats["rows"] += len(rows)
+        if cache is not None:
+            cache.put(endpoint, query, b"".join(chunks), cache_ttl)
+        return rows
+
+    def fetch(self, endpoint: str, query: str, silent: bool = False) -> list[Row]:
+        """Get the results of a SERVICE sub-query, a single empty solution when a SERVICE SILENT fails."""
+        try:
+            return self.query(endpoint, query)
+        except Exception as e:
+            if not silent:
+                raise
+            logging.warning(f"Ignoring the error of SERVICE SILENT {endpoint}: {e}")
+            return [{}]
+
+    def submit(self, endpoint: str, query: str, silent: bool = False) -> concurrent.futures.Future[list[Row]]:
+        """Get the results of a SERVICE sub-query in the background."""
+        return self._get_executor().submit(self.fetch, endpoint, query, silent)
+
+    def close(self) -> None:
+        """Close the connections to the remote endpoints."""
+        with self._lock:
+            client, executor = self._client, self._executor
+            self._client, self._executor = None, None
+        if executor is not None:
+            executor.shutdown(wait=False)
+        if client is not None:
+            client.close()
+
+
+def _keep(chunks: Iterable[bytes], kept: list[bytes]) -> Iterator[bytes]:
+    """Iterate over the chunks of a response, keeping them in a list."""
+    for chunk in chunks:
+        kept.append(chunk)
+        yield chunk
+
+
+def _iter_json_bindings(chunks: Iterable[bytes]) -> Iterator[dict[str, Any]]:
+    """Parse the bindings of SPARQL JSON results one by one, as the chunks of the response are received."""
+    decoder = json.JSONDecoder()
+    text_decoder = codecs.getincrementaldecoder("utf-8")()
+    chunks = iter(chunks)
+    buffer = ""
+    position = 0
+
+    def read() -> bool:
+        # The parsed part of the buffer is only dropped when a chunk is added, not after each binding
+        nonlocal buffer, position
+        chunk = next(chunks, None)
+        if chunk is None:
+            return False
+        buffer = buffer[position:] + text_decoder.decode(chunk)
+        position = 0
+        return True
+
+    while (match := _BINDINGS_START.search(buffer)) is None:
+        if not read():
+            raise ValueError("No bindings in the SPARQL results of the SERVICE")
+    position = match.end()
+    while True:
+        position = _SEPARATORS.match(buffer, position).end()  # type: ignore[union-attr]
+        if position >= len(buffer):
+            if not read():
+                raise ValueError("Incomplete SPARQL results from the SERVICE")
+            continue
+        if buffer[position] == "]":
+            return
+        try:
+            binding, end = decoder.raw_decode(buffer, position)
+        except json.JSONDecodeError:
+            # The binding is not fully received yet
+            if not read():
+                raise
+            continue
+        yield binding
+        position = end
+
+
+def _parse_term(value: dict[str, str]) -> Node:
+    """Convert a value of SPARQL JSON results to an RDFLib term."""
+    if value["type"] == "uri":
+        return URIRef(value["value"])
+    if value["type"] == "literal":
+        return Literal(value["value"], datatype=value.get("datatype"), lang=value.get("xml:lang"))
+    if value["type"] == "typed-literal":
+        return Literal(value["value"], datatype=URIRef(value["datatype"]))
+    if value["type"] == "bnode":
+        return BNode(value["value"])
+    raise ValueError(f"Invalid type {value['type']!r} in the SPARQL results of the SERVICE")
+
+
+def _parse_row(binding: dict[str, dict[str, str]]) -> Row:
+    return {Variable(var): _parse_term(value) for var, value in binding.items() if value}
+
+
+def prepare_query(query: str, init_ns: dict[str, Any] | None = None) -> Query:
+    """Parse and translate a query like `prepareQuery`, keeping the text of each of its SERVICE clauses.
+
+    RDFLib gives each SERVICE clause the text of the first SERVICE clause of the query.
+    """
+    tree = parser.parseQuery(query)
+    services = [node for node in _parse_tree_nodes(tree) if node.name == "ServiceGraphPattern"]
+    if len(services) > 1:
+        texts = [
+            tokens[0] for tokens, _start, _end in original_text_for(parser.ServiceGraphPattern.expr).scan_string(query)
+        ]
+        if len(texts) == len(services):
+            for service, text in zip(services, texts):
+                service["service_string"] = text
+    return translateQuery(tree, initNs=init_ns)
+
+
+def _parse_tree_nodes(tree: Any) -> Iterator[CompValue]:
+    """Iterate over the nodes of a query parse tree in the order of the query text, without entering SERVICE clauses."""
+    if isinstance(tree, CompValue):
+        yield tree
+        if tree.name == "ServiceGraphPattern":
+            return
+        children: Iterable[Any] = tree.values()
+    elif isinstance(tree, (list, tuple, ParseResults)):
+        children = tree
+    else:
+        return
+    for child in children:
+        yield from _parse_tree_nodes(child)
+
+
+def inline_local_services(parsed_query: Query, endpoint_urls: set[str], path: str) -> int:
+    """Replace the SERVICE clauses calling the endpoint itself by their graph pattern, so that they are evaluated
+    in-process on the default graph of the endpoint, and get the number of replaced clauses.
+
+    A SERVICE clause calls the endpoint when its IRI is one of the `endpoint_urls`, or when the path of its IRI is the
+    `path` of the endpoint, and the IRI is relative (e.g. `SERVICE </sparql>`) or on the host and port of one of the
+    `endpoint_urls` (e.g. `SERVICE <http://localhost:8000/sparql>` for a request sent to `http://localhost:8000/`).
+    Trailing slashes are ignored.
+
+    SERVICE clauses are only replaced when the default graph of the query is the default graph of the endpoint:
+    not in queries with FROM clauses, nor in GRAPH patterns.
+    """
+    if parsed_query.algebra.get("datasetClause"):
+        return 0
+    urls = {url.rstrip("/") for url in endpoint_urls}
+    origins = {_origin(urlsplit(url)) for url in endpoint_urls}
+    inlined = 0
+
+    def is_local(iri: str) -> bool:
+        if iri.rstrip("/") in urls:
+            return True
+        service = urlsplit(iri)
+        if service.netloc and _origin(service) not in origins:
+            return False
+        return service.path.rstrip("/") == path.rstrip("/")
+
+    def visit(node: Any) -> Any:
+        nonlocal inlined
+        if not isinstance(node, CompValue) or node.name not in ("Graph", "ServiceGraphPattern"):
+            return None
+        # GRAPH patterns and other SERVICE clauses are kept as they are, without entering them
+        if node.name == "Graph" or not isinstance(node.term, URIRef) or not is_local(str(node.term)):
+            return node
+        inlined += 1
+        pattern = traverse(translateGroupGraphPattern(node.graph), visitPost=simplify)
+        # SERVICE clauses of the pattern calling the endpoint itself are replaced too
+        return traverse(pattern, visitPre=visit)
+
+    algebra = traverse(parsed_query.algebra, visitPre=visit)
+    if inlined:
+        # Joins with the replaced clauses may not be evaluated lazily anymore, and bind other variables
+        _traverseAgg(algebra, visitor=analyse)
+        _traverseAgg(algebra, _addVars)
+        parsed_query.algebra = algebra
+    return inlined
+
+
+def _origin(url: SplitResult) -> tuple[str | None, int | None]:
+    """Get the host and port of a URL, with the default port of its scheme."""
+    try:
+        port = url.port
+    except ValueError:
+        port = None
+    return url.hostname, port or {"http": 80, "https": 443}.get(url.scheme)
+
+
+def _parse_service(part: CompValue) -> tuple[bool, str | None, str | None, str]:
+    """Get the SILENT flag, the endpoint IRI or variable name, and the graph pattern text of a SERVICE clause.
+
+    Raises `NotImplementedError` when the text of the clause is not available.
+    """
+    match = _SERVICE_STRING.match(part.get("service_string") or "")
+    if match is None:
+        raise NotImplementedError()
+    silent, endpoint_iri, endpoint_var, body = match.groups()
+    return silent is not None, endpoint_iri, endpoint_var, body
+
+
+def _service_query(ctx: QueryContext, body: str, variables: list[Variable], rows: list[list[Node | None]]) -> str:
+    """Build the SELECT query of a SERVICE clause, with the values of some of its variables in a VALUES clause."""
+    query = f"SELECT * WHERE {{ {body} }}"
+    if variables and rows:
+        values = " ".join(f"({' '.join('UNDEF' if v is None else v.n3() for v in row)})" for row in rows)
+        query += f"\nVALUES ({' '.join(var.n3() for var in variables)}) {{ {values} }}"
+    prologue = ctx.prologue
+    if prologue is not None:
+        prefixes = "".join(
+            f"PREFIX {prefix}: {namespace.n3()}\n"
+            for prefix, namespace in prologue.namespace_manager.namespaces()
+            if re.search(rf"(?<![\w.-]){re.escape(prefix)}:", body)
+        )
+        query = prefixes + query
+        if prologue.base:
+            query = f"BASE <{prologue.base}>\n{query}"
+    return query
+
+
+def service_request(ctx: QueryContext, part: CompValue) -> tuple[str, str, bool]:
+    """Get the remote endpoint, the SELECT query and the SILENT flag of a SERVICE clause evaluated in a context.
+
+    The variables of the SERVICE clause already bound in the context are sent in a VALUES clause.
+    Raises `NotImplementedError` for clauses RDFLib evaluates itself, e.g. with an unbound endpoint variable.
+    """
+    silent, endpoint_iri, endpoint_var, body = _parse_service(part)
+    endpoint = endpoint_iri if endpoint_iri is not None else ctx[Variable(endpoint_var)]
+    if not isinstance(endpoint, str) or isinstance(endpoint, (Literal, BNode)) or not endpoint:
+        raise NotImplementedError()
+    bindings = {
+        var: value
+        for var, value in ctx.solution().items()
+        if isinstance(var, Variable) and not isinstance(value, BNode) and var in _body_variables(body)
+    }
+    query = _service_query(ctx, body, list(bindings), [list(bindings.values())])
+    return str(endpoint), query, silent
+
+
+def _body_variables(body: str) -> set[Variable]:
+    return {Variable(name) for name in _BODY_VARIABLE.findall(body)}
+
+
+def _operands(part: CompValue, name: str) -> list[CompValue]:
+    """Get the operands of nested joins or unions."""
+    if part.name != name:
+        return [part]
+    return _operands(part.p1, name) + _operands(part.p2, name)
+
+
+def _compatible(row: Row, other: Row) -> bool:
+    return all(row[var] == value for var, value in other.items() if var in row)
+
+
+def _join_rows(left: list[Row], right: list[Row]) -> list[Row]:
+    """Join two lists of solutions on the variables bound in all of them."""
+    shared = set.intersection(*(set(row) for row in left + right)) if left and right else set()
+    keys = sorted(shared)
+    index: dict[tuple[Node, ...], list[Row]] = {}
+    for row in right:
+        index.setdefault(tuple(row[var] for var in keys), []).append(row)
+    joined = []
+    for row in left:
+        for other in index.get(tuple(row[var] for var in keys), []):
+            if _compatible(row, other):
+                joined.append({**row, **other})
+    return joined
+
+
+def _solutions(ctx: QueryContext, rows: Iterable[Row]) -> Iterator[FrozenBindings]:
+    """Merge the solutions of SERVICE clauses with the bindings of the current solution."""
+    for row in rows:
+        child_ctx = ctx.push()
+        try:
+            for var, value in row.items():
+                child_ctx[var] = value
+        except AlreadyBound:
+            continue
+        yield child_ctx.solution()
+
+
+def _batches(solutions: Iterable[Any], size: int) -> Iterator[list[Row]]:
+    """Group solutions in lists of `size` solutions."""
+    batch: list[Row] = []
+    for solution in solutions:
+        batch.append(dict(solution))
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+class _RowIndex:
+    """Hash index of the results of a SERVICE query, probed with the values of the variables a local solution
+    shares with the variables bound in all the results."""
+
+    def __init__(self, rows: list[Row]) -> None:
+        self.rows = rows
+        self.variables = sorted(set.intersection(*(set(row) for row in rows))) if rows else []
+        self._indexes: dict[tuple[Variable, ...], dict[tuple[Node, ...], list[Row]]] = {}
+
+    def matches(self, row: Row) -> Iterator[Row]:
+        """Get the results compatible with a local solution."""
+        keys = tuple(var for var in self.variables if var in row)
+        index = self._indexes.get(keys)
+        if index is None:
+            # Built once for each set of shared variables, usually one for all the local solutions
+            index = {}
+            for result in self.rows:
+                index.setdefault(tuple(result[var] for var in keys), []).append(result)
+            self._indexes[keys] = index
+        for result in index.get(tuple(row[var] for var in keys), []):
+            if _compatible(row, result):
+                yield {**row, **result}
+
+
+def _join_batch(
+    batch: list[Row], remote: list[Row], values_rows: dict[int, list[int]], optional: bool
+) -> Iterator[Row]:
+    """Join a batch of local solutions with the results of the SERVICE query sent with their values.
+
+    `values_rows` gives the local solutions of each row of the VALUES clause, each result is only joined with the
+    local solutions of the VALUES row it comes from, or with all of them when the results do not tell it.
+    """
+    matches: list[list[Row]] = [[] for _ in batch]
+    for result in remote:
+        values_row = result.get(_VALUES_ROW)
+        candidates: Iterable[int] = range(len(batch))
+        if values_row is not None:
+            candidates = values_rows.get(int(values_row.toPython()) if isinstance(values_row, Literal) else -1, [])
+        bindings = {var: value for var, value in result.items() if var != _VALUES_ROW}
+        for i in candidates:
+            if _compatible(batch[i], bindings):
+                matches[i].append({**batch[i], **bindings})
+    for row, row_matches in zip(batch, matches):
+        if row_matches:
+            yield from row_matches
+        elif optional:
+            yield row
+
+
+def _join_indexed(batch: list[Row], index: _RowIndex, optional: bool) -> Iterator[Row]:
+    """Join a batch of local solutions with the indexed results of a SERVICE query sent once for all of them."""
+    for row in batch:
+        matched = False
+        for joined in index.matches(row):
+            matched = True
+            yield joined
+        if not matched and optional:
+            yield row
+
+
+def _bind_join(federation: Federation, ctx: QueryContext, part: CompValue, optional: bool) -> Iterator[Row]:
+    """Join the local solutions of the first operand with a SERVICE clause, sending in a VALUES clause the values
+    of the variables they share, for batches of local solutions.
+
+    The requests of successive batches are sent concurrently, up to the concurrency limit of the remote endpoint.
+    """
+    silent, endpoint, _endpoint_var, body = _parse_service(part.p2)
+    variables = _body_variables(body)
+    bound = set(getattr(part.p1, "_vars", ())) | {var for var in ctx.solution() if isinstance(var, Variable)}
+    batch_size = federation._setting(endpoint, "batch_size")
+    if not variables & bound:
+        # The SERVICE clause does not depend on the local solutions, it is sent once for all of them,
+        # and its results are indexed once while the local solutions are evaluated
+        independent = federation.submit(*service_request(ctx, part.p2))
+        index: _RowIndex | None = None
+        for batch in _batches(evalPart(ctx, part.p1), batch_size):
+            if index is None:
+                index = _RowIndex(independent.result())
+            yield from _join_indexed(batch, index, optional)
+        return
+    pending: collections.deque[tuple[list[Row], dict[int, list[int]], Any]] = collections.deque()
+
+    for batch in _batches(evalPart(ctx, part.p1), batch_size):
+        shared = sorted(var for var in variables if any(var in row for row in batch))
+        values_rows: dict[int, list[int]] = {}
+        keys: dict[tuple[Node | None, ...], int] = {}
+        for i, row in enumerate(batch):
+            key = tuple(_sendable(row.get(var)) for var in shared)
+            values_rows.setdefault(keys.setdefault(key, len(keys)), []).append(i)
+        query = _service_query(ctx, body, [*shared, _VALUES_ROW], [[*key, Literal(i)] for key, i in keys.items()])
+        pending.append((batch, values_rows, federation.submit(endpoint, query, silent)))
+        # The next batches are sent while the results of the first ones are joined
+        if len(pending) >= federation._setting(endpoint, "max_concurrency"):
+            sent_batch, sent_values_rows, future = pending.popleft()
+            yield from _join_batch(sent_batch, future.result(), sent_values_rows, optional)
+    for sent_batch, sent_values_rows, future in pending:
+        yield from _join_batch(sent_batch, future.result(), sent_values_rows, optional)
+
+
+def _sendable(value: Node | None) -> Node | None:
+    """Blank nodes cannot be sent to a remote endpoint, they are replaced by UNDEF and joined locally."""
+    return None if isinstance(value, BNode) else value
+
+
+def eval_service(federation: Federation, ctx: QueryContext, part: CompValue) -> Any:
+    """Custom evaluation of SERVICE clauses, of joins and unions of SERVICE clauses sent concurrently,
+    and of joins of local solutions with a SERVICE clause sent in batches."""
+    if part.name == "ServiceGraphPattern":
+        return _solutions(ctx, federation.fetch(*service_request(ctx, part)))
+    if part.name not in ("Join", "LeftJoin", "Union"):
+        raise NotImplementedError()
+    operands = _operands(part, part.name)
+    if part.name != "LeftJoin" and all(operand.name == "ServiceGraphPattern" for operand in operands):
+        requests = [service_request(ctx, operand) for operand in operands]
+        futures = [federation.submit(*request) for request in requests]
+        results = [future.result() for future in futures]
+        if part.name == "Union":
+            return _solutions(ctx, (row for rows in results for row in rows))
+        return _solutions(ctx, reduce(_join_rows, results))
+    if part.name == "Union" or part.p2.name != "ServiceGraphPattern" or _parse_service(part.p2)[1] is None:
+        raise NotImplementedError()
+    if part.name == "LeftJoin" and part.expr is not None and getattr(part.expr, "name", None) != "TrueFilter":
+        raise NotImplementedError()
+    return _solutions(ctx, _bind_join(federation, ctx, part, optional=part.name == "LeftJoin"))
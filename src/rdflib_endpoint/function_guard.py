@@ -0,0 +1,223 @@
+"""Timeout, concurrency cap and circuit breaker for the python functions called during SPARQL evaluation."""
+
+from __future__ import annotations
+
+import concurrent.futures
+import contextlib
+import functools
+import inspect
+import logging
+import threading
+import time
+from typing import Any, Callable, Generator, NoReturn
+
+from rdflib.plugins.sparql.sparql import SPARQLError
+
+_END = object()
+"""Marker of the end of the results of a generator function."""
+
+_MAX_WORKERS = 8
+"""Number of threads running the calls with a timeout of a function without `max_concurrency`."""
+
+
+class FunctionGuard:
+    """Protect the calls to a custom function, so that a slow or failing backend does not stall every query.
+
+    - `timeout`: calls taking longer than this many seconds are abandoned (the worker thread keeps running, calls
+      still waiting for a thread are cancelled), for generator functions each result must be produced within this
+      many seconds
+    - `max_concurrency`: maximum number of in-flight calls, additional calls wait (up to `timeout`) for a slot
+    - `failure_threshold`: after this many consecutive errors the circuit opens and calls fail fast
+      for `cooldown` seconds, then a single trial call is allowed (half-open) and closes the circuit if it succeeds,
+      the other calls failing fast until it is done
+    """
+
+    def __init__(
+        self,
+        name: str,
+        timeout: float | None = None,
+        max_concurrency: int | None = None,
+        failure_threshold: int | None = None,
+        cooldown: float = 30.0,
+    ) -> None:
+        self.name = name
+        self.timeout = timeout
+        self.max_concurrency = max_concurrency
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self.calls = 0
+        self.errors = 0
+        self.timeouts = 0
+        self.rejected = 0
+        self.in_flight = 0
+        self.consecutive_errors = 0
+        self._opened_at: float | None = None
+        self._probing = False
+        self._lock = threading.Lock()
+        self._semaphore = threading.BoundedSemaphore(max_concurrency) if max_concurrency else None
+        self._executor: concurrent.futures.ThreadPoolExecutor | None = None
+
+    @property
+    def state(self) -> str:
+        """State of the circuit breaker: `closed`, `open` or `half-open`."""
+        if self._opened_at is None:
+            return "closed"
+        if time.monotonic() - self._opened_at >= self.cooldown:
+            return "half-open"
+        return "open"
+
+    def stats(self) -> dict[str, Any]:
+        """Get the call counters and circuit breaker state of the function."""
+        return {
+            "state": self.state,
+            "calls": self.calls,
+            "errors": self.errors,
+            "timeouts": self.timeouts,
+            "rejected": self.rejected,
+            "in_flight": self.in_flight,
+            "consecutive_errors": self.consecutive_errors,
+        }
+
+    def __call__(self, func: Callable[..., Any], *args: Any, **kwargs: Any) -> Any:
+        """Call the function, the results of generator functions are streamed by a generator guarding each of them."""
+        probe = self._admit()
+        if self._semaphore is not None and not self._semaphore.acquire(timeout=self.timeout):
+            self._end_probe(probe)
+            self._reject(f"Too many concurrent calls to custom function {self.name}")
+        with self._lock:
+            self.calls += 1
+            self.in_flight += 1
+        slot = _Slot(self)
+        result = self._run(functools.partial(func, *args, **kwargs), slot.release, probe)
+        if inspect.isgenerator(result):
+            return self._stream(result, slot, probe)
+        slot.release()
+        self._record_success(probe)
+        return result
+
+    def _run(self, step: Callable[[], Any], abandon: Callable[[], None], probe: bool) -> Any:
+        """Run a step of a call within the timeout, `abandon` is called once a failed or timed out step is over."""
+        future: concurrent.futures.Future[Any] | None = None
+        try:
+            if self.timeout is None:
+                return step()
+            future = self._get_executor().submit(step)
+            return future.result(timeout=self.timeout)
+        except concurrent.futures.TimeoutError as exc:
+            if future is not None and not future.cancel():
+                # The step keeps running in its thread, the call holds its slot until it is over
+                future.add_done_callback(lambda _future: abandon())
+            else:
+                # The step was still queued and will never run, its slot is released right away
+                abandon()
+            self._record_failure(probe, timed_out=True)
+            raise SPARQLError(f"Custom function {self.name} timed out after {self.timeout}s") from exc
+        except Exception:
+            abandon()
+            self._record_failure(probe)
+            raise
+
+    def _stream(self, generator: Generator[Any, None, None], slot: _Slot, probe: bool) -> Generator[Any, None, None]:
+        """Generate the results of a generator function one by one, each within the timeout.
+
+        The call holds its concurrency slot until the generator is exhausted or closed.
+        """
+
+        def abandon() -> None:
+            with contextlib.suppress(Exception):
+                generator.close()
+            slot.release()
+
+        failed = False
+        try:
+            while True:
+                try:
+                    item = self._run(functools.partial(next, generator, _END), abandon, probe)
+                except BaseException:
+                    failed = True
+                    raise
+                if item is _END:
+                    break
+                yield item
+        finally:
+            if not failed:
+                # Exhausted, or closed by the caller before the end
+                generator.close()
+                slot.release()
+                self._record_success(probe)
+
+    def _get_executor(self) -> concurrent.futures.ThreadPoolExecutor:
+        """Get the thread pool used to run calls with a timeout, created on first use."""
+        with self._lock:
+            if self._executor is None:
+                self._executor = concurrent.futures.ThreadPoolExecutor(
+                    max_workers=self.max_concurrency or _MAX_WORKERS, thread_name_prefix=f"rdflib-endpoint-{self.name}"
+                )
+            return self._executor
+
+    def _admit(self) -> bool:
+        """Let a call through the circuit breaker, returns True for the single trial call of a half-open circuit."""
+        with self._lock:
+            state = self.state
+            if state == "closed":
+                return False
+            if state == "half-open" and not self._probing:
+                self._probing = True
+                return True
+        if state == "open":
+            self._reject(f"Circuit breaker open for custom function {self.name}")
+        self._reject(f"Circuit breaker half-open for custom function {self.name}, waiting for its trial call")
+
+    def _end_probe(self, probe: bool) -> None:
+        """Let another trial call through when the trial call did not run."""
+        if probe:
+            with self._lock:
+                self._probing = False
+
+    def _reject(self, message: str) -> NoReturn:
+        """Fail fast without calling the function."""
+        with self._lock:
+            self.rejected += 1
+        raise SPARQLError(message)
+
+    def _record_success(self, probe: bool) -> None:
+        """Close the circuit after a successful call."""
+        with self._lock:
+            self.consecutive_errors = 0
+            self._opened_at = None
+            if probe:
+                self._probing = False
+
+    def _record_failure(self, probe: bool, timed_out: bool = False) -> None:
+        """Count a failed call, and open the circuit when too many consecutive calls failed."""
+        with self._lock:
+            self.errors += 1
+            if timed_out:
+                self.timeouts += 1
+            self.consecutive_errors += 1
+            if self.failure_threshold is not None and self.consecutive_errors >= self.failure_threshold:
+                if self._opened_at is None or self.state == "half-open":
+                    logging.warning(
+                        f"Circuit breaker opened for custom function {self.name} after {self.consecutive_errors} consecutive errors"
+                    )
+                self._opened_at = time.monotonic()
+            if probe:
+                self._probing = False
+
+
+class _Slot:
+    """Concurrency slot held by a call to a guarded function, released once."""
+
+    def __init__(self, guard: FunctionGuard) -> None:
+        self.guard = guard
+        self.released = False
+
+    def release(self) -> None:
+        guard = self.guard
+        with guard._lock:
+            if self.released:
+                return
+            self.released = True
+            guard.in_flight -= 1
+        if guard._semaphore is not None:
+            guard._semaphore.release()
@@ -0,0 +1,195 @@
+"""Run long SPARQL queries as jobs in the background, and keep their serialized results on disk for a while.
+
+Clients submit a query and get a job ID right away, then poll the status of the job and fetch its results once it
+is done, instead of keeping a request open for the whole evaluation, which proxies may time out. Jobs run in their
+own bounded pool of threads, so that they do not take the threads evaluating the interactive queries.
+"""
+
+from __future__ import annotations
+
+import concurrent.futures
+import contextlib
+import os
+import shutil
+import tempfile
+import threading
+import time
+import uuid
+from dataclasses import dataclass, field
+from typing import Any, BinaryIO, Callable
+
+
+@dataclass
+class QueryJob:
+    """Status and progress of a query run in the background."""
+
+    id: str
+    media_type: str
+    path: str
+    status: str = "queued"
+    """`queued`, `running`, `done` or `failed`."""
+    submitted: float = field(default_factory=time.time)
+    started: float | None = None
+    finished: float | None = None
+    size: int = 0
+    """Number of bytes of the results serialized so far."""
+    error: str | None = None
+    expires: float | None = None
+    """Time after which the job and its results are removed, once finished."""
+
+    def to_dict(self) -> dict[str, Any]:
+        """Get the status and progress of the job, with the time spent running it."""
+        end = self.finished or time.time()
+        return {
+            "id": self.id,
+            "status": self.status,
+            "media_type": self.media_type,
+            "submitted": self.submitted,
+            "started": self.started,
+            "finished": self.finished,
+            "seconds": round(end - self.started, 6) if self.started else 0.0,
+            "bytes": self.size,
+            "error": self.error,
+            "expires": self.expires,
+        }
+
+
+class _ProgressWriter:
+    """Binary file counting the bytes written to it in the job."""
+
+    def __init__(self, file: BinaryIO, job: QueryJob) -> None:
+        self.file = file
+        self.job = job
+
+    def write(self, data: bytes) -> int:
+        written = self.file.write(data)
+        self.job.size += len(data)
+        return written
+
+    def flush(self) -> None:
+        self.file.flush()
+
+
+class QueryJobs:
+    """Run queries in the background, and keep their serialized results in files until they expire.
+
+    - `directory`: directory of the results files, a temporary directory removed on `close` by default
+    - `ttl`: number of seconds a finished job and its results are kept
+    - `max_workers`: number of jobs running at the same time, the other jobs are queued
+    - `max_jobs`: maximum number of queued and running jobs, additional jobs are rejected
+    """
+
+    def __init__(
+        self, directory: str | None = None, ttl: float = 3600.0, max_workers: int = 2, max_jobs: int = 100
+    ) -> None:
+        self.ttl = ttl
+        self.max_workers = max_workers
+        self.max_jobs = max_jobs
+        self._temporary = directory is None
+        self.directory = directory or tempfile.mkdtemp(prefix="rdflib-endpoint-jobs-")
+        os.makedirs(self.directory, exist_ok=True)
+        self._jobs: dict[str, QueryJob] = {}
+        self._lock = threading.Lock()
+        self._executor: concurrent.futures.ThreadPoolExecutor | None = None
+
+    def _get_executor(self) -> concurrent.futures.ThreadPoolExecutor:
+        """Get the thread pool running the jobs, created on first use."""
+        with self._lock:
+            if self._executor is None:
+                self._executor = concurrent.futures.ThreadPoolExecutor(
+                    max_workers=self.max_workers, thread_name_prefix="rdflib-endpoint-job"
+                )
+            return self._executor
+
+    def is_full(self) -> bool:
+        """Check if the maximum number of queued and running jobs is reached."""
+        self.remove_expired()
+        with self._lock:
+            active = sum(job.status in ("queued", "running") for job in self._jobs.values())
+        return active >= self.max_jobs
+
+    def submit(self, media_type: str, run: Callable[[BinaryIO], None]) -> QueryJob:
+        """Queue a job writing the results of a query, serialized to `media_type`, to the binary file given to `run`."""
+        job_id = uuid.uuid4().hex
+        # The temporary directory is removed when the app shuts down, and created again if it restarts
+        os.makedirs(self.directory, exist_ok=True)
+        job = QueryJob(id=job_id, media_type=media_type, path=os.path.join(self.directory, job_id))
+        with self._lock:
+            self._jobs[job_id] = job
+        self._get_executor().submit(self._run, job, run)
+        return job
+
+    def _run(self, job: QueryJob, run: Callable[[BinaryIO], None]) -> None:
+        """Run a job, writing its results to a partial file renamed once they are complete."""
+        with self._lock:
+            if job.id not in self._jobs:
+                # Removed while it was queued
+                return
+            job.status = "running"
+            job.started = time.time()
+        partial_path = f"{job.path}.part"
+        try:
+            with open(partial_path, "wb") as f:
+                run(_ProgressWriter(f, job))  # type: ignore[arg-type]
+            os.replace(partial_path, job.path)
+        except Exception as e:
+            with contextlib.suppress(OSError):
+                os.remove(partial_path)
+            job.error = str(e)
+            job.status = "failed"
+        else:
+            job.status = "done"
+        finally:
+            job.finished = time.time()
+            job.expires = job.finished + self.ttl
+        with self._lock:
+            removed = job.id not in self._jobs
+        if removed:
+            _remove_file(job.path)
+
+    def get(self, job_id: str) -> QueryJob | None:
+        """Get a job, None if it does not exist or expired."""
+        self.remove_expired()
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def remove(self, job_id: str) -> bool:
+        """Remove a job and its results, a running job is removed once it finishes."""
+        with self._lock:
+            job = self._jobs.pop(job_id, None)
+        if job is None:
+            return False
+        if job.finished is not None:
+            _remove_file(job.path)
+        return True
+
+    def remove_expired(self) -> None:
+        """Remove the finished jobs whose results expired."""
+        now = time.time()
+        with self._lock:
+            expired = [job_id for job_id, job in self._jobs.items() if job.expires is not None and job.expires <= now]
+        for job_id in expired:
+            self.remove(job_id)
+
+    def stats(self) -> dict[str, int]:
+        """Get the number of jobs in each status."""
+        self.remove_expired()
+        stats = {"queued": 0, "running": 0, "done": 0, "failed": 0}
+        with self._lock:
+            for job in self._jobs.values():
+                stats[job.status] += 1
+        return stats
+
+    def close(self) -> None:
+        """Stop accepting jobs, and remove the results directory when it is temporary."""
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False)
+        if self._temporary:
+            shutil.rmtree(self.directory, ignore_errors=True)
+
+
+def _remove_file(path: str) -> None:
+    with contextlib.suppress(OSError):
+        os.remove(path)
@@ -0,0 +1,291 @@
+"""Load RDF files in an RDFLib Dataset, optionally compressed, and parsed in parallel in a process pool."""
+
+from __future__ import annotations
+
+import bz2
+import concurrent.futures
+import contextlib
+import glob
+import gzip
+import logging
+import lzma
+import os
+import pathlib
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import IO, Any, Callable, ContextManager, Iterable, Tuple
+
+from rdflib import Dataset, Graph
+from rdflib.term import Node
+from rdflib.util import guess_format
+
+Quad = Tuple[Node, Node, Node, Node]
+
+COMPRESSION_SUFFIXES = {".gz": "gzip", ".bz2": "bz2", ".xz": "xz"}
+COMPRESSION_MAGIC = {b"\x1f\x8b": "gzip", b"BZh": "bz2", b"\xfd7zXZ\x00": "xz"}
+_OPENERS: dict[str, Callable[..., IO[Any]]] = {"gzip": gzip.open, "bz2": bz2.open, "xz": lzma.open}
+
+
+@dataclass
+class LoadedFile:
+    """Statistics about a file loaded in the dataset."""
+
+    file: str
+    seconds: float
+    size: int
+    triples: int | None = None
+
+    @property
+    def mb_per_second(self) -> float:
+        """Parsing throughput in megabytes per second."""
+        return self.size / 1_000_000 / self.seconds if self.seconds else 0.0
+
+    @property
+    def triples_per_second(self) -> float | None:
+        """Parsing throughput in triples per second, if the number of triples is known."""
+        if self.triples is None:
+            return None
+        return self.triples / self.seconds if self.seconds else 0.0
+
+
+def detect_compression(path: str) -> str | None:
+    """Detect the compression of a file from its suffix, or from its first bytes, None if it is not compressed."""
+    compression = COMPRESSION_SUFFIXES.get(os.path.splitext(path)[1].lower())
+    if compression:
+        return compression
+    try:
+        with open(path, "rb") as f:
+            head = f.read(6)
+    except OSError:
+        return None
+    return next((codec for magic, codec in COMPRESSION_MAGIC.items() if head.startswith(magic)), None)
+
+
+def uncompressed_path(path: str) -> str:
+    """Remove the compression suffix of a path, e.g. `data.nt.gz` becomes `data.nt`."""
+    root, suffix = os.path.splitext(path)
+    return root if suffix.lower() in COMPRESSION_SUFFIXES else path
+
+
+def open_file(path: str, mode: str = "rb", **kwargs: Any) -> IO[Any]:
+    """Open a file, decompressing or compressing it on the fly depending on its suffix or first bytes."""
+    compression = detect_compression(path) if "r" in mode else COMPRESSION_SUFFIXES.get(os.path.splitext(path)[1])
+    if compression is None:
+        return open(path, mode, **kwargs)
+    return _OPENERS[compression](path, mode, **kwargs)
+
+
+def parse_file(g: Graph, path: str) -> None:
+    """Parse an RDF file in a graph, compressed files are decompressed while parsing them.
+
+    The format of compressed files is guessed from the extension before the compression suffix.
+    """
+    compression = detect_compression(path)
+    if compression is None:
+        g.parse(path)
+        return
+    with _OPENERS[compression](path, "rb") as f:
+        g.parse(
+            source=f,
+            format=guess_format(uncompressed_path(path)),
+            publicID=pathlib.Path(path).absolute().as_uri(),
+        )
+
+
+def expand_files(patterns: Iterable[str]) -> list[str]:
+    """Expand glob patterns to the list of matching files."""
+    return [file for pattern in patterns for file in glob.glob(pattern)]
+
+
+def _parse_file_quads(file: str) -> tuple[str, list[Quad], float]:
+    """Parse a file in a temporary dataset, and return its quads as a compact batch to send back to the main process."""
+    start = time.perf_counter()
+    ds = Dataset()
+    parse_file(ds, file)
+    quads: list[Quad] = [(s, p, o, getattr(c, "identifier", c)) for s, p, o, c in ds.quads((None, None, None, None))]
+    return file, quads, time.perf_counter() - start
+
+
+def add_quads(g: Dataset, quads: Iterable[Quad]) -> None:
+    """Add quads with graph identifiers to a dataset."""
+    contexts: dict[Node, Graph] = {}
+
+    def _context(graph_id: Node) -> Graph:
+        if graph_id not in contexts:
+            contexts[graph_id] = g.get_context(graph_id) if graph_id is not None else g.default_context
+        return contexts[graph_id]
+
+    g.addN((s, p, o, _context(c)) for s, p, o, c in quads)
+
+
+def remove_quads(g: Dataset, quads: Iterable[Quad]) -> None:
+    """Remove quads with graph identifiers from a dataset."""
+    for s, p, o, c in quads:
+        g.remove((s, p, o, g.get_context(c) if c is not None else g.default_context))
+
+
+def load_files(
+    g: Dataset,
+    files: list[str],
+    jobs: int = 1,
+    on_loaded: Callable[[LoadedFile], None] | None = None,
+    lock: Callable[[], ContextManager[Any]] | None = None,
+) -> None:
+    """Load RDF files in a dataset.
+
+    With `jobs > 1` files are parsed concurrently in a process pool, each worker sends back the file quads
+    which are then merged in the dataset. Otherwise files are parsed one after the other. Each file is parsed in a
+    temporary dataset, and its quads added in one batch, so that the number of triples of each file is known.
+
+    Args:
+        g: The dataset to load the files in.
+        files: The paths of the files to load.
+        jobs: The number of processes used to parse files concurrently.
+        on_loaded: Function called with the statistics of each file once it has been loaded.
+        lock: Function returning the context manager held to add the quads of each file, e.g. the write lock of the
+            queries served while loading.
+    """
+    if jobs <= 1 or len(files) <= 1:
+        for file in files:
+            start = time.perf_counter()
+            # Parsed apart from the dataset, to count the triples of each file
+            _, quads, _ = _parse_file_quads(file)
+            with lock() if lock is not None else contextlib.nullcontext():
+                add_quads(g, quads)
+            if on_loaded:
+                on_loaded(LoadedFile(file, time.perf_counter() - start, os.path.getsize(file), len(quads)))
+        return
+
+    with concurrent.futures.ProcessPoolExecutor(max_workers=min(jobs, len(files))) as executor:
+        futures = [executor.submit(_parse_file_quads, file) for file in files]
+        for future in concurrent.futures.as_completed(futures):
+            file, quads, seconds = future.result()
+            with lock() if lock is not None else contextlib.nullcontext():
+                add_quads(g, quads)
+            if on_loaded:
+                on_loaded(LoadedFile(file, seconds, os.path.getsize(file), len(quads)))
+
+
+@dataclass
+class LoadProgress:
+    """Progress of files loaded in the background, while the endpoint is already serving."""
+
+    files_total: int
+    files_done: int = 0
+    triples: int = 0
+    """Number of triples parsed so far, the exact number of triples in the dataset once the load is over."""
+    started_at: float = field(default_factory=time.monotonic)
+    finished_at: float | None = None
+    error: str | None = None
+    lock: Any = field(default=None, repr=False, compare=False)
+    """`ReadWriteLock` held alone to add each batch of quads, set by the endpoint serving the partially loaded data."""
+    _on_ready: list[Callable[[], None]] = field(default_factory=list, init=False, repr=False, compare=False)
+    _notified: bool = field(default=False, init=False, repr=False, compare=False)
+    _callbacks_lock: threading.Lock = field(default_factory=threading.Lock, init=False, repr=False, compare=False)
+
+    @property
+    def finished(self) -> bool:
+        """Whether the load is over, successfully or not."""
+        return self.finished_at is not None
+
+    @property
+    def ready(self) -> bool:
+        """Whether all files have been successfully loaded."""
+        return self.finished and self.error is None
+
+    @property
+    def seconds(self) -> float:
+        """Time spent loading the files."""
+        return (self.finished_at or time.monotonic()) - self.started_at
+
+    def when_ready(self, callback: Callable[[], None]) -> None:
+        """Call a function in the loading thread once all files are loaded, right away if they already are."""
+        with self._callbacks_lock:
+            if not self._notified:
+                self._on_ready.append(callback)
+                return
+        callback()
+
+    def finish(self, error: str | None = None) -> None:
+        """Mark the load as over, after calling the functions waiting for the files to be loaded if it succeeded."""
+        self.error = error
+        if error is None:
+            with self._callbacks_lock:
+                callbacks, self._on_ready = self._on_ready, []
+                self._notified = True
+            for callback in callbacks:
+                try:
+                    callback()
+                except Exception as e:
+                    logging.error(f"Error once the files were loaded: {e}")
+        self.finished_at = time.monotonic()
+
+    def write_lock(self) -> ContextManager[Any]:
+        """Get the context manager held to add a batch of quads to the dataset."""
+        return self.lock.write() if self.lock is not None else contextlib.nullcontext()
+
+    def retry_after(self) -> int:
+        """Estimate in how many seconds the load will be over, to tell clients when to retry."""
+        if not self.files_done:
+            return 5
+        remaining = self.seconds / self.files_done * (self.files_total - self.files_done)
+        return max(1, min(60, round(remaining)))
+
+    def to_dict(self) -> dict[str, Any]:
+        """Get the progress as a JSON serializable dictionary."""
+        return {
+            "ready": self.ready,
+            "files_done": self.files_done,
+            "files_total": self.files_total,
+            "triples": self.triples,
+            "seconds": round(self.seconds, 3),
+            "triples_per_second": round(self.triples / self.seconds) if self.seconds else 0,
+            "error": self.error,
+        }
+
+
+def load_in_background(
+    g: Dataset,
+    files: list[str],
+    jobs: int = 1,
+    snapshot_dir: str | None = None,
+    on_loaded: Callable[[LoadedFile], None] | None = None,
+) -> LoadProgress:
+    """Start loading files in a dataset in a background thread, and return the load progress.
+
+    Args:
+        g: The dataset to load the files in.
+        files: The paths of the files to load.
+        jobs: The number of processes used to parse files concurrently.
+        snapshot_dir: Directory of the binary snapshot used to skip parsing unchanged files.
+        on_loaded: Function called with the statistics of each file once it has been loaded.
+    """
+    # Imported here since snapshots are built on top of this module
+    from rdflib_endpoint.snapshot import load_with_snapshot  # noqa: PLC0415
+
+    progress = LoadProgress(files_total=len(files))
+
+    def _on_loaded(loaded: LoadedFile) -> None:
+        progress.files_done = min(progress.files_done + 1, progress.files_total)
+        # Counting the dataset after each file would go over all of its triples, it is only counted once at the end
+        progress.triples += loaded.triples or 0
+        if on_loaded:
+            on_loaded(loaded)
+
+    def _load() -> None:
+        try:
+            if snapshot_dir:
+                load_with_snapshot(g, files, snapshot_dir, jobs=jobs, on_loaded=_on_loaded, lock=progress.write_lock)
+            else:
+                load_files(g, files, jobs=jobs, on_loaded=_on_loaded, lock=progress.write_lock)
+            progress.files_done = progress.files_total
+            progress.triples = len(g)
+        except Exception as e:
+            logging.error(f"Error loading the files in the background: {e}")
+            progress.finish(error=str(e))
+        else:
+            progress.finish()
+
+    threading.Thread(target=_load, name="rdflib-endpoint-loader", daemon=True).start()
+    return progress
@@ -0,0 +1,171 @@
+"""Read-only RDFLib store opening a prebuilt index file with `mmap`, without parsing anything.
+
+The index file uses the sections format of snapshots, and stores the term dictionary with the sorted
+quad permutations of the `CompactStore`. Every process serving the same index file shares one copy of it
+in the OS page cache, terms are only decoded when they are returned.
+"""
+
+from __future__ import annotations
+
+import functools
+import mmap
+import sys
+from array import array
+from typing import Any, Iterable
+
+from rdflib import Dataset, Graph
+from rdflib.store import VALID_STORE
+from rdflib.term import Node
+
+from rdflib_endpoint.compact_store import _ORDERS, CompactStore, _Permutation
+from rdflib_endpoint.loader import Quad, add_quads
+from rdflib_endpoint.snapshot import decode_term, encode_term, read_sections, section_array, write_sections
+
+INDEX_VERSION = 1
+INDEX_EXT = ".rdfidx"
+
+_PERMUTATION_NAMES = ("spog", "posg", "ospg", "gspo")
+
+
+def write_index(path: str, quads: Iterable[Quad]) -> int:
+    """Write quads to an index file that can be opened with the `MappedStore`, returns the number of triples."""
+    store = CompactStore()
+    add_quads(Dataset(store=store), quads)
+    store._flush()
+    kinds = bytearray()
+    offsets = array("Q", [0])
+    blob = bytearray()
+    for term in store._terms:
+        kind, data = encode_term(term)
+        kinds.append(kind)
+        blob += data
+        offsets.append(len(blob))
+    # Term IDs sorted by their encoding, to find the ID of a term by bisection
+    term_sorted = array("I", sorted(range(len(kinds)), key=lambda i: (kinds[i], blob[offsets[i] : offsets[i + 1]])))
+    sections: dict[str, Any] = {
+        "term_kinds": bytes(kinds),
+        "term_offsets": offsets,
+        "term_blob": bytes(blob),
+        "term_sorted": term_sorted,
+        "graphs": array("Q", store._graph_sizes.keys()),
+        "graph_sizes": array("Q", store._graph_sizes.values()),
+    }
+    for name, permutation in zip(_PERMUTATION_NAMES, store._permutations):
+        sections[f"{name}_high"] = permutation.high
+        sections[f"{name}_low"] = permutation.low
+    triples = len(store)
+    write_sections(path, {"format": "index", "version": INDEX_VERSION, "triples": triples}, sections)
+    return triples
+
+
+class _MappedTerms:
+    """Terms of an index file, decoded when accessed by ID."""
+
+    def __init__(self, kinds: Any, offsets: Any, blob: Any, term_sorted: Any, cache_size: int = 1 << 16):
+        self.kinds = kinds
+        self.offsets = offsets
+        self.blob = blob
+        self.term_sorted = term_sorted
+        self._decode = functools.lru_cache(maxsize=cache_size)(self._decode_term)
+
+    def __len__(self) -> int:
+        return len(self.kinds)
+
+    def __getitem__(self, term_id: int) -> Node:
+        return self._decode(term_id)
+
+    def _encoded(self, term_id: int) -> tuple[int, bytes]:
+        return self.kinds[term_id], bytes(self.blob[self.offsets[term_id] : self.offsets[term_id + 1]])
+
+    def _decode_term(self, term_id: int) -> Node:
+        return decode_term(*self._encoded(term_id))
+
+    def lookup(self, term: Node) -> int | None:
+        """Get the ID of a term by bisection on the sorted term encodings, None if it is not in the index."""
+        target = encode_term(term)
+        low, high = 0, len(self.term_sorted)
+        while low < high:
+            middle = (low + high) // 2
+            if self._encoded(self.term_sorted[middle]) < target:
+                low = middle + 1
+            else:
+                high = middle
+        if low < len(self.term_sorted) and self._encoded(self.term_sorted[low]) == target:
+            return self.term_sorted[low]
+        return None
+
+
+class MappedStore(CompactStore):
+    """Read-only store memory-mapping an index file written by `write_index` or `rdflib-endpoint convert`.
+
+    Use it with `Dataset(store=MappedStore("data.rdfidx"))`.
+    """
+
+    def __init__(self, configuration: str | None = None, identifier: Node | None = None):
+        super().__init__(None, identifier)
+        self._mmap: mmap.mmap | None = None
+        self._views: list[memoryview] = []
+        if configuration:
+            self.open(configuration)
+
+    def open(self, configuration: str, create: bool = False) -> int:
+        """Memory-map the index file at the given path."""
+        if create:
+            raise PermissionError("The mapped store is read-only, write an index file with `write_index`")
+        with open(configuration, "rb") as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            header, sections = read_sections(self._mmap)
+            if header.get("format") != "index" or header.get("version") != INDEX_VERSION:
+                raise ValueError(f"{configuration} is not an rdflib-endpoint index file")
+        except ValueError:
+            # The mapping is released with the views of the failed read
+            self._mmap = None
+            raise
+        self._views = list(sections.values())
+
+        def section(name: str) -> Any:
+            # Sections are used in place, unless the file was written with another byte order
+            if header["byteorder"] == sys.byteorder:
+                return sections[name]
+            return section_array(header, sections, name)
+
+        self._terms = _MappedTerms(  # type: ignore[assignment]
+            sections["term_kinds"], section("term_offsets"), sections["term_blob"], section("term_sorted")
+        )
+        self._permutations = tuple(
+            _Permutation(order, section(f"{name}_high"), section(f"{name}_low"))
+            for name, order in zip(_PERMUTATION_NAMES, _ORDERS)
+        )
+        graphs, sizes = section("graphs"), section("graph_sizes")
+        self._graphs = {graph_id: Graph(store=self, identifier=self._terms[graph_id]) for graph_id in graphs}
+        self._graph_sizes = dict(zip(graphs, sizes))
+        self._triples_count = header["triples"]
+        return VALID_STORE
+
+    def close(self, commit_pending_transaction: bool = False) -> None:
+        """Release the memory-mapped index file."""
+        self._terms = []
+        self._permutations = tuple(_Permutation(order) for order in _ORDERS)
+        self._graphs, self._graph_sizes = {}, {}
+        for view in reversed(self._views):
+            view.release()
+        self._views = []
+        if self._mmap is not None:
+            self._mmap.close()
+            self._mmap = None
+
+    def add(self, triple: Any, context: Any, quoted: bool = False) -> None:
+        raise PermissionError("The mapped store is read-only")
+
+    def remove(self, triple_pattern: Any, context: Any = None) -> None:
+        raise PermissionError("The mapped store is read-only")
+
+    def add_graph(self, graph: Graph) -> None:
+        """Graphs not in the index are considered empty."""
+
+    def remove_graph(self, graph: Graph) -> None:
+        raise PermissionError("The mapped store is read-only")
+
+    def _lookup(self, term: Node) -> int | None:
+        return self._terms.lookup(term)  # type: ignore[attr-defined]
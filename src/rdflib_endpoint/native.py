@@ -0,0 +1,253 @@
+"""Run SPARQL queries with the native engine of the Oxigraph store, when they do not need any Python function.
+
+With the `oxrdflib` store, RDFLib still evaluates parsed queries in Python and only uses Oxigraph to match triple
+patterns. Queries which do not use any custom function of the endpoint are instead given as strings to the
+Oxigraph SPARQL engine, and its results are serialized by Oxigraph to the requested format.
+
+Queries using custom functions are evaluated by RDFLib, but the largest parts of their algebra which do not use
+custom functions (basic graph patterns, joins, optionals, unions, filters...) are serialized back to SPARQL,
+and evaluated by Oxigraph with the bindings of the current solution. Custom functions then run in Python on the
+solutions returned by Oxigraph.
+"""
+
+from __future__ import annotations
+
+from typing import Any, Iterator
+
+from rdflib import BNode, Dataset, Graph, Literal, URIRef, Variable
+from rdflib.graph import DATASET_DEFAULT_GRAPH_ID
+from rdflib.plugins.sparql.parserutils import CompValue
+from rdflib.plugins.sparql.sparql import AlreadyBound, FrozenBindings, Query, QueryContext
+from rdflib.term import Node
+
+# Names of the pyoxigraph formats for the RDFLib formats used by the endpoint
+_RESULTS_FORMATS = {"json": "JSON", "xml": "XML", "csv": "CSV"}
+_GRAPH_FORMATS = {
+    "xml": "RDF_XML",
+    "json-ld": "JSON_LD",
+    "ttl": "TURTLE",
+    "n3": "N3",
+    "nt": "N_TRIPLES",
+    "trig": "TRIG",
+    "nquads": "N_QUADS",
+}
+
+# Parameters of the SPARQL builtin functions in the RDFLib algebra, in the order of their arguments
+_BUILTIN_PARAMS = ("arg", "arg1", "arg2", "arg3", "text", "start", "length", "pattern", "replacement", "flags")
+_OPERATORS = {"ConditionalOrExpression": "||", "ConditionalAndExpression": "&&"}
+_UNARY_OPERATORS = {"UnaryNot": "!", "UnaryMinus": "-", "UnaryPlus": "+"}
+
+
+def native_store(graph: Graph) -> Any | None:
+    """Get the pyoxigraph store of a graph using the `oxrdflib` store, None for other stores."""
+    if type(graph.store).__name__ != "OxigraphStore":
+        return None
+    return getattr(graph.store, "_inner", None)
+
+
+def _algebra_nodes(part: Any) -> Iterator[Any]:
+    """Iterate over all the nodes of a query algebra: operators, expressions and terms."""
+    yield part
+    if isinstance(part, CompValue):
+        for value in part.values():
+            yield from _algebra_nodes(value)
+    elif isinstance(part, (list, tuple, set)):
+        for value in part:
+            yield from _algebra_nodes(value)
+
+
+def uses_iris(parsed_query: Query, iris: set[URIRef]) -> bool:
+    """Check if a query uses one of the given IRIs, e.g. of custom functions."""
+    return any(isinstance(node, URIRef) and node in iris for node in _algebra_nodes(parsed_query.algebra))
+
+
+def needs_python(parsed_query: Query, function_iris: set[URIRef]) -> bool:
+    """Check if a query uses one of the given custom functions, or a SERVICE clause, which are evaluated in Python."""
+    for node in _algebra_nodes(parsed_query.algebra):
+        if isinstance(node, CompValue) and node.name == "ServiceGraphPattern":
+            return True
+        if isinstance(node, URIRef) and node in function_iris:
+            return True
+    return False
+
+
+def _graph_options(graph: Graph) -> dict[str, Any]:
+    """Get the options of an Oxigraph query to use the same default graph as an RDFLib graph."""
+    import pyoxigraph as ox  # noqa: PLC0415
+
+    if getattr(graph, "default_union", False):
+        return {"use_default_graph_as_union": True}
+    if isinstance(graph, Dataset) or graph.identifier == DATASET_DEFAULT_GRAPH_ID:
+        return {}
+    # A graph stored in an Oxigraph dataset is the named graph with its identifier
+    identifier = graph.identifier
+    return {"default_graph": ox.BlankNode(identifier) if isinstance(identifier, BNode) else ox.NamedNode(identifier)}
+
+
+def native_query(
+    store: Any, graph: Graph, query: str, prefixes: dict[str, Any], rdflib_format: str, construct: bool = False
+) -> bytes | None:
+    """Run a query with the Oxigraph engine on the default graph of an RDFLib graph, and serialize its results.
+
+    Returns None without running the query if the format is not supported by Oxigraph.
+    """
+    import pyoxigraph as ox  # noqa: PLC0415
+
+    if construct:
+        graph_format = _GRAPH_FORMATS.get(rdflib_format)
+        output_format = getattr(ox.RdfFormat, graph_format) if graph_format else None
+    else:
+        results_format = _RESULTS_FORMATS.get(rdflib_format)
+        output_format = getattr(ox.QueryResultsFormat, results_format) if results_format else None
+    if output_format is None:
+        return None
+    prefixes = {prefix: str(namespace) for prefix, namespace in prefixes.items()}
+    return store.query(query, prefixes=prefixes, **_graph_options(graph)).serialize(format=output_format)
+
+
+def _to_ox(term: Node) -> Any:
+    """Convert an RDFLib term to an Oxigraph term, like the `oxrdflib` store."""
+    import pyoxigraph as ox  # noqa: PLC0415
+
+    if isinstance(term, Literal):
+        if term.language:
+            return ox.Literal(term, language=term.language)
+        return ox.Literal(term, datatype=ox.NamedNode(term.datatype) if term.datatype else None)
+    if isinstance(term, BNode):
+        return ox.BlankNode(term)
+    return ox.NamedNode(term)
+
+
+def _from_ox(term: Any) -> Node:
+    """Convert an Oxigraph term to an RDFLib term, like the `oxrdflib` store."""
+    import pyoxigraph as ox  # noqa: PLC0415
+
+    if isinstance(term, ox.Literal):
+        if term.language:
+            return Literal(term.value, lang=term.language)
+        return Literal(term.value, datatype=URIRef(term.datatype.value))
+    if isinstance(term, ox.BlankNode):
+        return BNode(term.value)
+    return URIRef(term.value)
+
+
+def expression_to_sparql(expr: Any, function_iris: set[URIRef]) -> str | None:
+    """Serialize an expression of the RDFLib algebra to SPARQL, None if it uses custom functions or unsupported operators."""
+    if isinstance(expr, (Variable, URIRef, Literal)):
+        return expr.n3()
+    if not isinstance(expr, CompValue):
+        return None
+    args: list[Any]
+    if expr.name in _OPERATORS:
+        args = [expr.expr, *(expr.other or [])]
+        texts = [expression_to_sparql(arg, function_iris) for arg in args]
+        return None if None in texts else "(" + f" {_OPERATORS[expr.name]} ".join(texts) + ")"  # type: ignore[arg-type]
+    if expr.name == "RelationalExpression":
+        others = expr.other if isinstance(expr.other, list) else [expr.other]
+        texts = [expression_to_sparql(arg, function_iris) for arg in [expr.expr, *others]]
+        if None in texts:
+            return None
+        if expr.op in ("IN", "NOT IN"):
+            return f"({texts[0]} {expr.op} ({', '.join(texts[1:])}))"  # type: ignore[arg-type]
+        return f"({texts[0]} {expr.op} {texts[1]})"
+    if expr.name in ("AdditiveExpression", "MultiplicativeExpression"):
+        text = expression_to_sparql(expr.expr, function_iris)
+        for op, other in zip(expr.op or [], expr.other or []):
+            other_text = expression_to_sparql(other, function_iris)
+            if text is None or other_text is None:
+                return None
+            text = f"{text} {op} {other_text}"
+        return None if text is None else f"({text})"
+    if expr.name in _UNARY_OPERATORS:
+        text = expression_to_sparql(expr.expr, function_iris)
+        return None if text is None else f"({_UNARY_OPERATORS[expr.name]}{text})"
+    if expr.name.startswith("Builtin_") and expr.name not in ("Builtin_EXISTS", "Builtin_NOTEXISTS"):
+        function = expr.name[len("Builtin_") :]
+        args = []
+        for param in _BUILTIN_PARAMS:
+            value = expr.get(param)
+            if value is not None:
+                args.extend(value if isinstance(value, list) else [value])
+    elif expr.name == "Function" and expr.iri not in function_iris and not expr.distinct:
+        function = expr.iri.n3()
+        args = list(expr.expr or [])
+    else:
+        return None
+    texts = [expression_to_sparql(arg, function_iris) for arg in args]
+    return None if None in texts else f"{function}({', '.join(texts)})"  # type: ignore[arg-type]
+
+
+def pattern_to_sparql(part: CompValue, function_iris: set[URIRef]) -> str | None:
+    """Serialize a graph pattern of the RDFLib algebra to a SPARQL group, None if it cannot be evaluated by Oxigraph."""
+    if part.name == "BGP":
+        for triple in part.triples:
+            if any(isinstance(node, URIRef) and node in function_iris for node in triple):
+                return None
+        return "{ " + " ".join(f"{s.n3()} {p.n3()} {o.n3()} ." for s, p, o in part.triples) + " }"
+    if part.name in ("Join", "LeftJoin", "Union", "Minus"):
+        first = pattern_to_sparql(part.p1, function_iris)
+        second = pattern_to_sparql(part.p2, function_iris)
+        if first is None or second is None:
+            return None
+        if part.name == "Join":
+            return f"{{ {first} {second} }}"
+        if part.name == "Union":
+            return f"{{ {first} UNION {second} }}"
+        if part.name == "Minus":
+            return f"{{ {first} MINUS {second} }}"
+        if part.expr is None or getattr(part.expr, "name", None) == "TrueFilter":
+            return f"{{ {first} OPTIONAL {second} }}"
+        condition = expression_to_sparql(part.expr, function_iris)
+        return None if condition is None else f"{{ {first} OPTIONAL {{ {second} FILTER({condition}) }} }}"
+    if part.name in ("Filter", "Extend", "Graph"):
+        pattern = pattern_to_sparql(part.p, function_iris)
+        if pattern is None:
+            return None
+        if part.name == "Graph":
+            if isinstance(part.term, URIRef) and part.term in function_iris:
+                return None
+            return f"{{ GRAPH {part.term.n3()} {pattern} }}"
+        expression = expression_to_sparql(part.expr, function_iris)
+        if expression is None:
+            return None
+        if part.name == "Filter":
+            return f"{{ {pattern} FILTER({expression}) }}"
+        return f"{{ {pattern} BIND({expression} AS {part.var.n3()}) }}"
+    return None
+
+
+def eval_native(store: Any, function_iris: set[URIRef], ctx: QueryContext, part: CompValue) -> Any:
+    """Custom evaluation of the graph patterns which do not use custom functions with the Oxigraph engine.
+
+    The variables already bound in the current solution are substituted in the pattern before running it.
+    """
+    import pyoxigraph as ox  # noqa: PLC0415
+
+    pattern = pattern_to_sparql(part, function_iris)
+    if pattern is None:
+        raise NotImplementedError()
+    substitutions = {
+        ox.Variable(str(var)): _to_ox(ctx[var])
+        for var in getattr(part, "_vars", ())
+        if isinstance(var, Variable) and ctx[var] is not None
+    }
+    try:
+        solutions = store.query(f"SELECT * WHERE {pattern}", substitutions=substitutions, **_graph_options(ctx.graph))
+    except Exception as e:
+        # Evaluate the pattern with RDFLib if Oxigraph does not support it
+        raise NotImplementedError() from e
+    return _native_solutions(ctx, solutions)
+
+
+def _native_solutions(ctx: QueryContext, solutions: Any) -> Iterator[FrozenBindings]:
+    """Merge the solutions of an Oxigraph query with the bindings of the current solution."""
+    variables = [Variable(var.value) for var in solutions.variables]
+    for solution in solutions:
+        child_ctx = ctx.push()
+        try:
+            for var, value in zip(variables, solution):
+                if value is not None:
+                    child_ctx[var] = _from_ox(value)
+        except AlreadyBound:
+            continue
+        yield child_ctx.solution()
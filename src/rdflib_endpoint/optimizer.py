@@ -0,0 +1,82 @@
+"""Order the triple patterns of basic graph patterns by their estimated number of results, before evaluating them.
+
+RDFLib evaluates the triple patterns of a BGP one after the other, joining each pattern on the bindings of the
+previous ones, and only puts the patterns with the most bound terms first. The number of results of each pattern
+is estimated from the VoID statistics of the dataset instead, so that the most selective patterns are evaluated
+first. The order of the patterns does not change the results of a BGP.
+"""
+
+from __future__ import annotations
+
+from typing import Any, Tuple
+
+from rdflib import RDF, BNode, Variable
+from rdflib.plugins.sparql.evaluate import evalBGP
+from rdflib.plugins.sparql.parserutils import CompValue
+from rdflib.plugins.sparql.sparql import QueryContext
+from rdflib.term import Node
+
+from rdflib_endpoint.void import VoidStatistics
+
+Triple = Tuple[Node, Node, Node]
+
+
+def _is_variable(node: Node) -> bool:
+    # Blank nodes act as variables in a BGP
+    return isinstance(node, (Variable, BNode))
+
+
+def _variables(triple: Triple) -> set[Node]:
+    return {node for node in triple if _is_variable(node)}
+
+
+def estimate_cardinality(statistics: VoidStatistics, triple: Triple, bound: set[Node]) -> float:
+    """Estimate the number of statements matching a triple pattern, once the `bound` variables have a value."""
+    s, p, o = triple
+
+    def is_bound(node: Node) -> bool:
+        return not _is_variable(node) or node in bound
+
+    object_bound = is_bound(o)
+    if p == RDF.type and not _is_variable(o):
+        # Number of entities of the class, the object is already accounted for
+        cardinality = float(len(statistics.classes.get(o, ())))
+        object_bound = False
+    elif not _is_variable(p):
+        cardinality = float(statistics.properties.get(p, 0))
+    else:
+        cardinality = statistics.triples / (max(len(statistics.properties), 1) if is_bound(p) else 1)
+    if is_bound(s):
+        cardinality /= max(len(statistics.subjects), 1)
+    if object_bound:
+        cardinality /= max(len(statistics.objects), 1)
+    return cardinality
+
+
+def reorder_triples(statistics: VoidStatistics, triples: list[Triple], bound: set[Node] | None = None) -> list[Triple]:
+    """Order the triple patterns of a BGP by their estimated number of results.
+
+    Each step picks the pattern with the fewest estimated results given the variables bound by the previous patterns,
+    among the patterns sharing a variable with them when there are some, to avoid cartesian products.
+    Patterns with the same estimate keep their order in the query.
+    """
+    bound = set(bound or ())
+    remaining = list(triples)
+    ordered: list[Triple] = []
+    while remaining:
+        estimates = [estimate_cardinality(statistics, triple, bound) for triple in remaining]
+        connected = [i for i, triple in enumerate(remaining) if _variables(triple) & bound]
+        # Patterns matching no statement end the evaluation right away
+        candidates = [i for i, estimate in enumerate(estimates) if estimate == 0] or connected or range(len(remaining))
+        best = remaining.pop(min(candidates, key=estimates.__getitem__))
+        ordered.append(best)
+        bound |= _variables(best)
+    return ordered
+
+
+def eval_reordered_bgp(statistics: VoidStatistics, ctx: QueryContext, part: CompValue) -> Any:
+    """Custom evaluation of BGPs with their triple patterns ordered by their estimated number of results."""
+    if part.name != "BGP":
+        raise NotImplementedError()
+    bound = {node for triple in part.triples for node in triple if _is_variable(node) and ctx[node] is not None}
+    return evalBGP(ctx, reorder_triples(statistics, part.triples, bound))
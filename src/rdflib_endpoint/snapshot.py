@@ -0,0 +1,233 @@
+"""Binary snapshots of RDF datasets, to restart an endpoint without parsing its source files again.
+
+A snapshot file is made of a JSON header followed by binary sections, each aligned on 8 bytes:
+
+- `term_kinds`: one byte per term (URI, blank node or literal)
+- `term_offsets`: uint64 offsets of each term in `term_blob` (number of terms + 1)
+- `term_blob`: UTF-8 encoded terms, literals are encoded as `lang \\x1f datatype \\x1f value`
+- `quads`: uint32 term IDs of the subject, predicate, object and graph of each quad
+"""
+
+from __future__ import annotations
+
+import contextlib
+import hashlib
+import json
+import os
+import struct
+import sys
+import time
+from array import array
+from typing import Any, Callable, ContextManager, Iterable, Iterator, Union
+
+from rdflib import BNode, Dataset, Literal, URIRef
+from rdflib.graph import DATASET_DEFAULT_GRAPH_ID
+from rdflib.term import Node
+
+from rdflib_endpoint.loader import LoadedFile, Quad, add_quads, load_files
+
+MAGIC = b"RDFEPSNP"
+VERSION = 1
+SNAPSHOT_EXT = ".rdfsnap"
+
+URI_KIND = 0
+BNODE_KIND = 1
+LITERAL_KIND = 2
+
+Section = Union[array, bytes]
+
+
+def snapshot_key(files: list[str]) -> dict[str, Any]:
+    """Identify the exact content of the source files: their path, size, modification time and content hash."""
+    key: dict[str, Any] = {}
+    for file in files:
+        stat = os.stat(file)
+        sha256 = hashlib.sha256()
+        with open(file, "rb") as f:
+            for chunk in iter(lambda: f.read(1 << 20), b""):
+                sha256.update(chunk)
+        key[os.path.abspath(file)] = {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns, "sha256": sha256.hexdigest()}
+    return key
+
+
+def snapshot_path(snapshot_dir: str, files: list[str]) -> str:
+    """Get the path of the snapshot for a set of files, changes to the files content overwrite the same snapshot."""
+    files_id = hashlib.sha256("\n".join(sorted(os.path.abspath(f) for f in files)).encode()).hexdigest()[:16]
+    return os.path.join(snapshot_dir, f"snapshot-{files_id}{SNAPSHOT_EXT}")
+
+
+def encode_term(term: Node) -> tuple[int, bytes]:
+    """Encode an RDF term to its kind and UTF-8 bytes."""
+    if isinstance(term, Literal):
+        text = f"{term.language or ''}\x1f{'' if term.language else term.datatype or ''}\x1f{term}"
+        return LITERAL_KIND, text.encode("utf-8", "surrogatepass")
+    if isinstance(term, BNode):
+        return BNODE_KIND, str(term).encode("utf-8", "surrogatepass")
+    return URI_KIND, str(term).encode("utf-8", "surrogatepass")
+
+
+def decode_term(kind: int, data: bytes) -> Node:
+    """Decode an RDF term from its kind and UTF-8 bytes."""
+    text = bytes(data).decode("utf-8", "surrogatepass")
+    if kind == LITERAL_KIND:
+        lang, datatype, value = text.split("\x1f", 2)
+        return Literal(value, lang=lang or None, datatype=URIRef(datatype) if datatype else None)
+    if kind == BNODE_KIND:
+        return BNode(text)
+    return URIRef(text)
+
+
+class TermDictionary:
+    """Dictionary encoding RDF terms to integer IDs."""
+
+    def __init__(self) -> None:
+        self.ids: dict[Node, int] = {}
+        self.kinds = bytearray()
+        self.offsets = array("Q", [0])
+        self.blob = bytearray()
+
+    def __len__(self) -> int:
+        return len(self.kinds)
+
+    def encode(self, term: Node) -> int:
+        """Get the ID of a term, adding it to the dictionary if new."""
+        term_id = self.ids.get(term)
+        if term_id is None:
+            term_id = len(self.kinds)
+            kind, data = encode_term(term)
+            self.ids[term] = term_id
+            self.kinds.append(kind)
+            self.blob += data
+            self.offsets.append(len(self.blob))
+        return term_id
+
+    def sections(self) -> dict[str, Section]:
+        """Get the binary sections storing the dictionary."""
+        return {"term_kinds": bytes(self.kinds), "term_offsets": self.offsets, "term_blob": bytes(self.blob)}
+
+
+def write_sections(path: str, header: dict[str, Any], sections: dict[str, Section]) -> None:
+    """Atomically write binary sections, and a JSON header describing their position, to a file."""
+    header = {**header, "byteorder": sys.byteorder, "sections": {}}
+    offset = 0
+    for name, data in sections.items():
+        typecode = data.typecode if isinstance(data, array) else "B"
+        size = len(data) * data.itemsize if isinstance(data, array) else len(data)
+        header["sections"][name] = {"offset": offset, "size": size, "typecode": typecode}
+        offset += size + (-size % 8)
+    header_bytes = json.dumps(header).encode()
+    header_bytes += b" " * (-(len(MAGIC) + 8 + len(header_bytes)) % 8)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(MAGIC)
+        f.write(struct.pack("<Q", len(header_bytes)))
+        f.write(header_bytes)
+        for data in sections.values():
+            raw = data.tobytes() if isinstance(data, array) else data
+            f.write(raw)
+            f.write(b"\0" * (-len(raw) % 8))
+    os.replace(tmp_path, path)
+
+
+def read_sections(buffer: Any) -> tuple[dict[str, Any], dict[str, memoryview]]:
+    """Read the JSON header and the binary sections from a buffer (bytes or mmap) without copying them."""
+    view = memoryview(buffer)
+    if bytes(view[: len(MAGIC)]) != MAGIC:
+        raise ValueError("Not an rdflib-endpoint snapshot file")
+    (header_size,) = struct.unpack("<Q", view[len(MAGIC) : len(MAGIC) + 8])
+    start = len(MAGIC) + 8 + header_size
+    header = json.loads(bytes(view[len(MAGIC) + 8 : start]))
+    sections: dict[str, memoryview] = {}
+    for name, section in header["sections"].items():
+        data = view[start + section["offset"] : start + section["offset"] + section["size"]]
+        sections[name] = data if section["typecode"] == "B" else data.cast(section["typecode"])
+    return header, sections
+
+
+def section_array(header: dict[str, Any], sections: dict[str, memoryview], name: str) -> array:
+    """Copy a section in an array, swapping bytes if the snapshot was written on a machine with another byte order."""
+    data = array(header["sections"][name]["typecode"])
+    data.frombytes(sections[name].cast("B"))
+    if header["byteorder"] != sys.byteorder:
+        data.byteswap()
+    return data
+
+
+def decode_terms(header: dict[str, Any], sections: dict[str, memoryview]) -> list[Node]:
+    """Decode all the terms of a snapshot dictionary."""
+    kinds = sections["term_kinds"]
+    offsets = section_array(header, sections, "term_offsets")
+    blob = sections["term_blob"]
+    return [decode_term(kinds[i], blob[offsets[i] : offsets[i + 1]]) for i in range(len(kinds))]
+
+
+def dataset_quads(g: Dataset) -> Iterator[Quad]:
+    """Iterate over the quads of a dataset, with the identifier of their graph."""
+    for s, p, o, c in g.quads((None, None, None, None)):
+        graph_id = getattr(c, "identifier", c)
+        yield s, p, o, graph_id if graph_id is not None else DATASET_DEFAULT_GRAPH_ID
+
+
+def write_snapshot(path: str, quads: Iterable[Quad], key: dict[str, Any]) -> int:
+    """Write quads to a snapshot file, returns the number of quads written."""
+    terms = TermDictionary()
+    quad_ids = array("I")
+    for quad in quads:
+        quad_ids.extend(terms.encode(term) for term in quad)
+    header = {"version": VERSION, "key": key, "terms": len(terms), "quads": len(quad_ids) // 4}
+    write_sections(path, header, {**terms.sections(), "quads": quad_ids})
+    return len(quad_ids) // 4
+
+
+def read_snapshot_key(path: str) -> dict[str, Any] | None:
+    """Read the key of the files a snapshot was built from, None if the snapshot is missing or unreadable."""
+    try:
+        with open(path, "rb") as f:
+            if f.read(len(MAGIC)) != MAGIC:
+                return None
+            (header_size,) = struct.unpack("<Q", f.read(8))
+            header = json.loads(f.read(header_size))
+    except (OSError, ValueError, struct.error):
+        return None
+    if header.get("version") != VERSION:
+        return None
+    return header.get("key")
+
+
+def iter_snapshot_quads(path: str) -> Iterator[Quad]:
+    """Iterate over the quads stored in a snapshot file."""
+    with open(path, "rb") as f:
+        header, sections = read_sections(f.read())
+    terms = decode_terms(header, sections)
+    quad_ids = section_array(header, sections, "quads")
+    for i in range(0, len(quad_ids), 4):
+        yield terms[quad_ids[i]], terms[quad_ids[i + 1]], terms[quad_ids[i + 2]], terms[quad_ids[i + 3]]
+
+
+def load_with_snapshot(
+    g: Dataset,
+    files: list[str],
+    snapshot_dir: str,
+    jobs: int = 1,
+    on_loaded: Callable[[LoadedFile], None] | None = None,
+    lock: Callable[[], ContextManager[Any]] | None = None,
+) -> bool:
+    """Load files in a dataset from their snapshot if it is up to date, otherwise parse them and write the snapshot.
+
+    `lock` returns the context manager held to add each batch of quads, like for `load_files`.
+    Returns True if the dataset was loaded from the snapshot.
+    """
+    key = snapshot_key(files)
+    path = snapshot_path(snapshot_dir, files)
+    if read_snapshot_key(path) == key:
+        start = time.perf_counter()
+        quads = list(iter_snapshot_quads(path))
+        with lock() if lock is not None else contextlib.nullcontext():
+            add_quads(g, quads)
+        if on_loaded:
+            on_loaded(LoadedFile(path, time.perf_counter() - start, os.path.getsize(path), len(quads)))
+        return True
+    load_files(g, files, jobs=jobs, on_loaded=on_loaded, lock=lock)
+    os.makedirs(snapshot_dir, exist_ok=True)
+    write_snapshot(path, dataset_quads(g), key)
+    return False
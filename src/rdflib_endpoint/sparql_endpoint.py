@@ -6,8 +6,12 @@ from fastapi.middleware.cors import CORSMiddleware
 from rdflib import Dataset, Graph
 from rdflib.query import Processor
 
+from rdflib_endpoint.federation import Federation
+from rdflib_endpoint.jobs import QueryJobs
+from rdflib_endpoint.loader import LoadProgress
 from rdflib_endpoint.sparql_router import SparqlRouter
 from rdflib_endpoint.utils import Defaults, QueryExample
+from rdflib_endpoint.watcher import FileWatcher
 
 
 class SparqlEndpoint(FastAPI):
@@ -30,6 +34,15 @@ class SparqlEndpoint(FastAPI):
         favicon: str = Defaults.favicon,
         example_queries: Optional[Dict[str, QueryExample]] = None,
         example_query: Optional[str] = None,
+        loading: Optional[LoadProgress] = None,
+        serve_partial: bool = False,
+        watcher: Optional[FileWatcher] = None,
+        void_statistics: bool = False,
+        optimize_joins: bool = False,
+        federation: Optional[Federation] = None,
+        query_workers: int = 4,
+        jobs: Optional[QueryJobs] = None,
+        memory_budget: Optional[int] = None,
         **kwargs: Any,
     ) -> None:
         """
@@ -52,6 +65,15 @@ class SparqlEndpoint(FastAPI):
             favicon: A URL to a favicon to be used for the endpoint.
             example_queries: A dictionary of example queries to be displayed in YASGUI tabs. If empty and a `DatasetExt` with custom functions is provided, they will be extracted from docstrings.
             example_query: DEPRECATED: use `example_queries` instead, the first one will be used as default YASGUI tab.
+            loading: The progress of files loaded in the graph in the background, returned by `load_in_background`. SPARQL requests are answered with a 503 until the load is over.
+            serve_partial: Answer SPARQL queries against the partially loaded graph while loading in the background, instead of a 503.
+            watcher: A `FileWatcher` of the files loaded in the graph, started with the app to reload the files that change.
+            void_statistics: Compute VoID statistics of the graph, served in the service description and at `/.well-known/void` under the endpoint path, and updated by SPARQL updates.
+            optimize_joins: Order the triple patterns of each BGP by their number of results estimated from statistics of the graph.
+            federation: A `Federation` sending the SERVICE clauses of federated queries to remote endpoints with pooled connections, concurrency limits and timeouts.
+            query_workers: Number of threads evaluating SPARQL requests concurrently. Concurrent requests for the same query share a single evaluation.
+            jobs: `QueryJobs` running the queries submitted to the `/jobs` route in the background, and keeping their results on disk.
+            memory_budget: Number of bytes of solutions each `ORDER BY` sorts in memory, beyond which they are sorted in temporary files. It does not bound the whole query, the results of a query without `LIMIT` are still materialized when serialized.
         """
         self.title = title
         self.description = description
@@ -80,6 +102,15 @@ class SparqlEndpoint(FastAPI):
             favicon=favicon,
             example_queries=example_queries,
             example_query=example_query,
+            loading=loading,
+            serve_partial=serve_partial,
+            watcher=watcher,
+            void_statistics=void_statistics,
+            optimize_joins=optimize_joins,
+            federation=federation,
+            query_workers=query_workers,
+            jobs=jobs,
+            memory_budget=memory_budget,
         )
         self.include_router(sparql_router)
 
@@ -1,26 +1,40 @@
+import asyncio
+import concurrent.futures
+import contextvars
+import functools
 import inspect
 import json
 import logging
 import os
 import re
 import textwrap
+import time
 import warnings
 from importlib import resources
-from typing import Any, Callable, Dict, List, Optional, Union
+from typing import Any, Callable, ContextManager, Dict, List, Optional, Set, Tuple, Union
 from urllib import parse
 
 from fastapi import APIRouter, Query, Request, Response
-from fastapi.responses import JSONResponse
+from fastapi.responses import FileResponse, JSONResponse
 from rdflib import RDF, BNode, Dataset, Graph, Literal, URIRef
+from rdflib.graph import DATASET_DEFAULT_GRAPH_ID
 from rdflib.namespace import DC, RDFS
-from rdflib.plugins.sparql import CUSTOM_EVALS, prepareQuery, prepareUpdate
+from rdflib.plugins.sparql import prepareQuery, prepareUpdate
 from rdflib.plugins.sparql.evaluate import evalPart
 from rdflib.plugins.sparql.evalutils import _eval
 from rdflib.plugins.sparql.parserutils import CompValue
 from rdflib.plugins.sparql.sparql import QueryContext, SPARQLError
 from rdflib.query import Processor
+from rdflib.term import Node
 
-from rdflib_endpoint.dataset_ext import DatasetExt, _func_name
+from rdflib_endpoint.concurrency import ReadWriteLock, SingleFlight
+from rdflib_endpoint.dataset_ext import DatasetExt, _func_name, scoped_custom_evals
+from rdflib_endpoint.federation import Federation, eval_service, inline_local_services, prepare_query
+from rdflib_endpoint.jobs import QueryJobs
+from rdflib_endpoint.loader import LoadProgress
+from rdflib_endpoint.native import eval_native, native_query, native_store, needs_python, uses_iris
+from rdflib_endpoint.optimizer import eval_reordered_bgp
+from rdflib_endpoint.spill import eval_spilling_order_by
 from rdflib_endpoint.utils import (
     API_RESPONSES,
     FORMATS,
@@ -31,8 +45,20 @@ from rdflib_endpoint.utils import (
     Defaults,
     QueryExample,
     get_default_content_type,
+    normalize_query,
     parse_accept_header,
 )
+from rdflib_endpoint.void import VoidStatistics
+from rdflib_endpoint.watcher import FileReload, FileWatcher
+
+
+def _batch_item(item: Any) -> Tuple[str, str]:
+    """Get the query and the accepted media type of an item of a batch of queries."""
+    if isinstance(item, str):
+        return item, "application/sparql-results+json"
+    if isinstance(item, dict) and isinstance(item.get("query"), str):
+        return item["query"], str(item.get("accept") or "application/sparql-results+json")
+    raise ValueError("each query must be a string, or an object with a `query` string")
 
 
 class SparqlRouter(APIRouter):
@@ -55,6 +81,15 @@ class SparqlRouter(APIRouter):
         favicon: str = Defaults.favicon,
         example_queries: Optional[Dict[str, QueryExample]] = None,
         example_query: Optional[str] = None,
+        loading: Optional[LoadProgress] = None,
+        serve_partial: bool = False,
+        watcher: Optional[FileWatcher] = None,
+        void_statistics: bool = False,
+        optimize_joins: bool = False,
+        federation: Optional[Federation] = None,
+        query_workers: int = 4,
+        jobs: Optional[QueryJobs] = None,
+        memory_budget: Optional[int] = None,
         **kwargs: Any,
     ) -> None:
         """Create a SPARQL endpoint router.
@@ -74,6 +109,15 @@ class SparqlRouter(APIRouter):
             example_queries: A dictionary of example queries to be displayed in YASGUI tabs. If empty and a `DatasetExt` with custom functions is provided, they will be extracted from docstrings. The first query is used as the default YASGUI tab.
             favicon: A URL to a favicon to be used for the endpoint.
             example_query: DEPRECATED: use `example_queries` instead, the first one will be used as default YASGUI tab.
+            loading: The progress of files loaded in the graph in the background, returned by `load_in_background`. SPARQL requests are answered with a 503 until the load is over.
+            serve_partial: Answer SPARQL queries against the partially loaded graph while loading in the background, instead of a 503.
+            watcher: A `FileWatcher` of the files loaded in the graph, started with the app to reload the files that change.
+            void_statistics: Compute VoID statistics of the graph (class and property partitions, distinct subjects and objects), served in the service description and at `/.well-known/void` under the endpoint path, and updated by SPARQL updates.
+            optimize_joins: Order the triple patterns of each BGP by their number of results estimated from statistics of the graph, instead of their order in the query.
+            federation: A `Federation` sending the SERVICE clauses of federated queries to remote endpoints with pooled connections, concurrency limits and timeouts, instead of RDFLib.
+            query_workers: Number of threads evaluating SPARQL requests concurrently. Concurrent requests for the same query share a single evaluation.
+            jobs: `QueryJobs` running the queries submitted to the `/jobs` route in the background, and keeping their results on disk.
+            memory_budget: Number of bytes of solutions each `ORDER BY` sorts in memory, beyond which they are sorted in temporary files. Unlimited by default. It does not bound the whole query, the results of a query without `LIMIT` are still materialized when serialized.
         """
         self.graph = graph if graph is not None else Dataset(default_union=True)
         """RDFLib Graph for the SPARQL endpoint."""
@@ -97,6 +141,26 @@ class SparqlRouter(APIRouter):
             )
         self.enable_update = enable_update
         self.favicon = favicon
+        self.loading = loading
+        """Progress of the files loaded in the graph in the background."""
+        self.serve_partial = serve_partial
+        self.watcher = watcher
+        """Watcher reloading the files of the graph when they change."""
+        self.void_statistics = void_statistics
+        self.statistics: Optional[VoidStatistics] = None
+        """VoID statistics of the graph, computed once the graph is loaded."""
+        if void_statistics or optimize_joins:
+            self.statistics = VoidStatistics.from_graph(self.graph) if loading is None else VoidStatistics()
+        self.query_workers = query_workers
+        self.graph_lock = ReadWriteLock()
+        """Lock shared by the queries being evaluated, and held alone to apply updates and reloaded files."""
+        self.generation = 0
+        """Number of changes applied to the graph by SPARQL updates and reloaded files."""
+        self._query_flights = SingleFlight()
+        self._parsed_queries = functools.lru_cache(maxsize=256)(self._prepare_query)
+        self._query_executor: Optional[concurrent.futures.ThreadPoolExecutor] = None
+        self.jobs = jobs
+        """Queries run in the background, with their results kept on disk."""
 
         # Instantiate APIRouter
         super().__init__(
@@ -105,15 +169,71 @@ class SparqlRouter(APIRouter):
             **kwargs,
         )
 
-        # Save custom function in custom evaluation dictionary
+        # Save custom function in the router custom evaluation dictionary, only active for this router queries
         # Handle multiple functions directly in the evalCustomFunctions function
+        self.custom_evals: Dict[str, Callable[..., Any]] = {}
+        """Custom RDFLib evaluation functions used for the queries of this router."""
         if custom_eval:
-            CUSTOM_EVALS["evalCustomFunctions"] = custom_eval
+            self.custom_evals["evalCustomFunctions"] = custom_eval
         elif len(self.functions) > 0:
-            CUSTOM_EVALS["evalCustomFunctions"] = self.eval_custom_functions
+            self.custom_evals["evalCustomFunctions"] = self.eval_custom_functions
+        self.federation = federation
+        """Client sending the SERVICE clauses of federated queries to remote endpoints."""
+        if federation is not None:
+            self.custom_evals["evalService"] = functools.partial(eval_service, federation)
+        self.native_store = native_store(self.graph) if processor == "sparql" and not custom_eval else None
+        """Oxigraph store running the queries which do not use custom functions, when the graph uses `oxrdflib`."""
+        self.native_queries = 0
+        self.native_subqueries = 0
+        if self.native_store is not None:
+            self.custom_evals["evalNative"] = self.eval_native
+        if optimize_joins and self.statistics is not None:
+            self.custom_evals["evalReorderedBGP"] = functools.partial(eval_reordered_bgp, self.statistics)
+        self.memory_budget = memory_budget
+        """Number of bytes of solutions sorted in memory by each `ORDER BY`, beyond which they are sorted on disk."""
+        if memory_budget is not None:
+            self.custom_evals["evalSpillingOrderBy"] = functools.partial(eval_spilling_order_by, memory_budget)
 
         self.prepare_sd_graph()
 
+        if self.loading is not None:
+            # The partially loaded data is queried while the loader adds quads
+            self.loading.lock = self.graph_lock
+            # The service description and VoID statistics are computed in the loading thread, not by a request
+            self.loading.when_ready(self._describe_data)
+
+        if self.watcher is not None:
+            watcher = self.watcher
+            # Reloaded files are applied once the queries being evaluated are done
+            watcher.lock = self.graph_lock
+            if self.statistics is not None:
+                statistics = self.statistics
+
+                def count_reload(reload: FileReload) -> None:
+                    # Counted with the changes, before an update can change the same quads
+                    statistics.remove_quads(reload.removed_quads)
+                    statistics.add_quads(reload.added_quads)
+
+                watcher.on_apply = count_reload
+
+            async def start_watcher() -> None:
+                loop = asyncio.get_running_loop()
+
+                def on_reload(_reloads: List[Any]) -> Any:
+                    self.generation += 1
+                    # The service description is rebuilt in a thread, then swapped in
+                    return loop.run_in_executor(None, self._describe_data, False)
+
+                watcher.start(on_reload)
+
+            self.add_event_handler("startup", start_watcher)
+            self.add_event_handler("shutdown", watcher.stop)
+        if self.federation is not None:
+            self.add_event_handler("shutdown", self.federation.close)
+        self.add_event_handler("shutdown", self._shutdown_query_executor)
+        if self.jobs is not None:
+            self.add_event_handler("shutdown", self.jobs.close)
+
         async def handle_sparql_request(
             request: Request, query: Optional[str] = None, update: Optional[str] = None
         ) -> Response:
@@ -140,62 +260,17 @@ class SparqlRouter(APIRouter):
                         media_type="application/xml",
                     )
 
+            if not self.is_ready() and (update or not self.serve_partial):
+                return self._loading_response()
+
             # Pretty print the query object
             # from rdflib.plugins.sparql.algebra import pprintAlgebra
             # parsed_query = parser.parseQuery(query)
             # tq = algebraTranslateQuery(parsed_query)
             # pprintAlgebra(tq)
 
-            graph_ns = dict(self.graph.namespaces())
-
             if query:
-                try:
-                    parsed_query = prepareQuery(query, initNs=graph_ns)
-                    query_results = self.graph.query(parsed_query, processor=self.processor)
-
-                    query_operation = re.sub(r"(\w)([A-Z])", r"\1 \2", parsed_query.algebra.name)
-
-                    if query_operation == "Construct Query":
-                        content_type_to_rdflib_format = {
-                            **GRAPH_CONTENT_TYPE_TO_RDFLIB_FORMAT,
-                            **GENERIC_CONTENT_TYPE_TO_RDFLIB_FORMAT,
-                        }
-                    else:
-                        content_type_to_rdflib_format = {
-                            **SPARQL_RESULT_CONTENT_TYPE_TO_RDFLIB_FORMAT,
-                            **GENERIC_CONTENT_TYPE_TO_RDFLIB_FORMAT,
-                        }
-
-                    # Handle cases that are more complicated, like it includes multiple
-                    # types, extra information, etc.
-                    output_mime_type = get_default_content_type(query_operation)
-                    mime_types = parse_accept_header(request.headers.get("accept", output_mime_type))
-                    for mime_type in mime_types:
-                        if mime_type in content_type_to_rdflib_format:
-                            output_mime_type = mime_type
-                            # Use the first mime_type that matches
-                            break
-
-                    try:
-                        rdflib_format = content_type_to_rdflib_format.get(output_mime_type, output_mime_type)
-                        response = Response(
-                            query_results.serialize(format=rdflib_format),
-                            media_type=output_mime_type,
-                        )
-                    except Exception as e:
-                        logging.error(f"Error serializing the SPARQL query results with RDFLib: {e}")
-                        return JSONResponse(
-                            status_code=422,
-                            content={"message": f"Error serializing the SPARQL query results with RDFLib: {e}"},
-                        )
-                    else:
-                        return response
-                except Exception as e:
-                    logging.error(f"Error executing the SPARQL query on the RDFLib Graph: {e}")
-                    return JSONResponse(
-                        status_code=400,
-                        content={"message": f"Error executing the SPARQL query on the RDFLib Graph: {e}"},
-                    )
+                return await self.run_query(query, request.headers.get("accept"), str(request.base_url))
             else:  # Update
                 if not self.enable_update:
                     return JSONResponse(
@@ -210,8 +285,12 @@ class SparqlRouter(APIRouter):
                         return JSONResponse(status_code=403, content={"message": "Invalid API KEY."})
                 try:
                     prechecked_update: str = update  # type: ignore
-                    parsed_update = prepareUpdate(prechecked_update, initNs=graph_ns)
-                    self.graph.update(parsed_update, "sparql")
+                    parsed_update = prepareUpdate(prechecked_update, initNs=dict(self.graph.namespaces()))
+                    # The scoped custom evaluation functions are copied to the thread applying the update
+                    context = contextvars.copy_context()
+                    await asyncio.get_running_loop().run_in_executor(
+                        self._get_query_executor(), context.run, self._apply_update, parsed_update
+                    )
                     return Response(status_code=204)
                 except Exception as e:
                     logging.error(f"Error executing the SPARQL update on the RDFLib Graph: {e}")
@@ -229,7 +308,8 @@ class SparqlRouter(APIRouter):
             :param request: The HTTP GET request
             :param query: SPARQL query input.
             """
-            return await handle_sparql_request(request, query=query)
+            with scoped_custom_evals(self.custom_evals):
+                return await handle_sparql_request(request, query=query)
 
         async def post_sparql_endpoint(request: Request) -> Response:
             """Send a SPARQL query to be executed through HTTP POST operation.
@@ -261,7 +341,8 @@ class SparqlRouter(APIRouter):
                 # Response with the service description
                 query = None
                 update = None
-            return await handle_sparql_request(request, query, update)
+            with scoped_custom_evals(self.custom_evals):
+                return await handle_sparql_request(request, query, update)
 
         # Register the endpoint at both the path and its trailing-slash variant.
         # Relying on Starlette auto / redirect breaks behind a reverse proxy mounted on a sub-path
@@ -288,6 +369,168 @@ class SparqlRouter(APIRouter):
                 include_in_schema=endpoint_path == self.path,
             )
 
+        async def post_sparql_batch(request: Request) -> JSONResponse:
+            """Execute a JSON array of SPARQL queries concurrently, and get their results with their status and timing.
+
+            Each item is a query string, or an object with the `query` and the `accept` media type of its results
+            (`application/sparql-results+json` by default).
+            """
+            if not self.is_ready() and not self.serve_partial:
+                return self._loading_response()
+            try:
+                items = json.loads(await request.body())
+                if not isinstance(items, list):
+                    raise ValueError("the request body must be a JSON array")
+                queries = [_batch_item(item) for item in items]
+            except ValueError as e:
+                return JSONResponse(status_code=400, content={"message": f"Invalid batch of SPARQL queries: {e}"})
+            with scoped_custom_evals(self.custom_evals):
+                results = await asyncio.gather(
+                    *(self._run_batch_query(query, accept, str(request.base_url)) for query, accept in queries)
+                )
+            return JSONResponse(results)
+
+        self.add_api_route(
+            f"{self.path.rstrip('/')}/batch",
+            post_sparql_batch,
+            methods=["POST"],
+            name="SPARQL batch queries",
+        )
+
+        if self.jobs is not None:
+            jobs = self.jobs
+            jobs_path = f"{self.path.rstrip('/')}/jobs"
+
+            async def post_sparql_job(request: Request) -> JSONResponse:
+                """Submit a SPARQL query to run in the background, its results are serialized to the format negotiated
+                with the `accept` header. Returns the job, whose status can be polled until its results are ready."""
+                if not self.is_ready() and not self.serve_partial:
+                    return self._loading_response()
+                body = (await request.body()).decode("utf-8")
+                content_type = request.headers.get("content-type", "")
+                if "application/sparql-query" in content_type:
+                    query: Optional[str] = body
+                elif "application/x-www-form-urlencoded" in content_type:
+                    query = dict(parse.parse_qsl(body)).get("query")
+                else:
+                    query = request.query_params.get("query")
+                if not query:
+                    return JSONResponse(status_code=400, content={"message": "No SPARQL query to run"})
+                if jobs.is_full():
+                    return JSONResponse(
+                        status_code=429,
+                        content={"message": f"Too many query jobs, {jobs.max_jobs} are already queued or running"},
+                    )
+                try:
+                    parsed_query, local_services, query_operation, output_mime_type, rdflib_format = self._negotiate(
+                        query, request.headers.get("accept"), str(request.base_url)
+                    )
+                except Exception as e:
+                    logging.error(f"Error executing the SPARQL query on the RDFLib Graph: {e}")
+                    return JSONResponse(
+                        status_code=400,
+                        content={"message": f"Error executing the SPARQL query on the RDFLib Graph: {e}"},
+                    )
+                with scoped_custom_evals(self.custom_evals):
+                    # The scoped custom evaluation functions are copied to the thread running the job
+                    context = contextvars.copy_context()
+                run = functools.partial(
+                    context.run,
+                    self._write_query_results,
+                    query,
+                    parsed_query,
+                    query_operation,
+                    rdflib_format,
+                    native=not local_services,
+                )
+                job = jobs.submit(output_mime_type, run)
+                return JSONResponse(job.to_dict(), status_code=202, headers={"Location": f"{jobs_path}/{job.id}"})
+
+            async def get_sparql_job(job_id: str) -> JSONResponse:
+                """Get the status and progress of a query job."""
+                job = jobs.get(job_id)
+                if job is None:
+                    return JSONResponse(status_code=404, content={"message": f"No query job {job_id}"})
+                return JSONResponse(job.to_dict())
+
+            async def get_sparql_job_results(job_id: str) -> Response:
+                """Get the results of a query job, once it is done."""
+                job = jobs.get(job_id)
+                if job is None:
+                    return JSONResponse(status_code=404, content={"message": f"No query job {job_id}"})
+                if job.status == "failed":
+                    return JSONResponse(
+                        status_code=400,
+                        content={"message": f"Error executing the SPARQL query on the RDFLib Graph: {job.error}"},
+                    )
+                if job.status != "done":
+                    return JSONResponse(
+                        status_code=409, content={"message": f"The query job is {job.status}", **job.to_dict()}
+                    )
+                return FileResponse(job.path, media_type=job.media_type)
+
+            async def delete_sparql_job(job_id: str) -> Response:
+                """Remove a query job and its results."""
+                if not jobs.remove(job_id):
+                    return JSONResponse(status_code=404, content={"message": f"No query job {job_id}"})
+                return Response(status_code=204)
+
+            self.add_api_route(jobs_path, post_sparql_job, methods=["POST"], name="SPARQL query job")
+            self.add_api_route(
+                f"{jobs_path}/{{job_id}}", get_sparql_job, methods=["GET"], name="SPARQL query job status"
+            )
+            self.add_api_route(
+                f"{jobs_path}/{{job_id}}/results",
+                get_sparql_job_results,
+                methods=["GET"],
+                name="SPARQL query job results",
+            )
+            self.add_api_route(
+                f"{jobs_path}/{{job_id}}", delete_sparql_job, methods=["DELETE"], name="Remove SPARQL query job"
+            )
+
+        async def get_metrics() -> JSONResponse:
+            """Get the instrumentation metrics of the SPARQL endpoint, such as the custom functions calls and errors."""
+            return JSONResponse(self.get_metrics())
+
+        self.add_api_route(
+            f"{self.path.rstrip('/')}/metrics",
+            get_metrics,
+            methods=["GET"],
+            name="SPARQL endpoint metrics",
+        )
+
+        async def get_health_live() -> JSONResponse:
+            """Check the SPARQL endpoint process is up, even if it is still loading its data."""
+            return JSONResponse({"status": "live"})
+
+        async def get_health_ready() -> JSONResponse:
+            """Check the SPARQL endpoint data is loaded, returns a 503 with the load progress otherwise."""
+            ready = self.is_ready()
+            content = self.loading.to_dict() if self.loading else {"ready": True}
+            return JSONResponse(content, status_code=200 if ready else 503)
+
+        self.add_api_route(
+            f"{self.path.rstrip('/')}/health/live", get_health_live, methods=["GET"], name="SPARQL endpoint liveness"
+        )
+        self.add_api_route(
+            f"{self.path.rstrip('/')}/health/ready", get_health_ready, methods=["GET"], name="SPARQL endpoint readiness"
+        )
+
+        if self.statistics is not None and self.void_statistics:
+            statistics = self.statistics
+
+            async def get_void(request: Request) -> Response:
+                """Get the VoID description of the dataset, with its class and property partitions."""
+                void = statistics.to_graph(self.public_url)
+                if request.headers.get("accept") in ("application/rdf+xml", "application/xml"):
+                    return Response(void.serialize(format="xml"), media_type="application/rdf+xml")
+                return Response(void.serialize(format="turtle"), media_type="text/turtle")
+
+            self.add_api_route(
+                f"{self.path.rstrip('/')}/.well-known/void", get_void, methods=["GET"], name="VoID description"
+            )
+
         # @self.head(path, name="SPARQL endpoint HEAD", responses=API_RESPONSES)
         # async def head_sparql_endpoint(request: Request, query: Optional[str] = Query(None)) -> Response:
         #     """Handle HEAD requests to check endpoint availability."""
@@ -306,6 +549,300 @@ class SparqlRouter(APIRouter):
                 examples[_func_name(func).replace("_", " ").capitalize()] = {"query": query}
         return examples or None
 
+    def is_ready(self) -> bool:
+        """Check if the data loaded in the background is ready."""
+        return self.loading is None or self.loading.ready
+
+    def _describe_data(self, compute_statistics: bool = True) -> None:
+        """Refresh the service description of the data once it is loaded or reloaded, while no change is applied."""
+        with self.graph_lock.read():
+            self.refresh_service_description(compute_statistics)
+
+    async def run_query(self, query: str, accept: Optional[str] = None, base_url: Optional[str] = None) -> Response:
+        """Evaluate a SPARQL query in the query threads, and get its results in the format negotiated with `accept`.
+
+        `base_url` is the URL the request was sent to, SERVICE clauses calling the endpoint on its host are
+        evaluated in-process.
+
+        Parsed queries are cached, and concurrent calls for the same query, in the same format, on the same data,
+        share a single evaluation.
+        """
+        try:
+            parsed_query, local_services, query_operation, output_mime_type, rdflib_format = self._negotiate(
+                query, accept, base_url
+            )
+        except Exception as e:
+            logging.error(f"Error executing the SPARQL query on the RDFLib Graph: {e}")
+            return JSONResponse(
+                status_code=400,
+                content={"message": f"Error executing the SPARQL query on the RDFLib Graph: {e}"},
+            )
+
+        loop = asyncio.get_running_loop()
+        # The scoped custom evaluation functions are copied to the thread evaluating the query
+        context = contextvars.copy_context()
+
+        def evaluate() -> "asyncio.Future[Response]":
+            return loop.run_in_executor(
+                self._get_query_executor(),
+                context.run,
+                functools.partial(
+                    self._evaluate_query,
+                    query,
+                    parsed_query,
+                    dict(self.graph.namespaces()),
+                    query_operation,
+                    rdflib_format,
+                    output_mime_type,
+                    native=not local_services,
+                ),
+            )
+
+        if self.is_ready():
+            # Concurrent requests for the same query, in the same format, on the same data share its results
+            key = (normalize_query(query), output_mime_type, self.generation)
+            response = await self._query_flights.run(key, evaluate)
+        else:
+            response = await evaluate()
+        return Response(response.body, status_code=response.status_code, media_type=response.media_type)
+
+    def _negotiate(
+        self, query: str, accept: Optional[str], base_url: Optional[str] = None
+    ) -> Tuple[Any, int, str, str, str]:
+        """Parse a query, and get the media type and the RDFLib format of its results negotiated with `accept`.
+
+        Returns the parsed query, its number of SERVICE clauses evaluated in-process, its operation,
+        the media type and the RDFLib format of its results.
+        """
+        parsed_query, local_services = self._parsed_queries(query, tuple(self.graph.namespaces()), base_url)
+        query_operation = re.sub(r"(\w)([A-Z])", r"\1 \2", parsed_query.algebra.name)
+
+        if query_operation == "Construct Query":
+            content_type_to_rdflib_format = {
+                **GRAPH_CONTENT_TYPE_TO_RDFLIB_FORMAT,
+                **GENERIC_CONTENT_TYPE_TO_RDFLIB_FORMAT,
+            }
+        else:
+            content_type_to_rdflib_format = {
+                **SPARQL_RESULT_CONTENT_TYPE_TO_RDFLIB_FORMAT,
+                **GENERIC_CONTENT_TYPE_TO_RDFLIB_FORMAT,
+            }
+
+        # Handle cases that are more complicated, like it includes multiple
+        # types, extra information, etc.
+        output_mime_type = get_default_content_type(query_operation)
+        mime_types = parse_accept_header(accept or output_mime_type)
+        for mime_type in mime_types:
+            if mime_type in content_type_to_rdflib_format:
+                output_mime_type = mime_type
+                # Use the first mime_type that matches
+                break
+        rdflib_format = content_type_to_rdflib_format.get(output_mime_type, output_mime_type)
+        return parsed_query, local_services, query_operation, output_mime_type, rdflib_format
+
+    async def _run_batch_query(self, query: str, accept: str, base_url: Optional[str] = None) -> Dict[str, Any]:
+        """Run a query of a batch, and get its status, timing, and results or error message."""
+        start = time.perf_counter()
+        response = await self.run_query(query, accept, base_url)
+        result: Dict[str, Any] = {
+            "status": response.status_code,
+            "content_type": response.media_type,
+            "seconds": round(time.perf_counter() - start, 6),
+        }
+        body = bytes(response.body)
+        if response.status_code != 200:
+            result["error"] = json.loads(body).get("message")
+        elif str(response.media_type).endswith("json"):
+            result["results"] = json.loads(body)
+        else:
+            result["results"] = body.decode()
+        return result
+
+    def _loading_response(self) -> JSONResponse:
+        """Answer with a 503 and the load progress while the data is loaded in the background."""
+        loading: LoadProgress = self.loading  # type: ignore[assignment]
+        return JSONResponse(
+            status_code=503,
+            content={"message": "The SPARQL endpoint is still loading its data.", **loading.to_dict()},
+            headers={"Retry-After": str(loading.retry_after())},
+        )
+
+    def _prepare_query(
+        self, query: str, namespaces: Tuple[Tuple[str, URIRef], ...], base_url: Optional[str] = None
+    ) -> Tuple[Any, int]:
+        """Parse a query, and inline its SERVICE clauses calling this endpoint, cached by `_parsed_queries`.
+
+        SERVICE clauses call this endpoint when their IRI is its `public_url`, or when its path is the `path` of the
+        endpoint, with the host of the `public_url` or of the `base_url` the request was sent to, or without host.
+        """
+        graph_ns = dict(namespaces)
+        if self.federation is not None:
+            parsed_query = prepare_query(query, init_ns=graph_ns)
+        else:
+            parsed_query = prepareQuery(query, initNs=graph_ns)
+        # SERVICE clauses calling this endpoint are evaluated in-process instead of sending a request
+        endpoint_urls = {self.public_url} if base_url is None else {self.public_url, base_url}
+        local_services = inline_local_services(parsed_query, endpoint_urls, self.path)
+        return parsed_query, local_services
+
+    def _get_query_executor(self) -> concurrent.futures.ThreadPoolExecutor:
+        """Get the thread pool evaluating the SPARQL requests, created on first use."""
+        if self._query_executor is None:
+            self._query_executor = concurrent.futures.ThreadPoolExecutor(
+                max_workers=self.query_workers, thread_name_prefix="rdflib-endpoint-query"
+            )
+        return self._query_executor
+
+    def _shutdown_query_executor(self) -> None:
+        if self._query_executor is not None:
+            self._query_executor.shutdown(wait=False)
+            self._query_executor = None
+
+    def _evaluate_query(
+        self,
+        query: str,
+        parsed_query: Any,
+        graph_ns: Dict[str, Any],
+        query_operation: str,
+        rdflib_format: str,
+        output_mime_type: str,
+        native: bool = True,
+    ) -> Response:
+        """Evaluate a parsed query and serialize its results, while no change is applied to the graph."""
+        with self._query_lock(parsed_query):
+            try:
+                if native and self.native_store is not None and self._can_run_natively(parsed_query):
+                    native_results = self._run_natively(query, graph_ns, rdflib_format, query_operation)
+                    if native_results is not None:
+                        return Response(native_results, media_type=output_mime_type)
+                query_results = self.graph.query(parsed_query, processor=self.processor)
+            except Exception as e:
+                logging.error(f"Error executing the SPARQL query on the RDFLib Graph: {e}")
+                return JSONResponse(
+                    status_code=400,
+                    content={"message": f"Error executing the SPARQL query on the RDFLib Graph: {e}"},
+                )
+            try:
+                return Response(query_results.serialize(format=rdflib_format), media_type=output_mime_type)
+            except Exception as e:
+                logging.error(f"Error serializing the SPARQL query results with RDFLib: {e}")
+                return JSONResponse(
+                    status_code=422,
+                    content={"message": f"Error serializing the SPARQL query results with RDFLib: {e}"},
+                )
+
+    def _write_query_results(
+        self,
+        query: str,
+        parsed_query: Any,
+        query_operation: str,
+        rdflib_format: str,
+        output: Any,
+        native: bool = True,
+    ) -> None:
+        """Evaluate a parsed query, and serialize its results to a binary file as they are evaluated."""
+        # Jobs may hold the lock for minutes, the queries are not kept waiting behind the updates waiting for them
+        with self._query_lock(parsed_query, background=True):
+            if native and self.native_store is not None and self._can_run_natively(parsed_query):
+                graph_ns = dict(self.graph.namespaces())
+                native_results = self._run_natively(query, graph_ns, rdflib_format, query_operation)
+                if native_results is not None:
+                    output.write(native_results)
+                    return
+            self.graph.query(parsed_query, processor=self.processor).serialize(destination=output, format=rdflib_format)
+
+    def _query_lock(self, parsed_query: Any, background: bool = False) -> ContextManager[None]:
+        """Get the lock held to evaluate a query, alone for the queries calling graph functions.
+
+        Graph functions add temporary graphs to the dataset while the query is evaluated, which would be seen by the
+        other queries, and removed while another query calling the same function reads them.
+        """
+        if isinstance(self.graph, DatasetExt):
+            graph_function_iris = {
+                meta.iri for meta in self.graph._custom_functions.values() if meta.func_type == "graph_function"
+            }
+            if graph_function_iris and uses_iris(parsed_query, graph_function_iris):
+                return self.graph_lock.write()
+        return self.graph_lock.read(background=background)
+
+    def _apply_update(self, parsed_update: Any) -> None:
+        """Apply a parsed update to the graph, once the queries being evaluated are done."""
+        with self.graph_lock.write():
+            try:
+                if self.statistics is not None:
+                    self.statistics.apply_update(self.graph, parsed_update)
+                    self.refresh_service_description(compute_statistics=False)
+                else:
+                    self.graph.update(parsed_update, "sparql")
+            finally:
+                # Even a failed update may have changed the graph
+                self.generation += 1
+
+    def _can_run_natively(self, parsed_query: Any) -> bool:
+        """Check if a query can be run by the native Oxigraph engine, without the custom functions of the endpoint."""
+        if parsed_query.algebra.name not in ("SelectQuery", "AskQuery", "ConstructQuery"):
+            return False
+        return not needs_python(parsed_query, self._function_iris())
+
+    def _function_iris(self) -> Set[URIRef]:
+        """Get the IRIs of the custom functions of the endpoint, which are evaluated in Python."""
+        function_iris = {URIRef(function_uri) for function_uri in self.functions}
+        if isinstance(self.graph, DatasetExt):
+            function_iris.update(meta.iri for meta in self.graph._custom_functions.values())
+        return function_iris
+
+    def eval_native(self, ctx: QueryContext, part: CompValue) -> Any:
+        """Evaluate the graph patterns which do not use custom functions with the native Oxigraph engine,
+        in queries which use custom functions and are evaluated by RDFLib."""
+        results = eval_native(self.native_store, self._function_iris(), ctx, part)
+        self.native_subqueries += 1
+        return results
+
+    def _run_natively(
+        self, query: str, graph_ns: Dict[str, Any], rdflib_format: str, query_operation: str
+    ) -> Optional[bytes]:
+        """Run a query with the native Oxigraph engine, None to run it with RDFLib instead."""
+        try:
+            results = native_query(
+                self.native_store,
+                self.graph,
+                query,
+                graph_ns,
+                rdflib_format,
+                construct=query_operation == "Construct Query",
+            )
+        except Exception as e:
+            # Oxigraph does not support some extensions of RDFLib
+            logging.warning(f"Error executing the SPARQL query with Oxigraph, running it with RDFLib instead: {e}")
+            return None
+        if results is not None:
+            self.native_queries += 1
+        return results
+
+    def get_metrics(self) -> Dict[str, Any]:
+        """Get the instrumentation metrics of the SPARQL endpoint."""
+        metrics: Dict[str, Any] = {}
+        # Queries evaluated, and requests which got the results of the same query evaluated for a concurrent request
+        metrics["queries"] = {"evaluated": self._query_flights.runs, "coalesced": self._query_flights.coalesced}
+        if self.jobs is not None:
+            # Number of queued, running, done and failed query jobs
+            metrics["jobs"] = self.jobs.stats()
+        if self.native_store is not None:
+            # Queries run by the native Oxigraph engine instead of RDFLib
+            metrics["native_queries"] = self.native_queries
+            # Graph patterns of queries run by RDFLib evaluated by the Oxigraph engine
+            metrics["native_subqueries"] = self.native_subqueries
+        if self.federation is not None:
+            # Requests, errors and timeouts of each remote endpoint called by SERVICE clauses
+            metrics["federation"] = self.federation.stats()
+            if self.federation.cache is not None:
+                # Hits, misses, hit rate and memory size of the cache of SERVICE responses
+                metrics["federation_cache"] = self.federation.cache.stats()
+        if isinstance(self.graph, DatasetExt):
+            # Calls, errors and circuit breaker state of each custom function
+            metrics["functions"] = self.graph.get_function_stats()
+        return metrics
+
     def eval_custom_functions(self, ctx: QueryContext, part: CompValue) -> List[Any]:
         """Retrieve variables from a SPARQL-query, then execute registered SPARQL functions
         The results are then stored in Literal objects and added to the query results.
@@ -433,40 +970,15 @@ class SparqlRouter(APIRouter):
             self.service_description.add((graph_node, RDF.type, SD.Graph))
 
             # Add named graphs to the dataset
-            if isinstance(self.graph, Dataset):
-                # Get the list of distinct graph names with a SPARQL query
-                results: Any = self.graph.query("SELECT DISTINCT ?g WHERE { GRAPH ?g { ?s ?p ?o } }")
-
-                for row in results:
-                    named_graph_node = BNode()
-                    graph_node = BNode()
-
-                    # Add the named graph reference
-                    self.service_description.add((dataset_node, SD.namedGraph, named_graph_node))
-                    self.service_description.add((named_graph_node, RDF.type, SD.NamedGraph))
-                    self.service_description.add((named_graph_node, SD.name, row.g))
-                    # self.service_description.add((named_graph_node, SD.entailmentRegime, URIRef("http://www.w3.org/ns/entailment/OWL-RDF-Based")))
-                    # self.service_description.add((named_graph_node, SD.supportedEntailmentProfile, URIRef("http://www.w3.org/ns/owl-profile/RL")))
-
-                    # Add graph metadata
-                    self.service_description.add((named_graph_node, SD.graph, graph_node))
-                    self.service_description.add((graph_node, RDF.type, SD.Graph))
-
-                    # Count triples in the named graph and add it to the description
-                    triple_count_query = f"SELECT (COUNT(*) AS ?count) WHERE {{ GRAPH <{row.g}> {{ ?s ?p ?o }} }}"
-                    count_result: Any = self.graph.query(triple_count_query)
-                    triple_count = next(iter(count_result), [Literal(0)])[0]
-                    # result_row: Any = next(iter(count_result), None)
-                    # triple_count = result_row.count if result_row else Literal(0)
-                    self.service_description.add((graph_node, URIRef("http://rdfs.org/ns/void#triples"), triple_count))
-
-        # Add custom functions to the service description
-        for custom_function_uri in [
-            key
-            for key in CUSTOM_EVALS
-            if key.startswith("urn:") or key.startswith("https://") or key.startswith("http://")
+            self._describe_named_graphs(dataset_node)
+            if self.statistics is not None and self.void_statistics:
+                self.statistics.describe(self.service_description, dataset_node)
+
+        # Add the custom functions of this endpoint dataset to the service description
+        dataset_functions = self.graph._custom_functions.values() if isinstance(self.graph, DatasetExt) else []
+        for function_uri in [
+            meta.iri for meta in dataset_functions if meta.func_type in ("extension_function", "graph_function")
         ]:
-            function_uri = URIRef(custom_function_uri)
             if (function_uri, RDF.type, SD.Function) not in self.service_description:
                 self.service_description.add((function_uri, RDF.type, SD.Function))
             if (sd_subj, SD.extensionFunction, function_uri) not in self.service_description:
@@ -489,3 +1001,56 @@ class SparqlRouter(APIRouter):
                     URIRef(custom_function_uri),
                 )
             )
+
+    def _describe_named_graphs(self, dataset_node: Node, service_description: Optional[Graph] = None) -> None:
+        """Add the named graphs of the dataset, and their number of triples, to the service description"""
+        if not isinstance(self.graph, Dataset):
+            return
+        sd = service_description if service_description is not None else self.service_description
+        # Count the triples of each graph in a single pass over the graphs, using the length of the store for each
+        # context instead of a COUNT query per graph. The default graph is not a named graph in SPARQL, and empty
+        # graphs are not described, like with `GRAPH ?g { ?s ?p ?o }`
+        for graph in list(self.graph.graphs()):
+            if graph.identifier == DATASET_DEFAULT_GRAPH_ID:
+                continue
+            triple_count = len(graph)
+            if not triple_count:
+                continue
+            named_graph_node = BNode()
+            graph_node = BNode()
+
+            # Add the named graph reference
+            sd.add((dataset_node, SD.namedGraph, named_graph_node))
+            sd.add((named_graph_node, RDF.type, SD.NamedGraph))
+            sd.add((named_graph_node, SD.name, graph.identifier))
+            # sd.add((named_graph_node, SD.entailmentRegime, URIRef("http://www.w3.org/ns/entailment/OWL-RDF-Based")))
+            # sd.add((named_graph_node, SD.supportedEntailmentProfile, URIRef("http://www.w3.org/ns/owl-profile/RL")))
+
+            # Add graph metadata, with the number of triples in the named graph
+            sd.add((named_graph_node, SD.graph, graph_node))
+            sd.add((graph_node, RDF.type, SD.Graph))
+            sd.add((graph_node, URIRef("http://rdfs.org/ns/void#triples"), Literal(triple_count)))
+
+    def refresh_service_description(self, compute_statistics: bool = True) -> None:
+        """Update the named graphs and their number of triples in the service description, e.g. after loading data.
+
+        The updated description is built on a copy, then swapped in, so that it can be refreshed while serving requests.
+        The VoID statistics are computed again, unless `compute_statistics` is False because they are already up to date.
+        """
+        if self.statistics is not None and compute_statistics:
+            self.statistics.compute(self.graph)
+        sd = Graph()
+        for prefix, namespace in self.service_description.namespaces():
+            sd.bind(prefix, namespace, override=True)
+        for triple in self.service_description:
+            sd.add(triple)
+        for dataset_node in list(sd.objects(None, SD.defaultDataset)):
+            for named_graph_node in list(sd.objects(dataset_node, SD.namedGraph)):
+                for graph_node in list(sd.objects(named_graph_node, SD.graph)):
+                    sd.remove((graph_node, None, None))
+                sd.remove((named_graph_node, None, None))
+                sd.remove((dataset_node, SD.namedGraph, named_graph_node))
+            self._describe_named_graphs(dataset_node, sd)
+            if self.statistics is not None and self.void_statistics:
+                self.statistics.describe(sd, dataset_node)
+        self.service_description = sd
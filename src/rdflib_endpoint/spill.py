@@ -0,0 +1,144 @@
+"""Keep the solutions sorted by an `ORDER BY` within a memory budget, sorting them on disk beyond it.
+
+RDFLib sorts the solutions of `ORDER BY` in a Python list, so a single query sorting a large result set can use all
+the memory of the endpoint. The solutions are buffered up to `max_bytes` (estimated from the size of their terms)
+instead, then each full buffer is sorted and written to a temporary file, and the sorted files are merged while the
+solutions are read back. Files are removed once the solutions are consumed.
+
+The budget bounds each `ORDER BY` sort, not the whole query: the results of a query without `LIMIT` are still
+materialized when they are serialized.
+"""
+
+from __future__ import annotations
+
+import functools
+import heapq
+import pickle
+import sys
+import tempfile
+from typing import Any, Callable, Iterable, Iterator, Mapping
+
+from rdflib.plugins.sparql.evaluate import _val, evalPart
+from rdflib.plugins.sparql.parserutils import CompValue, value
+from rdflib.plugins.sparql.sparql import FrozenBindings, FrozenDict, QueryContext
+
+_SOLUTION_OVERHEAD = 240
+"""Approximate number of bytes used by a solution without its terms: the mapping and its dictionary."""
+_READ_BATCH = 1000
+"""Number of solutions read from a file at once, by default."""
+
+
+def estimate_size(solution: Mapping[Any, Any]) -> int:
+    """Estimate the number of bytes used by a solution, counting its variables and terms as if they were not shared."""
+    return _SOLUTION_OVERHEAD + sum(sys.getsizeof(var) + sys.getsizeof(term) for var, term in solution.items())
+
+
+class _SortedRun:
+    """Sorted solutions written to a temporary file, read back in batches of `read_batch` solutions by the merge.
+
+    Solutions are read back with the context of the first solution written.
+    """
+
+    def __init__(self, solutions: list[Mapping[Any, Any]]) -> None:
+        self._file = tempfile.TemporaryFile(prefix="rdflib-endpoint-spill-")  # noqa: SIM115
+        self._ctx: QueryContext | None = getattr(solutions[0], "ctx", None) if solutions else None
+        for solution in solutions:
+            # The context of the solutions is shared by all of them, only their terms are written
+            pickle.dump(dict(solution), self._file, protocol=pickle.HIGHEST_PROTOCOL)
+        self._end = self._file.tell()
+        self.count = len(solutions)
+        """Number of solutions written."""
+        self.read_batch = _READ_BATCH
+        """Number of solutions read from the file at once."""
+
+    def __iter__(self) -> Iterator[Mapping[Any, Any]]:
+        file = self._file
+        file.seek(0)
+        while file.tell() < self._end:
+            batch = [pickle.load(file) for _ in range(self.read_batch) if file.tell() < self._end]  # noqa: S301
+            for solution in batch:
+                yield FrozenBindings(self._ctx, solution) if self._ctx is not None else FrozenDict(solution)
+
+    def close(self) -> None:
+        """Remove the temporary file."""
+        self._file.close()
+
+
+@functools.total_ordering
+class _Descending:
+    """Sort key in descending order."""
+
+    __slots__ = ("key",)
+
+    def __init__(self, key: Any) -> None:
+        self.key = key
+
+    def __eq__(self, other: object) -> bool:
+        return isinstance(other, _Descending) and self.key == other.key
+
+    def __lt__(self, other: _Descending) -> bool:
+        return bool(other.key < self.key)
+
+    __hash__ = None  # type: ignore[assignment]
+
+
+def external_sort(
+    solutions: Iterable[Mapping[Any, Any]], key: Callable[[Any], Any], max_bytes: int
+) -> Iterator[Mapping[Any, Any]]:
+    """Sort solutions like `sorted`, writing sorted runs of `max_bytes` to temporary files merged at the end.
+
+    The sort is stable: solutions with the same key keep their order. At most `max_bytes` of solutions are held
+    while sorting, and while merging the runs.
+    """
+    runs: list[_SortedRun] = []
+    buffer: list[Mapping[Any, Any]] = []
+    size = 0
+    run_sizes: list[int] = []
+    try:
+        for solution in solutions:
+            buffer.append(solution)
+            size += estimate_size(solution)
+            if size > max_bytes:
+                buffer.sort(key=key)
+                runs.append(_SortedRun(buffer))
+                run_sizes.append(size)
+                buffer = []
+                size = 0
+        buffer.sort(key=key)
+        if not runs:
+            yield from buffer
+            return
+        if buffer:
+            # The last solutions are written too, so that only the batches read from the runs are held by the merge
+            runs.append(_SortedRun(buffer))
+            run_sizes.append(size)
+            buffer = []
+        # The batches read from all the runs at once fit in the memory budget
+        for run, run_size in zip(runs, run_sizes):
+            run.read_batch = max(1, run.count * max_bytes // (len(runs) * run_size))
+        # Runs are merged in the order they were read, so that the merge is stable too
+        yield from heapq.merge(*runs, key=key)
+    finally:
+        for run in runs:
+            run.close()
+
+
+def order_by_key(part: CompValue) -> Callable[[Any], Any]:
+    """Get the sort key of the solutions of an `ORDER BY`, ordering them like RDFLib."""
+    conditions = [(condition.expr, bool(condition.order and condition.order == "DESC")) for condition in part.expr]
+
+    def key(solution: Any) -> tuple[Any, ...]:
+        keys = []
+        for expr, descending in conditions:
+            condition_key = _val(value(solution, expr, variables=True))
+            keys.append(_Descending(condition_key) if descending else condition_key)
+        return tuple(keys)
+
+    return key
+
+
+def eval_spilling_order_by(max_bytes: int, ctx: QueryContext, part: CompValue) -> Any:
+    """Custom evaluation of `ORDER BY` sorting the solutions on disk when they exceed `max_bytes`."""
+    if part.name != "OrderBy":
+        raise NotImplementedError()
+    return external_sort(evalPart(ctx, part.p), order_by_key(part), max_bytes)
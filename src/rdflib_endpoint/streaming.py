@@ -0,0 +1,108 @@
+"""Convert line-based RDF files (N-Triples and N-Quads, optionally compressed) one line at a time, in constant memory."""
+
+from __future__ import annotations
+
+import os
+import time
+from typing import Any, Callable
+
+from rdflib import BNode
+from rdflib.exceptions import ParserError
+from rdflib.graph import DATASET_DEFAULT_GRAPH_ID
+from rdflib.plugins.parsers.ntriples import W3CNTriplesParser, r_nodeid, r_tail, r_wspace
+from rdflib.plugins.serializers.nt import _nt_row
+from rdflib.term import Node
+
+from rdflib_endpoint.loader import LoadedFile, open_file, uncompressed_path
+
+LINE_FORMATS = {".nt": "nt", ".nq": "nquads"}
+
+
+def line_format(path: str) -> str | None:
+    """Get the line-based RDF format of a file from its extension, ignoring a compression suffix, None for other formats."""
+    return LINE_FORMATS.get(os.path.splitext(uncompressed_path(path))[1])
+
+
+def can_stream(files: list[str], output: str) -> bool:
+    """Check if files can be converted one line at a time, which requires line-based input and output formats."""
+    return bool(files) and line_format(output) is not None and all(line_format(file) for file in files)
+
+
+class _LineParser(W3CNTriplesParser):
+    """Parse N-Triples and N-Quads lines, writing each statement as soon as it is parsed.
+
+    Blank node labels are prefixed by an ID of the file instead of being mapped to new blank nodes,
+    so that blank nodes of different files stay distinct without keeping a mapping in memory.
+    """
+
+    def __init__(self, write: Callable[[Node, Node, Node, Node | None], None], bnode_prefix: str) -> None:
+        super().__init__()
+        self.write = write
+        self.bnode_prefix = bnode_prefix
+        self.statements = 0
+
+    def nodeid(self, bnode_context: Any = None) -> Any:
+        if not self.peek("_"):
+            return False
+        return BNode(f"{self.bnode_prefix}{self.eat(r_nodeid).group(1)}")
+
+    def parseline(self, bnode_context: Any = None) -> None:
+        self.eat(r_wspace)
+        if not self.line or self.line.startswith("#"):
+            return
+        subject = self.subject()
+        self.eat(r_wspace)
+        predicate = self.predicate()
+        self.eat(r_wspace)
+        obj = self.object()
+        self.eat(r_wspace)
+        graph = self.uriref() or self.nodeid()
+        self.eat(r_tail)
+        if self.line:
+            raise ParserError(f"Trailing garbage: {self.line}")
+        self.write(subject, predicate, obj, graph or None)
+        self.statements += 1
+
+
+def _row(subject: Node, predicate: Node, obj: Node, graph: Node | None, with_graph: bool) -> str:
+    """Serialize a statement to an N-Triples or N-Quads line."""
+    row = _nt_row((subject, predicate, obj))  # type: ignore[arg-type]
+    if not with_graph or graph is None or graph == DATASET_DEFAULT_GRAPH_ID:
+        return row
+    return f"{row[:-3]} {graph.n3()} .\n"
+
+
+def stream_convert(
+    files: list[str],
+    output: str,
+    on_converted: Callable[[LoadedFile], None] | None = None,
+) -> int:
+    """Convert N-Triples and N-Quads files to a single N-Triples or N-Quads file, one line at a time.
+
+    Memory use does not depend on the size of the files, but duplicate statements are not removed.
+    Graph names are dropped when writing N-Triples.
+
+    Args:
+        files: The paths of the files to convert.
+        output: The path of the output file, compressed if it ends with `.gz`, `.bz2` or `.xz`.
+        on_converted: Function called with the statistics of each file once it has been converted.
+
+    Returns:
+        The number of statements written.
+    """
+    with_graph = line_format(output) == "nquads"
+    total = 0
+    with open_file(output, "wt", encoding="utf-8") as out:
+
+        def write(subject: Node, predicate: Node, obj: Node, graph: Node | None) -> None:
+            out.write(_row(subject, predicate, obj, graph, with_graph))
+
+        for index, file in enumerate(files):
+            start = time.perf_counter()
+            parser = _LineParser(write, bnode_prefix=f"f{index}x")
+            with open_file(file, "rt", encoding="utf-8") as f:
+                parser.parse(f)
+            total += parser.statements
+            if on_converted:
+                on_converted(LoadedFile(file, time.perf_counter() - start, os.path.getsize(file), parser.statements))
+    return total
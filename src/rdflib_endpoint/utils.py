@@ -1,3 +1,4 @@
+import re
 from typing import Any, Dict, List, Optional, TypedDict, Union
 
 from rdflib import Namespace
@@ -5,6 +6,16 @@ from rdflib import Namespace
 SD = Namespace("http://www.w3.org/ns/sparql-service-description#")
 FORMATS = Namespace("http://www.w3.org/ns/formats/")
 
+# Strings and IRIs of a SPARQL query, whose whitespace is meaningful, then whitespace and comments
+_QUERY_TOKENS = re.compile(
+    r'("""(?:[^"\\]|\\.|"(?!""))*"""'
+    r"|'''(?:[^'\\]|\\.|'(?!''))*'''"
+    r'|"(?:[^"\\\n]|\\.)*"'
+    r"|'(?:[^'\\\n]|\\.)*'"
+    r'|<[^<>"{}|^`\\\s]*>)'
+    r"|((?:\s|#[^\n]*)+)"
+)
+
 
 class Defaults:
     """Default configuration values for the SPARQL endpoint."""
@@ -103,6 +114,12 @@ GENERIC_CONTENT_TYPE_TO_RDFLIB_FORMAT = {
 }
 
 
+def normalize_query(query: str) -> str:
+    """Normalize the text of a SPARQL query to compare queries: comments and consecutive whitespaces outside of
+    strings and IRIs are replaced by a single space."""
+    return _QUERY_TOKENS.sub(lambda match: match.group(1) or " ", query).strip()
+
+
 def parse_accept_header(accept: str) -> List[str]:
     """Given an accept header string, return a list of media types in order of preference.
 
@@ -0,0 +1,305 @@
+"""VoID statistics of the served dataset: class and property partitions, distinct subjects and objects.
+
+Statistics are computed in a single pass over the statements of the dataset, then maintained from the statements
+added and removed by SPARQL updates and reloaded files, so that they can be served without scanning the dataset again.
+Each statement of each graph counts, and the number of statements of each subject, object and typed entity is kept to
+know when the last one is removed.
+"""
+
+from __future__ import annotations
+
+import contextlib
+import threading
+from collections import Counter
+from typing import Any, Iterable, Iterator
+
+from rdflib import RDF, XSD, BNode, Dataset, Graph, Literal, Namespace, URIRef
+from rdflib.graph import DATASET_DEFAULT_GRAPH_ID
+from rdflib.plugins.sparql.sparql import Update
+from rdflib.store import Store
+from rdflib.term import Node
+
+from rdflib_endpoint.loader import Quad
+
+VOID = Namespace("http://rdfs.org/ns/void#")
+
+_DATASET_PROPERTIES = (
+    VOID.triples,
+    VOID.distinctSubjects,
+    VOID.distinctObjects,
+    VOID.properties,
+    VOID.classes,
+)
+
+
+def _quads(g: Graph, triple: tuple[Any, Any, Any] = (None, None, None)) -> Iterator[Quad]:
+    """Iterate over the statements of a graph or dataset matching a triple pattern, with their graph."""
+    if isinstance(g, Dataset):
+        for s, p, o, c in g.quads(triple):
+            yield s, p, o, _graph_id(c)
+    else:
+        for s, p, o in g.triples(triple):
+            yield s, p, o, g.identifier
+
+
+class VoidStatistics:
+    """VoID statistics of a dataset, updated incrementally when statements are added or removed."""
+
+    def __init__(self) -> None:
+        self.triples = 0
+        """Number of statements in all the graphs."""
+        self.properties: Counter[Node] = Counter()
+        """Number of statements of each property."""
+        self.subjects: Counter[Node] = Counter()
+        """Number of statements of each subject."""
+        self.objects: Counter[Node] = Counter()
+        """Number of statements of each object."""
+        self.classes: dict[Node, Counter[Node]] = {}
+        """Number of `rdf:type` statements of each entity of each class."""
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_graph(cls, g: Graph) -> VoidStatistics:
+        """Compute the statistics of a graph or dataset."""
+        statistics = cls()
+        statistics.compute(g)
+        return statistics
+
+    def compute(self, g: Graph) -> None:
+        """Compute the statistics again from all the statements of a graph or dataset, in a single pass."""
+        statistics = VoidStatistics()
+        statistics.add_quads(_quads(g))
+        with self._lock:
+            self.triples = statistics.triples
+            self.properties, self.subjects, self.objects = (
+                statistics.properties,
+                statistics.subjects,
+                statistics.objects,
+            )
+            self.classes = statistics.classes
+
+    def add_quads(self, quads: Iterable[Quad]) -> None:
+        """Count statements added to the dataset, they must not be in the dataset already."""
+        with self._lock:
+            for s, p, raw_object, _g in quads:
+                o = _object(raw_object)
+                self.triples += 1
+                self.properties[p] += 1
+                self.subjects[s] += 1
+                self.objects[o] += 1
+                if p == RDF.type:
+                    self.classes.setdefault(o, Counter())[s] += 1
+
+    def remove_quads(self, quads: Iterable[Quad]) -> None:
+        """Uncount statements removed from the dataset."""
+        with self._lock:
+            for s, p, raw_object, _g in quads:
+                o = _object(raw_object)
+                self.triples -= 1
+                _decrement(self.properties, p)
+                _decrement(self.subjects, s)
+                _decrement(self.objects, o)
+                if p == RDF.type and o in self.classes:
+                    _decrement(self.classes[o], s)
+                    if not self.classes[o]:
+                        del self.classes[o]
+
+    def property_partitions(self) -> dict[Node, int]:
+        """Get the number of statements of each property."""
+        with self._lock:
+            return dict(self.properties)
+
+    def class_partitions(self) -> dict[Node, int]:
+        """Get the number of distinct entities of each class."""
+        with self._lock:
+            return {cls: len(entities) for cls, entities in self.classes.items()}
+
+    def apply_update(self, g: Graph, update: Update) -> None:
+        """Run a prepared SPARQL update on a graph or dataset, and update the statistics with its changes.
+
+        The statements added and removed by the operations are recorded from the store while the update runs,
+        so that the statistics are updated without scanning the dataset again, even if the update fails midway.
+        """
+        with _record_changes(g.store) as changes:
+            try:
+                g.update(update, "sparql")
+            finally:
+                self.remove_quads(changes.removed)
+                self.add_quads(changes.added)
+
+    def describe(self, sd: Graph, dataset_node: Node) -> None:
+        """Add the statistics to the description of a dataset, e.g. in the service description, replacing its previous statistics."""
+        for partition_property in (VOID.classPartition, VOID.propertyPartition):
+            for partition_node in list(sd.objects(dataset_node, partition_property)):
+                sd.remove((partition_node, None, None))
+            sd.remove((dataset_node, partition_property, None))
+        for dataset_property in _DATASET_PROPERTIES:
+            sd.remove((dataset_node, dataset_property, None))
+
+        classes = self.class_partitions()
+        properties = self.property_partitions()
+        with self._lock:
+            counts = (
+                self.triples,
+                len(self.subjects),
+                len(self.objects),
+                len(self.properties),
+                len(self.classes),
+            )
+        sd.add((dataset_node, RDF.type, VOID.Dataset))
+        for dataset_property, count in zip(_DATASET_PROPERTIES, counts):
+            sd.add((dataset_node, dataset_property, Literal(count)))
+        for cls, entities in classes.items():
+            partition_node = BNode()
+            sd.add((dataset_node, VOID.classPartition, partition_node))
+            sd.add((partition_node, VOID["class"], cls))
+            sd.add((partition_node, VOID.entities, Literal(entities)))
+        for prop, triples in properties.items():
+            partition_node = BNode()
+            sd.add((dataset_node, VOID.propertyPartition, partition_node))
+            sd.add((partition_node, VOID.property, prop))
+            sd.add((partition_node, VOID.triples, Literal(triples)))
+
+    def to_graph(self, sparql_endpoint: str | None = None) -> Graph:
+        """Get a VoID description of the dataset with its statistics."""
+        void = Graph()
+        void.bind("void", VOID)
+        dataset_node = BNode()
+        if sparql_endpoint:
+            void.add((dataset_node, VOID.sparqlEndpoint, URIRef(sparql_endpoint)))
+        self.describe(void, dataset_node)
+        return void
+
+
+def _object(o: Node) -> Node:
+    """Get the object of a statement as counted, a simple literal is the same term as its `xsd:string` literal.
+
+    Stores like Oxigraph return the `xsd:string` literal, while parsers and updates give the simple literal.
+    """
+    if isinstance(o, Literal) and o.datatype is None and o.language is None:
+        return Literal(o, datatype=XSD.string)
+    return o
+
+
+def _decrement(counter: Counter[Node], key: Node) -> None:
+    """Decrement the count of a key, removing it when it reaches 0."""
+    if counter[key] <= 1:
+        counter.pop(key, None)
+    else:
+        counter[key] -= 1
+
+
+def _graph_id(context: Any) -> Node:
+    """Get the identifier of the graph of a statement in a store."""
+    graph_id = getattr(context, "identifier", context)
+    return graph_id if graph_id is not None else DATASET_DEFAULT_GRAPH_ID
+
+
+class _Changes:
+    """Statements added to and removed from a store, an added statement removed afterwards is not changed."""
+
+    def __init__(self) -> None:
+        self.added: set[Quad] = set()
+        self.removed: set[Quad] = set()
+        self.depth = 0
+        """Number of store calls running, the calls made by another one are recorded by it."""
+
+    def add(self, quad: Quad) -> None:
+        if quad in self.removed:
+            self.removed.discard(quad)
+        else:
+            self.added.add(quad)
+
+    def remove(self, quad: Quad) -> None:
+        if quad in self.added:
+            self.added.discard(quad)
+        else:
+            self.removed.add(quad)
+
+
+@contextlib.contextmanager
+def _record_changes(store: Store) -> Iterator[_Changes]:
+    """Record the statements added to and removed from a store, by the RDFLib SPARQL engine or a parser.
+
+    The methods changing the store are replaced on the store instance while recording, and restored after.
+    A statement is recorded as added if it was not in the graph before, and as removed if it was.
+    """
+    changes = _Changes()
+    add, add_n, remove, remove_graph = store.add, store.addN, store.remove, store.remove_graph
+
+    def exists(triple: tuple[Node, Node, Node], context: Any) -> bool:
+        return next(iter(store.triples(triple, context)), None) is not None
+
+    def matching(pattern: tuple[Any, Any, Any], context: Any) -> list[Quad]:
+        return [
+            (s, p, o, _graph_id(c))
+            for (s, p, o), contexts in store.triples(pattern, context)
+            for c in ((context,) if context is not None else contexts)
+        ]
+
+    def recorded_add(triple: tuple[Node, Node, Node], context: Any, quoted: bool = False) -> None:
+        if changes.depth or quoted:
+            add(triple, context, quoted)
+            return
+        new = not exists(triple, context)
+        changes.depth += 1
+        try:
+            add(triple, context, quoted)
+        finally:
+            changes.depth -= 1
+        if new:
+            changes.add((*triple, _graph_id(context)))
+
+    def recorded_add_n(quads: Iterable[tuple[Node, Node, Node, Any]]) -> None:
+        if changes.depth:
+            add_n(quads)
+            return
+        quads = list(quads)
+        new = {(s, p, o, _graph_id(c)) for s, p, o, c in quads if not exists((s, p, o), c)}
+        changes.depth += 1
+        try:
+            add_n(quads)
+        finally:
+            changes.depth -= 1
+        for quad in new:
+            changes.add(quad)
+
+    def recorded_remove(pattern: tuple[Node | None, Node | None, Node | None], context: Graph | None = None) -> None:
+        if changes.depth:
+            remove(pattern, context)
+            return
+        removed = matching(pattern, context)
+        changes.depth += 1
+        try:
+            remove(pattern, context)
+        finally:
+            changes.depth -= 1
+        for quad in removed:
+            changes.remove(quad)
+
+    def recorded_remove_graph(graph: Graph) -> None:
+        if changes.depth:
+            remove_graph(graph)
+            return
+        removed = matching((None, None, None), graph)
+        changes.depth += 1
+        try:
+            remove_graph(graph)
+        finally:
+            changes.depth -= 1
+        for quad in removed:
+            changes.remove(quad)
+
+    recorders = {
+        "add": recorded_add,
+        "addN": recorded_add_n,
+        "remove": recorded_remove,
+        "remove_graph": recorded_remove_graph,
+    }
+    for name, recorder in recorders.items():
+        setattr(store, name, recorder)
+    try:
+        yield changes
+    finally:
+        for name in recorders:
+            delattr(store, name)
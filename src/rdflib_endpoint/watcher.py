@@ -0,0 +1,195 @@
+"""Watch the files served by an endpoint, and reload only the files that changed on disk."""
+
+from __future__ import annotations
+
+import asyncio
+import bisect
+import concurrent.futures
+import inspect
+import logging
+import os
+import pickle
+import tempfile
+from array import array
+from dataclasses import dataclass, field
+from typing import IO, Any, Callable, Iterable
+
+from rdflib import Dataset
+
+from rdflib_endpoint.concurrency import ReadWriteLock
+from rdflib_endpoint.loader import LoadedFile, Quad, _parse_file_quads, add_quads, remove_quads
+
+
+@dataclass
+class FileReload:
+    """Changes applied to the dataset when a watched file changed."""
+
+    file: str
+    added: int
+    removed: int
+    seconds: float
+    added_quads: list[Quad] = field(default_factory=list, repr=False)
+    """Quads added to the dataset, they were not provided by any file."""
+    removed_quads: list[Quad] = field(default_factory=list, repr=False)
+    """Quads removed from the dataset, they are not provided by any file anymore."""
+
+
+class FileWatcher:
+    """Track which quads come from which file, to swap in only the quads that changed when a file is modified.
+
+    Quads provided by several files are kept until no file provides them anymore. Files are parsed in a thread,
+    and their changes applied at once from the event loop, so that queries never see a partially reloaded file.
+    When queries are evaluated in threads, the changes are applied while holding the write side of `lock` instead.
+
+    The previous parse of each file is kept in a temporary file, to find exactly the quads removed from it when it is
+    reloaded. Only the hashes of the quads of each file are kept in memory, in sorted arrays (8 bytes per quad), to
+    find the quads other files may provide, which are then checked against the previous parse of these files.
+    """
+
+    def __init__(self, g: Dataset, files: list[str], interval: float = 1.0) -> None:
+        self.g = g
+        self.files = files
+        self.interval = interval
+        self.reloads = 0
+        self._provenance: dict[str, array[int]] = {}
+        self._parses: dict[str, IO[bytes]] = {}
+        self._stats: dict[str, tuple[int, int] | None] = {}
+        self._task: asyncio.Task[None] | None = None
+        self.lock: ReadWriteLock | None = None
+        """Lock held alone to apply the changes of reloaded files, shared by the queries being evaluated."""
+        self.on_apply: Callable[[FileReload], None] | None = None
+        """Called with the changes of a reloaded file once applied, while still holding `lock`."""
+
+    def load(self, jobs: int = 1, on_loaded: Callable[[LoadedFile], None] | None = None) -> None:
+        """Load all the watched files in the dataset, recording the quads of each file."""
+        if jobs > 1 and len(self.files) > 1:
+            with concurrent.futures.ProcessPoolExecutor(max_workers=min(jobs, len(self.files))) as executor:
+                parsed = list(executor.map(_parse_file_quads, self.files))
+        else:
+            parsed = [_parse_file_quads(file) for file in self.files]
+        for file, quads, seconds in parsed:
+            self._stats[file] = self._file_stat(file)
+            self._record(file, quads)
+            add_quads(self.g, quads)
+            if on_loaded:
+                on_loaded(LoadedFile(file, seconds, os.path.getsize(file), len(quads)))
+
+    def changed_files(self) -> list[str]:
+        """Get the watched files which have been modified, created or deleted since they were last loaded."""
+        return [file for file in self.files if self._file_stat(file) != self._stats.get(file)]
+
+    def apply(self, file: str, quads: list[Quad], seconds: float = 0.0) -> FileReload:
+        """Swap the quads previously loaded from a file with its new quads."""
+        old_quads = set(self._previous_parse(file))
+        new_quads = set(quads)
+        others = {other: hashes for other, hashes in self._provenance.items() if other != file}
+        other_quads: dict[str, set[Quad]] = {}
+
+        def provided_by_others(quad: Quad) -> bool:
+            quad_hash = hash(quad)
+            for other, hashes in others.items():
+                # The hashes only tell which files may provide the quad, their previous parse tells if they do
+                if _contains(hashes, quad_hash):
+                    if other not in other_quads:
+                        other_quads[other] = set(self._previous_parse(other))
+                    if quad in other_quads[other]:
+                        return True
+            return False
+
+        added = [quad for quad in new_quads - old_quads if not provided_by_others(quad)]
+        removed = [quad for quad in old_quads - new_quads if not provided_by_others(quad)]
+        remove_quads(self.g, removed)
+        add_quads(self.g, added)
+        self._record(file, new_quads)
+        self.reloads += 1
+        reload = FileReload(file, len(added), len(removed), seconds, added, removed)
+        if self.on_apply is not None:
+            self.on_apply(reload)
+        return reload
+
+    def _record(self, file: str, quads: Iterable[Quad]) -> None:
+        """Record the hashes of the quads provided by a file, and keep them in a temporary file until it is reloaded."""
+        quads = list(quads)
+        self._provenance[file] = array("q", sorted({hash(quad) for quad in quads}))
+        parse = tempfile.TemporaryFile(prefix="rdflib-endpoint-watch-")  # noqa: SIM115
+        pickle.dump(quads, parse, protocol=pickle.HIGHEST_PROTOCOL)
+        previous = self._parses.get(file)
+        self._parses[file] = parse
+        if previous is not None:
+            previous.close()
+
+    def _previous_parse(self, file: str) -> list[Quad]:
+        """Get the quads of the previous parse of a file, empty if it was never loaded."""
+        parse = self._parses.get(file)
+        if parse is None:
+            return []
+        parse.seek(0)
+        return pickle.load(parse)  # noqa: S301
+
+    def _apply_locked(self, file: str, quads: list[Quad], seconds: float) -> FileReload:
+        with self.lock.write():  # type: ignore[union-attr]
+            return self.apply(file, quads, seconds)
+
+    def reload(self, file: str) -> FileReload:
+        """Parse a file again, and apply its changes to the dataset."""
+        self._stats[file] = self._file_stat(file)
+        if not os.path.exists(file):
+            return self.apply(file, [])
+        _file, quads, seconds = _parse_file_quads(file)
+        return self.apply(file, quads, seconds)
+
+    async def watch(self, on_reload: Callable[[list[FileReload]], Any] | None = None) -> None:
+        """Check the files for changes every `interval` seconds, and reload the changed ones.
+
+        `on_reload` is called with the changes applied, it can return an awaitable to wait for before the next check.
+        """
+        loop = asyncio.get_running_loop()
+        while True:
+            await asyncio.sleep(self.interval)
+            reloads = []
+            for file in self.changed_files():
+                self._stats[file] = self._file_stat(file)
+                try:
+                    if os.path.exists(file):
+                        _file, quads, seconds = await loop.run_in_executor(None, _parse_file_quads, file)
+                    else:
+                        quads, seconds = [], 0.0
+                except Exception as e:
+                    logging.error(f"Error reloading {file}, keeping its previous content: {e}")
+                    continue
+                if self.lock is not None:
+                    reload = await loop.run_in_executor(None, self._apply_locked, file, quads, seconds)
+                else:
+                    # Applied from the event loop, in between the requests
+                    reload = self.apply(file, quads, seconds)
+                logging.info(f"Reloaded {file}: {reload.added} quads added, {reload.removed} removed")
+                reloads.append(reload)
+            if reloads and on_reload:
+                result = on_reload(reloads)
+                if inspect.isawaitable(result):
+                    await result
+
+    def start(self, on_reload: Callable[[list[FileReload]], Any] | None = None) -> None:
+        """Start watching the files in the running event loop."""
+        self._task = asyncio.get_running_loop().create_task(self.watch(on_reload))
+
+    def stop(self) -> None:
+        """Stop watching the files."""
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    @staticmethod
+    def _file_stat(file: str) -> tuple[int, int] | None:
+        """Get the modification time and size of a file, None if it does not exist."""
+        try:
+            stat = os.stat(file)
+        except OSError:
+            return None
+        return stat.st_mtime_ns, stat.st_size
+
+
+def _contains(hashes: array[int], quad_hash: int) -> bool:
+    """Check if a sorted array of hashes contains a hash."""
+    index = bisect.bisect_left(hashes, quad_hash)
+    return index < len(hashes) and hashes[index] == quad_hash
@@ -0,0 +1,103 @@
+import contextlib
+import time
+
+from fastapi.testclient import TestClient
+from rdflib import Dataset, Literal, URIRef
+
+from rdflib_endpoint import SparqlEndpoint
+from rdflib_endpoint.loader import LoadedFile, LoadProgress, load_files, load_in_background
+from rdflib_endpoint.void import VoidStatistics
+
+count_query = "SELECT (COUNT(*) AS ?count) WHERE { ?s ?p ?o }"
+
+
+def test_not_ready_while_loading() -> None:
+    g = Dataset(default_union=True)
+    loading = LoadProgress(files_total=2)
+    endpoint = TestClient(SparqlEndpoint(graph=g, loading=loading))
+
+    assert endpoint.get("/health/live").status_code == 200
+    response = endpoint.get("/health/ready")
+    assert response.status_code == 503
+    assert response.json()["files_total"] == 2
+    response = endpoint.get("/", params={"query": count_query}, headers={"accept": "application/json"})
+    assert response.status_code == 503
+    assert int(response.headers["retry-after"]) > 0
+
+    # Once loaded, queries are answered and the named graphs are added to the service description
+    g.graph(URIRef("http://test/graph")).add((URIRef("http://test/s"), URIRef("http://test/p"), Literal("o")))
+    loading.files_done, loading.triples = 2, 1
+    loading.finish()
+    assert endpoint.get("/health/ready").status_code == 200
+    response = endpoint.get("/", params={"query": count_query}, headers={"accept": "application/json"})
+    assert response.status_code == 200
+    assert response.json()["results"]["bindings"][0]["count"]["value"] == "1"
+    response = endpoint.get("/", headers={"accept": "text/turtle"})
+    assert "<http://test/graph>" in response.text
+
+
+def test_serve_partial() -> None:
+    g = Dataset(default_union=True)
+    g.add((URIRef("http://test/s"), URIRef("http://test/p"), Literal("o")))
+    endpoint = TestClient(SparqlEndpoint(graph=g, loading=LoadProgress(files_total=2), serve_partial=True))
+    response = endpoint.get("/", params={"query": count_query}, headers={"accept": "application/json"})
+    assert response.status_code == 200
+    assert response.json()["results"]["bindings"][0]["count"]["value"] == "1"
+    # Updates still wait for the load to be over
+    response = endpoint.post("/", data={"update": "INSERT DATA { <http://s> <http://p> <http://o> }"})
+    assert response.status_code == 503
+
+
+def test_describe_once_loaded(monkeypatch) -> None:
+    computed = []
+    compute = VoidStatistics.compute
+    monkeypatch.setattr(VoidStatistics, "compute", lambda self, g: computed.append(1) or compute(self, g))
+    g = Dataset(default_union=True)
+    g.add((URIRef("http://test/s"), URIRef("http://test/p"), Literal("o")))
+    loading = LoadProgress(files_total=1)
+    endpoint = TestClient(SparqlEndpoint(graph=g, loading=loading, void_statistics=True))
+    assert endpoint.get("/health/ready").status_code == 503
+    # The statistics are computed by the loader once it is done, not by the readiness checks
+    loading.finish()
+    assert computed == [1]
+    for _ in range(3):
+        assert endpoint.get("/health/ready").status_code == 200
+    assert computed == [1]
+    assert "http://test/p" in endpoint.get("/.well-known/void", headers={"accept": "text/turtle"}).text
+
+
+def test_load_files_lock() -> None:
+    g = Dataset(default_union=True)
+    batches = []
+
+    @contextlib.contextmanager
+    def lock():
+        batches.append(len(g))
+        yield
+
+    load_files(g, ["tests/resources/test.nq", "tests/resources/test2.ttl"], lock=lock)
+    assert len(batches) == 2
+    assert batches[0] == 0 < batches[1] < len(g)
+
+
+def test_load_in_background() -> None:
+    g = Dataset(default_union=True)
+    loaded: list[LoadedFile] = []
+    loading = load_in_background(g, ["tests/resources/test.nq", "tests/resources/test2.ttl"], on_loaded=loaded.append)
+    for _ in range(100):
+        if loading.finished:
+            break
+        time.sleep(0.05)
+    assert loading.ready
+    assert loading.files_done == 2
+    assert loading.triples == len(g) > 0
+    # The progress is counted from the triples parsed in each file, not by counting the dataset
+    assert all(file.triples for file in loaded)
+
+    failed = load_in_background(Dataset(), ["tests/resources/missing.ttl"])
+    for _ in range(100):
+        if failed.finished:
+            break
+        time.sleep(0.05)
+    assert not failed.ready
+    assert failed.error
@@ -0,0 +1,65 @@
+from rdflib import Dataset, Literal, URIRef
+
+import rdflib_endpoint  # noqa: F401, registers the Compact store plugin
+from rdflib_endpoint.compact_store import CompactStore
+
+g1 = URIRef("http://test/g1")
+g2 = URIRef("http://test/g2")
+
+
+def build_dataset(store: str) -> Dataset:
+    ds = Dataset(store=store, default_union=True)
+    for i in range(2000):
+        graph = ds.graph(g1 if i % 3 else g2)
+        s = URIRef(f"http://test/s{i * 7 % 200}")
+        p = URIRef(f"http://test/p{i * 13 % 10}")
+        graph.add((s, p, Literal(i * 31 % 300)))
+    ds.default_graph.add((URIRef("http://test/s1"), URIRef("http://test/p1"), Literal(1)))
+    return ds
+
+
+patterns = [
+    (None, None, None),
+    (URIRef("http://test/s1"), None, None),
+    (None, URIRef("http://test/p1"), None),
+    (None, None, Literal(7)),
+    (URIRef("http://test/s1"), URIRef("http://test/p1"), None),
+    (URIRef("http://test/s1"), None, Literal(1)),
+    (None, URIRef("http://test/p2"), Literal(3)),
+    (URIRef("http://test/unknown"), None, None),
+]
+
+
+def assert_same_content(expected: Dataset, ds: Dataset) -> None:
+    assert len(ds) == len(expected)
+    for pattern in patterns:
+        assert set(ds.triples(pattern)) == set(expected.triples(pattern))
+        assert set(ds.quads(pattern)) == set(expected.quads(pattern))
+        for graph in (g1, g2):
+            assert set(ds.graph(graph).triples(pattern)) == set(expected.graph(graph).triples(pattern))
+            assert len(ds.graph(graph)) == len(expected.graph(graph))
+
+
+def test_compact_store_matches_memory() -> None:
+    expected, ds = build_dataset("default"), build_dataset("Compact")
+    assert isinstance(ds.store, CompactStore)
+    assert_same_content(expected, ds)
+    assert {g.identifier for g in ds.graphs()} == {g.identifier for g in expected.graphs()}
+
+    query = "SELECT ?g (COUNT(*) AS ?count) WHERE { GRAPH ?g { ?s ?p ?o } } GROUP BY ?g"
+    assert sorted(ds.query(query)) == sorted(expected.query(query))
+
+
+def test_compact_store_update() -> None:
+    expected, ds = build_dataset("default"), build_dataset("Compact")
+    update = """DELETE WHERE { GRAPH <http://test/g1> { <http://test/s1> ?p ?o } } ;
+    INSERT DATA { GRAPH <http://test/g3> { <http://test/s1> <http://test/p1> "new" } }"""
+    for dataset in (expected, ds):
+        dataset.update(update)
+        dataset.remove((None, URIRef("http://test/p2"), None))
+    assert_same_content(expected, ds)
+    assert len(ds.graph(URIRef("http://test/g3"))) == 1
+
+    ds.remove_graph(ds.graph(g2))
+    assert len(list(ds.quads((None, None, None, g2)))) == 0
+    assert g2 not in {g.identifier for g in ds.graphs()}
@@ -0,0 +1,97 @@
+import asyncio
+import threading
+import time
+
+import httpx
+from fastapi.testclient import TestClient
+from rdflib import Graph, Literal, URIRef
+
+from rdflib_endpoint import DatasetExt, SparqlEndpoint
+from rdflib_endpoint.concurrency import ReadWriteLock
+
+ds = DatasetExt(default_union=True)
+calls = []
+
+
+@ds.extension_function()
+def wait(seconds: float) -> float:
+    """Wait for some seconds."""
+    calls.append(seconds)
+    time.sleep(float(seconds))
+    return seconds
+
+
+query = """PREFIX func: <urn:sparql-function:>
+SELECT ?waited WHERE { BIND(func:wait(0.3) AS ?waited) }"""
+
+
+async def send_queries(app: SparqlEndpoint, queries: list[tuple[str, str]]) -> list[httpx.Response]:
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://testserver") as client:
+        return await asyncio.gather(
+            *(client.get("/", params={"query": q}, headers={"accept": accept}) for q, accept in queries)
+        )
+
+
+def test_coalesce_concurrent_queries():
+    app = SparqlEndpoint(graph=ds)
+    calls.clear()
+    # The same query with different whitespace, and in another format
+    queries = [(query, "application/json")] * 4 + [(f"  {query}\n", "application/json"), (query, "text/csv")]
+    start = time.perf_counter()
+    responses = asyncio.run(send_queries(app, queries))
+    assert time.perf_counter() - start < 1
+    assert all(response.status_code == 200 for response in responses)
+    assert len({response.content for response in responses[:5]}) == 1
+    assert responses[5].headers["content-type"].startswith("text/csv")
+    assert len(calls) == 2
+    assert TestClient(app).get("/metrics").json()["queries"] == {"evaluated": 2, "coalesced": 4}
+
+
+graph_ds = DatasetExt(default_union=True)
+
+
+@graph_ds.graph_function()
+def words_graph(text: str) -> Graph:
+    """Put the words of a text in a graph."""
+    g = Graph()
+    for word in text.split():
+        g.add((URIRef("urn:text"), URIRef("urn:word"), Literal(word)))
+    time.sleep(0.2)
+    return g
+
+
+def words_query(text: str) -> str:
+    return f"""PREFIX func: <urn:sparql-function:>
+    SELECT ?word WHERE {{
+        BIND(func:wordsGraph("{text}") AS ?g)
+        GRAPH ?g {{ ?s ?p ?word }}
+    }}"""
+
+
+def test_concurrent_graph_functions():
+    app = SparqlEndpoint(graph=graph_ds)
+    texts = ["hello world", "cheese is good", "a b c d"]
+    responses = asyncio.run(send_queries(app, [(words_query(text), "text/csv") for text in texts]))
+    for text, response in zip(texts, responses):
+        assert response.status_code == 200
+        assert sorted(response.text.split()[1:]) == sorted(text.split())
+    # The temporary graphs are removed once the results are serialized
+    assert len(graph_ds) == 0
+
+
+def test_read_write_lock():
+    lock = ReadWriteLock()
+    events = []
+
+    def write():
+        with lock.write():
+            events.append("write")
+
+    with lock.read(), lock.read():
+        writer = threading.Thread(target=write)
+        writer.start()
+        time.sleep(0.05)
+        events.append("read")
+    writer.join()
+    assert events == ["read", "write"]
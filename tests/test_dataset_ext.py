@@ -1,10 +1,15 @@
+import time
 from dataclasses import dataclass
+from pathlib import Path
 from typing import List
 
 import bioregistry
+import pytest
 from rdflib import DC, OWL, XSD, Graph, Literal, Namespace, URIRef
+from rdflib.plugins.sparql.sparql import SPARQLError
 
-from rdflib_endpoint import DatasetExt
+from rdflib_endpoint import DatasetExt, function_guard
+from rdflib_endpoint.function_guard import FunctionGuard
 
 # ds = DatasetExt(default_union=True)
 ds = DatasetExt()
@@ -269,3 +274,258 @@ def test_filter_based_list() -> None:
         (URIRef("http://purl.obolibrary.org/obo/CHEBI_2"),),
     ]
     assert list(ds.query(query)) == expected2
+
+
+# Bind join: the function is called before the rest of the BGP when its inputs are constants
+EX = Namespace("http://example.org/")
+for i in range(20):
+    ds.add((EX[f"item/{i}"], EX.label, Literal(f"Item {i}")))
+    ds.add((EX[f"code/{i}"], EX.codeOf, Literal(str(i))))
+
+item_calls: List[str] = []
+
+
+@ds.type_function(cardinality=1)
+def item_lookup(code: str) -> str:
+    """Get the IRI of an item from its code."""
+    item_calls.append(code)
+    return EX[f"item/{code}"]
+
+
+@ds.predicate_function(namespace=EX, cardinality=1)
+def item_of(code_iri: str) -> URIRef:
+    """Get the IRI of an item from its code IRI."""
+    item_calls.append(code_iri)
+    return EX[f"item/{code_iri.rsplit('/', 1)[-1]}"]
+
+
+def test_type_function_bind_join() -> None:
+    item_calls.clear()
+    query = """PREFIX func: <urn:sparql-function:>
+    PREFIX ex: <http://example.org/>
+    SELECT ?item ?label WHERE {
+        [] a func:ItemLookup ;
+            func:code "3" ;
+            func:itemLookup ?item .
+        ?item ex:label ?label .
+    }"""
+    assert list(ds.query(query)) == [(EX["item/3"], Literal("Item 3"))]
+    assert item_calls == ["3"]
+
+
+def test_type_function_bgp_first_when_input_from_bgp() -> None:
+    item_calls.clear()
+    query = """PREFIX func: <urn:sparql-function:>
+    PREFIX ex: <http://example.org/>
+    SELECT ?code ?item WHERE {
+        ?codeIri ex:codeOf ?code .
+        [] a func:ItemLookup ;
+            func:code ?code ;
+            func:itemLookup ?item .
+    }"""
+    assert len(list(ds.query(query))) == 20
+    assert len(item_calls) == 20
+
+
+def test_predicate_function_bind_join() -> None:
+    item_calls.clear()
+    query = """PREFIX ex: <http://example.org/>
+    SELECT ?label WHERE {
+        <http://example.org/code/5> ex:itemOf ?item .
+        ?item ex:label ?label .
+    }"""
+    assert list(ds.query(query)) == [(Literal("Item 5"),)]
+    assert item_calls == [str(EX["code/5"])]
+
+
+# Inverse lookups for predicate functions when only the object is bound
+@ds.predicate_function(namespace=EX, inverse=lambda code: EX[f"item/{code}"])
+def item_code(item_iri: str) -> str:
+    """Get the code of an item."""
+    return item_iri.rsplit("/", 1)[-1]
+
+
+@ds.predicate_function(namespace=EX, index_subjects=[EX[f"item/{i}"] for i in range(20)])
+def item_parity(item_iri: str) -> str:
+    """Get the parity of an item code."""
+    return "even" if int(item_iri.rsplit("/", 1)[-1]) % 2 == 0 else "odd"
+
+
+def test_predicate_function_inverse() -> None:
+    query = """PREFIX ex: <http://example.org/>
+    SELECT ?item ?label WHERE {
+        ?item ex:itemCode "7" .
+        ?item ex:label ?label .
+    }"""
+    assert list(ds.query(query)) == [(EX["item/7"], Literal("Item 7"))]
+
+
+def test_predicate_function_inverse_object_from_other_triple() -> None:
+    # The object is bound by another triple of the BGP, not by a constant
+    ds.add((EX["entry/7"], EX.codeValue, Literal("7")))
+    query = """PREFIX ex: <http://example.org/>
+    SELECT ?item ?code WHERE {
+        ?item ex:itemCode ?code .
+        <http://example.org/entry/7> ex:codeValue ?code .
+    }"""
+    try:
+        assert list(ds.query(query)) == [(EX["item/7"], Literal("7"))]
+    finally:
+        ds.remove((EX["entry/7"], EX.codeValue, Literal("7")))
+
+
+def test_predicate_function_reverse_index() -> None:
+    query = """PREFIX ex: <http://example.org/>
+    SELECT ?item WHERE {
+        ?item ex:itemParity "odd" .
+    }"""
+    items = {row[0] for row in ds.query(query)}
+    assert items == {EX[f"item/{i}"] for i in range(1, 20, 2)}
+
+
+flaky_calls: List[str] = []
+
+
+@ds.predicate_function(namespace=EX, index_subjects=[EX[f"item/{i}"] for i in range(4)])
+def flaky_parity(item_iri: str) -> str:
+    """Get the parity of an item code, failing the first time it is called for item 3."""
+    flaky_calls.append(item_iri)
+    if item_iri.endswith("/3") and flaky_calls.count(item_iri) == 1:
+        raise ValueError("Backend unavailable")
+    return "even" if int(item_iri.rsplit("/", 1)[-1]) % 2 == 0 else "odd"
+
+
+def test_predicate_function_reverse_index_retries_failed_subjects() -> None:
+    query = """PREFIX ex: <http://example.org/>
+    SELECT ?item WHERE {
+        ?item ex:flakyParity "odd" .
+    }"""
+    assert {row[0] for row in ds.query(query)} == {EX["item/1"]}
+    # Only the subject whose call failed is indexed again
+    assert {row[0] for row in ds.query(query)} == {EX["item/1"], EX["item/3"]}
+    assert len(flaky_calls) == 5
+
+
+# Timeouts and circuit breakers
+@ds.extension_function(failure_threshold=2, cooldown=60)
+def always_failing(input_str: str) -> str:
+    """Always raise an error."""
+    raise ValueError(f"Cannot process {input_str}")
+
+
+@ds.type_function(timeout=0.05)
+def slow_function(input_str: str) -> str:
+    """Take longer than the timeout."""
+    time.sleep(0.5)
+    return input_str
+
+
+def test_function_circuit_breaker() -> None:
+    query = """PREFIX func: <urn:sparql-function:>
+    SELECT ?out WHERE {
+        BIND(func:alwaysFailing("hello") AS ?out)
+    }"""
+    for _ in range(3):
+        with pytest.raises(SPARQLError):
+            list(ds.query(query))
+    stats = ds.get_function_stats()["always_failing"]
+    assert stats["state"] == "open"
+    assert stats["calls"] == 2
+    assert stats["errors"] == 2
+    assert stats["rejected"] == 1
+
+
+def test_function_timeout() -> None:
+    query = """PREFIX func: <urn:sparql-function:>
+    SELECT ?out WHERE {
+        [] a func:SlowFunction ;
+            func:inputStr "hello" ;
+            func:slowFunction ?out .
+    }"""
+    assert list(ds.query(query)) == []
+    stats = ds.get_function_stats()["slow_function"]
+    assert stats["timeouts"] == 1
+    assert stats["state"] == "closed"
+
+
+def test_function_timeout_cancels_queued_call(monkeypatch) -> None:
+    monkeypatch.setattr(function_guard, "_MAX_WORKERS", 1)
+    called = []
+    guard = FunctionGuard("queued", timeout=0.1)
+    with pytest.raises(SPARQLError, match="timed out"):
+        guard(time.sleep, 0.3)
+    # The only thread is still busy, the second call is cancelled before it starts
+    with pytest.raises(SPARQLError, match="timed out"):
+        guard(called.append, "ran")
+    assert guard.stats()["in_flight"] == 1
+    time.sleep(0.4)
+    assert called == []
+    assert guard.stats()["in_flight"] == 0
+
+
+def test_function_half_open_single_probe() -> None:
+    guard = FunctionGuard("flaky", failure_threshold=1, cooldown=0)
+    with pytest.raises(ValueError):
+        guard(always_failing, "hello")
+
+    def probe():
+        # Other calls are rejected while the trial call of the half-open circuit runs
+        with pytest.raises(SPARQLError, match="half-open"):
+            guard(str.upper, "hello")
+        yield "ok"
+
+    assert guard.state == "half-open"
+    assert list(guard(probe)) == ["ok"]
+    assert guard.state == "closed"
+    assert guard.stats()["rejected"] == 1
+
+
+def test_function_generator_streamed() -> None:
+    produced = []
+
+    def numbers():
+        for i in range(1000):
+            produced.append(i)
+            yield i
+
+    guard = FunctionGuard("numbers", timeout=1, max_concurrency=1)
+    results = guard(numbers)
+    assert next(results) == 0
+    assert len(produced) == 1
+    assert guard.stats()["in_flight"] == 1
+    results.close()
+    assert guard.stats()["in_flight"] == 0
+
+    def slow_numbers():
+        yield 1
+        time.sleep(0.5)
+        yield 2
+
+    guard = FunctionGuard("slow_numbers", timeout=0.1)
+    results = guard(slow_numbers)
+    assert next(results) == 1
+    with pytest.raises(SPARQLError, match="timed out"):
+        next(results)
+    assert guard.stats()["timeouts"] == 1
+
+
+def test_functions_scoped_to_dataset() -> None:
+    other_ds = DatasetExt()
+    query = """PREFIX func: <urn:sparql-function:>
+    SELECT ?part WHERE {
+        BIND(func:split("hello world") AS ?part)
+    }"""
+    assert len(list(ds.query(query))) == 2
+    assert all(row[0] is None for row in other_ds.query(query))
+
+
+def test_functions_with_from_clauses() -> None:
+    # rdflib evaluates queries with FROM and FROM NAMED on a new dataset, the functions must still be active
+    expected = [(Literal("hello"),), (Literal("world"),)]
+    graph_iri = Path("tests/resources/test2.ttl").absolute().as_uri()
+    query = """PREFIX func: <urn:sparql-function:>
+    SELECT ?part FROM_CLAUSE WHERE {
+        BIND(func:split("hello world") AS ?part)
+    }"""
+    assert list(ds.query(query.replace("FROM_CLAUSE", f"FROM <{graph_iri}>"))) == expected
+    assert list(ds.query(query.replace("FROM_CLAUSE", f"FROM NAMED <{graph_iri}>"))) == expected
@@ -54,6 +54,15 @@ def test_custom_concat():
     assert response.json()["results"]["bindings"][0]["part"]["value"] == "hello"
 
 
+def test_metrics():
+    endpoint.get("/", params={"query": custom_function_query}, headers={"accept": "application/json"})
+    response = endpoint.get("/metrics")
+    assert response.status_code == 200
+    split_index_stats = response.json()["functions"]["split_index"]
+    assert split_index_stats["calls"] >= 2
+    assert split_index_stats["state"] == "closed"
+
+
 def test_bad_request():
     response = endpoint.get("/?query=figarofigarofigaro", headers={"accept": "application/json"})
     assert response.status_code == 400
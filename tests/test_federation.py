@@ -1,6 +1,7 @@
 import os
 import platform
 import sys
+import threading
 import time
 from multiprocessing import Process, set_start_method
 from typing import Any
@@ -9,9 +10,21 @@ import httpx
 import pytest
 import uvicorn
 from example.main import ds
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from rdflib import Dataset, Literal, URIRef, Variable
 from testcontainers.core.container import DockerContainer
 
-from rdflib_endpoint import SparqlEndpoint
+from rdflib_endpoint import DatasetExt, SparqlEndpoint, SparqlRouter
+from rdflib_endpoint.federation import (
+    Federation,
+    ServiceCache,
+    _iter_json_bindings,
+    _join_indexed,
+    _RowIndex,
+    inline_local_services,
+    prepare_query,
+)
 
 # Skip federated tests on Python 3.8
 if sys.version_info[:2] == (3, 8):
@@ -99,6 +112,226 @@ SELECT ?input ?part ?partIndex WHERE {
     assert resp[0]["part"]["value"] == "hello"
 
 
+EX = "http://example.com/"
+slow_ds = DatasetExt(default_union=True)
+names_ds = Dataset(default_union=True)
+for i in range(120):
+    if i % 10:
+        names_ds.add((URIRef(f"{EX}person{i}"), URIRef(f"{EX}name"), Literal(f"Person {i}")))
+
+
+@slow_ds.extension_function()
+def wait(seconds: float) -> float:
+    """Wait for some seconds."""
+    time.sleep(float(seconds))
+    return seconds
+
+
+@pytest.fixture(scope="module")
+def stand_in_url():
+    """Serve the example endpoint, and a slow endpoint at /slow, in a background thread, to be called by SERVICE."""
+    app = FastAPI()
+    app.include_router(SparqlRouter(graph=ds))
+    app.include_router(SparqlRouter(path="/slow", graph=slow_ds))
+    app.include_router(SparqlRouter(path="/names", graph=names_ds))
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=0, log_level="warning"))
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    while not server.started:
+        time.sleep(0.01)
+    port = server.servers[0].sockets[0].getsockname()[1]
+    yield f"http://127.0.0.1:{port}"
+    server.should_exit = True
+    thread.join()
+
+
+def test_federated_query_stand_in(stand_in_url):
+    federation = Federation()
+    endpoint = TestClient(SparqlEndpoint(federation=federation))
+    response = endpoint.post(
+        "/",
+        data={"query": fed_query_function.format(rdflib_endpoint_url=stand_in_url)},
+        headers={"accept": "application/json"},
+    )
+    assert response.status_code == 200
+    bindings = response.json()["results"]["bindings"]
+    assert sorted(row["part"]["value"] for row in bindings) == ["cheese", "good", "hello", "is", "world"]
+    response = endpoint.post(
+        "/",
+        data={"query": fed_query_sameas.format(rdflib_endpoint_url=stand_in_url)},
+        headers={"accept": "application/json"},
+    )
+    assert response.json()["results"]["bindings"][0]["id"]["value"] == "http://purl.obolibrary.org/obo/CHEBI_1"
+    assert endpoint.get("/metrics").json()["federation"][stand_in_url]["requests"] == 2
+
+
+def test_concurrent_services(stand_in_url):
+    federation = Federation()
+    endpoint = TestClient(SparqlEndpoint(federation=federation))
+    query = f"""PREFIX func: <urn:sparql-function:>
+    SELECT * WHERE {{
+        {{ SERVICE <{stand_in_url}/slow> {{ BIND(func:wait(0.3) AS ?first) }} }}
+        UNION
+        {{ SERVICE <{stand_in_url}/slow> {{ BIND(func:wait(0.2) AS ?first) }} }}
+        SERVICE <{stand_in_url}/slow> {{ BIND(func:wait(0.1) AS ?second) }}
+    }}"""
+    response = endpoint.post("/", data={"query": query}, headers={"accept": "application/json"})
+    assert response.status_code == 200
+    bindings = response.json()["results"]["bindings"]
+    assert sorted((row["first"]["value"], row["second"]["value"]) for row in bindings) == [
+        ("0.2", "0.1"),
+        ("0.3", "0.1"),
+    ]
+    # The SERVICE clauses do not depend on each other, they were all sent at the same time
+    assert federation.stats()[f"{stand_in_url}/slow"]["max_in_flight"] == 3
+
+
+@pytest.mark.parametrize("optional", [False, True])
+def test_bind_join_batches(stand_in_url, optional):
+    ds = Dataset(default_union=True)
+    for i in range(120):
+        ds.add((URIRef(f"{EX}person{i}"), URIRef(f"{EX}knows"), URIRef(f"{EX}person{(i * 7) % 120}")))
+    federation = Federation(batch_size=50)
+    endpoint = TestClient(SparqlEndpoint(graph=ds, federation=federation))
+    service = f"SERVICE <{stand_in_url}/names> {{ ?o ex:name ?name }}"
+    query = f"""PREFIX ex: <{EX}>
+    SELECT ?s ?name WHERE {{ ?s ex:knows ?o . {f"OPTIONAL {{ {service} }}" if optional else service} }}"""
+    response = endpoint.post("/", data={"query": query}, headers={"accept": "application/json"})
+    assert response.status_code == 200
+    results = {row["s"]["value"]: row.get("name", {}).get("value") for row in response.json()["results"]["bindings"]}
+    expected = {
+        f"{EX}person{i}": f"Person {(i * 7) % 120}" if (i * 7) % 10 else None
+        for i in range(120)
+        if optional or (i * 7) % 10
+    }
+    assert results == expected
+    # The 120 local solutions are sent in 3 batches, instead of a request for each of them
+    assert federation.stats()[f"{stand_in_url}/names"]["requests"] == 3
+
+
+def test_service_silent():
+    federation = Federation(timeout=1)
+    endpoint = TestClient(SparqlEndpoint(federation=federation))
+    query = "SELECT * WHERE { SERVICE SILENT <http://127.0.0.1:1/sparql> { ?s ?p ?o } }"
+    response = endpoint.post("/", data={"query": query}, headers={"accept": "application/json"})
+    assert response.json()["results"]["bindings"] == [{}]
+    response = endpoint.post("/", data={"query": query.replace("SILENT ", "")}, headers={"accept": "application/json"})
+    assert response.status_code == 400
+    assert federation.stats()["http://127.0.0.1:1/sparql"]["errors"] == 2
+
+
+def test_service_cache(stand_in_url, tmp_path):
+    query = fed_query_sameas.format(rdflib_endpoint_url=stand_in_url)
+    for restart in range(2):
+        federation = Federation(cache=ServiceCache(directory=str(tmp_path)))
+        endpoint = TestClient(SparqlEndpoint(federation=federation))
+        # The same sub-query with different whitespace and comments
+        for sent_query in (query, query.replace("    ", "  ") + "\n# Refresh"):
+            response = endpoint.post("/", data={"query": sent_query}, headers={"accept": "application/json"})
+            assert response.json()["results"]["bindings"][0]["id"]["value"] == "http://purl.obolibrary.org/obo/CHEBI_1"
+        metrics = endpoint.get("/metrics").json()
+        # The response is written to disk and reused after a restart
+        assert metrics["federation"][stand_in_url]["requests"] == (1 if restart == 0 else 0)
+        assert metrics["federation"][stand_in_url]["cache_hits"] == (1 if restart == 0 else 2)
+        assert metrics["federation_cache"]["hit_rate"] == (0.5 if restart == 0 else 1.0)
+        assert metrics["federation_cache"]["disk_hits"] == restart
+
+    federation = Federation(cache=ServiceCache(), endpoints={stand_in_url: {"cache_ttl": 0}})
+    endpoint = TestClient(SparqlEndpoint(federation=federation))
+    for _ in range(2):
+        endpoint.post("/", data={"query": query}, headers={"accept": "application/json"})
+    assert federation.stats()[stand_in_url]["requests"] == 2
+
+
+def test_service_cache_eviction():
+    cache = ServiceCache(max_bytes=10)
+    for i in range(3):
+        cache.put("http://example.com/sparql", f"SELECT * WHERE {{ ?s ?p {i} }}", b"1234")
+    assert cache.get("http://example.com/sparql", "SELECT * WHERE { ?s ?p 0 }") is None
+    assert cache.get("http://example.com/sparql", "SELECT  *  WHERE { ?s ?p 2 }") == b"1234"
+    assert cache.stats()["evictions"] == 1
+    assert cache.stats()["bytes"] == 8
+    cache.put("http://example.com/sparql", "SELECT * WHERE { ?s ?p 3 }", b"1234", ttl=-1)
+    assert cache.stats()["entries"] == 2
+
+
+def test_local_service():
+    # The public URL does not accept connections, the SERVICE clauses calling it are evaluated in-process
+    public_url = "http://127.0.0.1:1/sparql"
+    for federation in (None, Federation(timeout=1)):
+        endpoint = TestClient(SparqlEndpoint(graph=ds, public_url=public_url, federation=federation))
+        response = endpoint.post(
+            "/",
+            data={"query": fed_query_function.format(rdflib_endpoint_url=f"{public_url}/")},
+            headers={"accept": "application/json"},
+        )
+        assert response.status_code == 200
+        bindings = response.json()["results"]["bindings"]
+        assert sorted(row["part"]["value"] for row in bindings) == ["cheese", "good", "hello", "is", "world"]
+
+    endpoint = TestClient(SparqlEndpoint(graph=names_ds, path="/names"))
+    query = f"""PREFIX ex: <{EX}>
+    SELECT ?o ?name WHERE {{
+        VALUES ?o {{ ex:person1 ex:person2 ex:person10 }}
+        OPTIONAL {{ SERVICE </names> {{ ?o ex:name ?name FILTER(?name != "Person 2") }} }}
+    }}"""
+    results = []
+    # Same results as the graph pattern of the SERVICE clause
+    for sent_query in (query, query.replace("SERVICE </names>", "")):
+        response = endpoint.post("/names", data={"query": sent_query}, headers={"accept": "application/json"})
+        assert response.status_code == 200
+        bindings = response.json()["results"]["bindings"]
+        results.append(sorted((row["o"]["value"], row.get("name", {}).get("value", "")) for row in bindings))
+    assert results[0] == results[1]
+    assert (f"{EX}person1", "Person 1") in results[0]
+
+
+def test_local_service_absolute_iri():
+    # SERVICE clauses with the path of the endpoint on the host the request was sent to are evaluated in-process
+    endpoint = TestClient(SparqlEndpoint(graph=names_ds, path="/names", public_url="http://127.0.0.1:1/names"))
+    query = f"""PREFIX ex: <{EX}>
+    SELECT ?name WHERE {{ SERVICE <http://testserver/names/> {{ ex:person1 ex:name ?name }} }}"""
+    response = endpoint.post("/names", data={"query": query}, headers={"accept": "application/json"})
+    assert response.status_code == 200
+    assert [row["name"]["value"] for row in response.json()["results"]["bindings"]] == ["Person 1"]
+
+    def local_services(service: str, endpoint_urls: set[str]) -> int:
+        parsed_query = prepare_query(f"SELECT * WHERE {{ SERVICE <{service}> {{ ?s ?p ?o }} }}")
+        return inline_local_services(parsed_query, endpoint_urls, "/sparql")
+
+    public_url = "https://example.org/"
+    assert local_services("http://localhost:8000/sparql", {public_url, "http://localhost:8000/"}) == 1
+    assert local_services("https://example.org:443/sparql/", {public_url}) == 1
+    assert local_services("http://localhost:8000/sparql", {public_url}) == 0
+    assert local_services("http://localhost:8001/sparql", {public_url, "http://localhost:8000/"}) == 0
+    assert local_services("http://localhost:8000/other", {public_url, "http://localhost:8000/"}) == 0
+
+
+def test_parse_bindings_stream():
+    results = b'{"head": {"vars": ["bindings"]}, "results": {"bindings": [{"bindings": {"type": "literal", "value": "\xc3\xa9]"}}, {}]}}'
+    chunks = [results[i : i + 1] for i in range(len(results))]
+    assert list(_iter_json_bindings(chunks)) == [{"bindings": {"type": "literal", "value": "\u00e9]"}}, {}]
+
+
+def test_join_indexed():
+    o, name, lang = Variable("o"), Variable("name"), Variable("lang")
+    remote = [
+        {o: URIRef(f"{EX}person1"), name: Literal("Person 1"), lang: Literal("en")},
+        {o: URIRef(f"{EX}person1"), name: Literal("Personne 1")},
+        {o: URIRef(f"{EX}person2"), name: Literal("Person 2")},
+    ]
+    index = _RowIndex(remote)
+    batch = [{o: URIRef(f"{EX}person1"), lang: Literal("en")}, {o: URIRef(f"{EX}person3")}, {name: Literal("Person 2")}]
+    joined = list(_join_indexed(batch, index, optional=True))
+    assert joined == [
+        {o: URIRef(f"{EX}person1"), lang: Literal("en"), name: Literal("Person 1")},
+        {o: URIRef(f"{EX}person1"), lang: Literal("en"), name: Literal("Personne 1")},
+        {o: URIRef(f"{EX}person3")},
+        {name: Literal("Person 2"), o: URIRef(f"{EX}person2")},
+    ]
+    assert list(_join_indexed(batch[1:2], index, optional=False)) == []
+
+
 admin_password = "root"  # noqa: S105
 graphdb_username = "admin"
 
@@ -0,0 +1,121 @@
+import asyncio
+import time
+
+import httpx
+from fastapi.testclient import TestClient
+from rdflib import Literal, URIRef
+
+from rdflib_endpoint import DatasetExt, SparqlEndpoint
+from rdflib_endpoint.jobs import QueryJobs
+
+ds = DatasetExt(default_union=True)
+for i in range(100):
+    ds.add((URIRef(f"http://example.com/s{i}"), URIRef("http://example.com/value"), Literal(i)))
+
+
+@ds.extension_function()
+def wait(seconds: float) -> float:
+    """Wait for some seconds."""
+    time.sleep(float(seconds))
+    return seconds
+
+
+@ds.extension_function()
+def fail(value: str) -> str:
+    """Always fail."""
+    raise ValueError(f"Cannot process {value}")
+
+
+slow_query = """PREFIX func: <urn:sparql-function:>
+SELECT ?s ?value ?waited WHERE {
+    ?s <http://example.com/value> ?value .
+    BIND(func:wait(IF(?value = 0, 0.3, 0)) AS ?waited)
+}"""
+
+
+def wait_for_job(client: TestClient, job_id: str) -> dict:
+    for _ in range(100):
+        job = client.get(f"/jobs/{job_id}").json()
+        if job["status"] in ("done", "failed"):
+            return job
+        time.sleep(0.05)
+    raise AssertionError(f"Job {job_id} did not finish")
+
+
+def test_query_job(tmp_path):
+    jobs = QueryJobs(directory=str(tmp_path))
+    with TestClient(SparqlEndpoint(graph=ds, jobs=jobs)) as client:
+        response = client.post("/jobs", data={"query": slow_query}, headers={"accept": "text/csv"})
+        assert response.status_code == 202
+        job = response.json()
+        assert response.headers["location"] == f"/jobs/{job['id']}"
+        assert job["status"] in ("queued", "running")
+        assert client.get(f"/jobs/{job['id']}/results").status_code in (200, 409)
+
+        job = wait_for_job(client, job["id"])
+        assert job["status"] == "done"
+        assert job["bytes"] > 0
+        response = client.get(f"/jobs/{job['id']}/results")
+        assert response.status_code == 200
+        assert response.headers["content-type"].startswith("text/csv")
+        assert len(response.text.strip().splitlines()) == 101
+        assert client.get("/metrics").json()["jobs"]["done"] == 1
+
+        assert client.delete(f"/jobs/{job['id']}").status_code == 204
+        assert client.get(f"/jobs/{job['id']}").status_code == 404
+        assert list(tmp_path.iterdir()) == []
+
+        query = 'PREFIX func: <urn:sparql-function:> SELECT * WHERE { BIND(func:fail("x") AS ?failed) }'
+        response = client.post("/jobs", content=query, headers={"content-type": "application/sparql-query"})
+        job = wait_for_job(client, response.json()["id"])
+        assert job["status"] == "failed"
+        assert "Cannot process x" in job["error"]
+        assert client.get(f"/jobs/{job['id']}/results").status_code == 400
+
+
+def test_query_job_errors():
+    with TestClient(SparqlEndpoint(graph=ds, jobs=QueryJobs(ttl=0))) as client:
+        assert client.post("/jobs").status_code == 400
+        assert client.post("/jobs", data={"query": "figarofigarofigaro"}).status_code == 400
+
+        response = client.post("/jobs", data={"query": "SELECT * WHERE { ?s ?p ?o }"})
+        job_id = response.json()["id"]
+        # Expired as soon as it finished
+        for _ in range(100):
+            if client.get(f"/jobs/{job_id}").status_code == 404:
+                break
+            time.sleep(0.05)
+        assert client.get(f"/jobs/{job_id}/results").status_code == 404
+
+    with TestClient(SparqlEndpoint(graph=ds, jobs=QueryJobs(max_workers=1, max_jobs=1))) as client:
+        assert client.post("/jobs", params={"query": slow_query}).status_code == 202
+        assert client.post("/jobs", params={"query": slow_query}).status_code == 429
+
+
+def test_query_job_with_update():
+    app = SparqlEndpoint(graph=ds, jobs=QueryJobs(), enable_update=True)
+    long_query = slow_query.replace("0.3", "1.5")
+
+    async def run() -> None:
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://testserver") as client:
+            job_id = (await client.post("/jobs", data={"query": long_query})).json()["id"]
+            while (await client.get(f"/jobs/{job_id}")).json()["status"] != "running":
+                await asyncio.sleep(0.01)
+            # The update waits for the job, the queries do not wait for the update
+            update = asyncio.ensure_future(
+                client.post("/", data={"update": "INSERT DATA { GRAPH <urn:new> { <urn:new> <urn:value> 1 } }"})
+            )
+            await asyncio.sleep(0.1)
+            start = time.perf_counter()
+            response = await client.get("/", params={"query": "ASK { ?s ?p ?o }"})
+            assert response.status_code == 200
+            assert time.perf_counter() - start < 0.5
+            assert not update.done()
+            assert (await update).status_code == 204
+            assert (await client.get(f"/jobs/{job_id}")).json()["status"] == "done"
+
+    try:
+        asyncio.run(run())
+    finally:
+        ds.remove_graph(URIRef("urn:new"))
@@ -0,0 +1,45 @@
+import bz2
+import gzip
+import lzma
+import os
+import shutil
+import tempfile
+
+from rdflib import Dataset, URIRef
+
+from rdflib_endpoint.loader import LoadedFile, detect_compression, load_files, open_file, uncompressed_path
+
+quad = (URIRef("http://test/s"), URIRef("http://test/p"), URIRef("http://test/o"), URIRef("http://test/graph"))
+
+
+def compress(source: str, target: str, opener) -> str:
+    with open(source, "rb") as f_in, opener(target, "wb") as f_out:
+        shutil.copyfileobj(f_in, f_out)
+    return target
+
+
+def test_load_compressed_files() -> None:
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        files = [
+            compress("tests/resources/test.nq", os.path.join(tmp_dir, "test.nq.xz"), lzma.open),
+            compress("tests/resources/test2.ttl", os.path.join(tmp_dir, "test2.ttl.bz2"), bz2.open),
+            # Compression detected from the first bytes of the file
+            compress("tests/resources/another.jsonld", os.path.join(tmp_dir, "another.jsonld"), gzip.open),
+        ]
+        assert [detect_compression(file) for file in files] == ["xz", "bz2", "gzip"]
+        assert uncompressed_path(files[0]).endswith("test.nq")
+
+        expected = Dataset(default_union=True)
+        load_files(expected, ["tests/resources/test.nq", "tests/resources/test2.ttl", "tests/resources/another.jsonld"])
+        for jobs in (1, 2):
+            g = Dataset(default_union=True)
+            loaded: list[LoadedFile] = []
+            load_files(g, files, jobs=jobs, on_loaded=loaded.append)
+            assert quad in g
+            assert set(g.triples((None, None, None))) == set(expected.triples((None, None, None)))
+            # The triples of each file are counted, to report the parsing throughput
+            assert all(file.triples for file in loaded)
+            assert sum(file.triples or 0 for file in loaded) >= len(g)
+
+        with open_file(files[0], "rt", encoding="utf-8") as f:
+            assert f.readline().startswith("<http://test/s>")
@@ -0,0 +1,41 @@
+import os
+import tempfile
+
+import pytest
+from rdflib import Dataset, URIRef
+
+from rdflib_endpoint.mapped_store import MappedStore, write_index
+from rdflib_endpoint.snapshot import dataset_quads
+
+from .test_compact_store import assert_same_content, build_dataset
+
+
+def test_mapped_store() -> None:
+    expected = build_dataset("default")
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        path = os.path.join(tmp_dir, "data.rdfidx")
+        assert write_index(path, dataset_quads(expected)) == len(expected)
+        ds = Dataset(store=MappedStore(path), default_union=True)
+        assert_same_content(expected, ds)
+        assert {g.identifier for g in ds.graphs()} == {g.identifier for g in expected.graphs()}
+
+        query = "SELECT ?g (COUNT(*) AS ?count) WHERE { GRAPH ?g { ?s ?p ?o } } GROUP BY ?g"
+        assert sorted(ds.query(query)) == sorted(expected.query(query))
+
+        # Several stores can map the same file
+        other = Dataset(store=MappedStore(path), default_union=True)
+        assert len(other) == len(ds)
+
+        with pytest.raises(PermissionError):
+            ds.add((URIRef("http://test/s"), URIRef("http://test/p"), URIRef("http://test/o")))
+        ds.close()
+        other.close()
+
+
+def test_mapped_store_invalid_file() -> None:
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        path = os.path.join(tmp_dir, "data.rdfidx")
+        with open(path, "wb") as f:
+            f.write(b"not an index file")
+        with pytest.raises(ValueError):
+            MappedStore(path)
@@ -0,0 +1,57 @@
+import pytest
+from fastapi.testclient import TestClient
+from rdflib import RDF, Dataset, Literal, URIRef, Variable
+
+from rdflib_endpoint import SparqlEndpoint
+from rdflib_endpoint.optimizer import reorder_triples
+from rdflib_endpoint.void import VoidStatistics
+
+EX = "http://example.com/"
+KNOWS = URIRef(f"{EX}knows")
+NAME = URIRef(f"{EX}name")
+
+ds = Dataset(default_union=True)
+people = ds.graph(URIRef(f"{EX}people"))
+for i in range(200):
+    person = URIRef(f"{EX}person{i}")
+    people.add((person, RDF.type, URIRef(f"{EX}Class{i % 4}")))
+    people.add((person, NAME, Literal(f"Person {i}")))
+    people.add((person, KNOWS, URIRef(f"{EX}person{(i * 7) % 200}")))
+
+queries = [
+    f'SELECT * WHERE {{ ?s a <{EX}Class2> . ?s <{KNOWS}> ?o . ?o <{NAME}> "Person 14" }}',
+    f"SELECT * WHERE {{ ?s ?p ?o . ?s <{KNOWS}> <{EX}person7> }}",
+    f'SELECT * WHERE {{ ?s a ?c . OPTIONAL {{ ?s <{KNOWS}> ?o . ?o <{NAME}> "Person 21" }} }}',
+    f"SELECT * WHERE {{ VALUES ?o {{ <{EX}person3> <{EX}person4> }} GRAPH ?g {{ ?s a ?c . ?s <{KNOWS}> ?o }} }}",
+    f"SELECT * WHERE {{ ?s <{EX}unknown> ?x . ?s a ?c }}",
+]
+
+
+def test_reorder_triples() -> None:
+    statistics = VoidStatistics.from_graph(ds)
+    s, o, c = Variable("s"), Variable("o"), Variable("c")
+    triples = [(s, RDF.type, c), (s, KNOWS, o), (o, NAME, Literal("Person 14"))]
+    assert reorder_triples(statistics, triples) == [triples[2], triples[1], triples[0]]
+    # Patterns matching nothing go first
+    unknown = (s, URIRef(f"{EX}unknown"), o)
+    assert reorder_triples(statistics, [*triples, unknown])[0] == unknown
+    # Bound variables make a pattern more selective
+    assert reorder_triples(statistics, triples[:2], bound={o}) == [triples[1], triples[0]]
+
+
+@pytest.mark.parametrize("query", queries)
+def test_optimize_joins_same_results(query: str) -> None:
+    results = []
+    for optimize_joins in (False, True):
+        client = TestClient(SparqlEndpoint(graph=ds, optimize_joins=optimize_joins))
+        response = client.get("/", params={"query": query}, headers={"accept": "application/json"})
+        assert response.status_code == 200
+        bindings = response.json()["results"]["bindings"]
+        results.append(sorted(sorted((var, value["value"]) for var, value in row.items()) for row in bindings))
+    assert results[0] == results[1]
+    assert results[0] or "unknown" in query
+
+
+def test_optimize_joins_without_void() -> None:
+    client = TestClient(SparqlEndpoint(graph=ds, optimize_joins=True))
+    assert client.get("/.well-known/void").status_code == 404
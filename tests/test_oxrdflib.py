@@ -1,7 +1,8 @@
+import pytest
 from fastapi.testclient import TestClient
-from rdflib import RDF, RDFS, Graph, Literal, URIRef
+from rdflib import RDF, RDFS, Dataset, Graph, Literal, URIRef
 
-from rdflib_endpoint import SparqlEndpoint
+from rdflib_endpoint import DatasetExt, SparqlEndpoint
 
 g = Graph(store="Oxigraph")
 g.add((URIRef("http://subject"), RDF.type, URIRef("http://object")))
@@ -10,6 +11,8 @@ g.add((URIRef("http://subject"), RDFS.label, Literal("test value")))
 
 app = SparqlEndpoint(graph=g)
 
+EX = "http://example.com/"
+
 endpoint = TestClient(app)
 
 
@@ -80,6 +83,106 @@ def test_bad_request():
     assert response.status_code == 400
 
 
+def test_native_queries():
+    ds = Dataset(store="Oxigraph", default_union=True)
+    memory_ds = Dataset(default_union=True)
+    for dataset in (ds, memory_ds):
+        dataset.graph(URIRef("http://graph")).add((URIRef("http://subject"), RDFS.label, Literal("in graph")))
+        dataset.add((URIRef("http://subject"), RDFS.label, Literal("in default")))
+    app = SparqlEndpoint(graph=ds)
+    native_endpoint = TestClient(app)
+    memory_endpoint = TestClient(SparqlEndpoint(graph=memory_ds))
+    query = "SELECT ?label WHERE { ?s rdfs:label ?label } ORDER BY ?label"
+    results = [
+        client.get("/", params={"query": query}, headers={"accept": "application/json"}).json()["results"]["bindings"]
+        for client in (native_endpoint, memory_endpoint)
+    ]
+    assert results[0] == results[1]
+    assert len(results[0]) == 2
+    assert native_endpoint.get("/metrics").json()["native_queries"] == 1
+
+    response = native_endpoint.get("/", params={"query": "ASK { ?s ?p ?o }"}, headers={"accept": "application/json"})
+    assert response.json()["boolean"] is True
+    response = native_endpoint.get("/", params={"query": label_construct}, headers={"accept": "text/turtle"})
+    assert response.headers["content-type"].startswith("text/turtle")
+    assert len(Graph().parse(data=response.text, format="turtle")) == 2
+    assert native_endpoint.get("/metrics").json()["native_queries"] == 3
+
+
+def test_custom_functions_not_native():
+    ds = DatasetExt(store="Oxigraph", default_union=True)
+    ds.add((URIRef("http://subject"), RDFS.label, Literal("a b")))
+
+    @ds.extension_function()
+    def split(input_str: str) -> list:
+        """Split a string."""
+        return input_str.split(" ")
+
+    native_endpoint = TestClient(SparqlEndpoint(graph=ds))
+    query = """PREFIX func: <urn:sparql-function:>
+    SELECT ?word WHERE { ?s rdfs:label ?label . BIND(func:split(?label) AS ?word) }"""
+    response = native_endpoint.get("/", params={"query": query}, headers={"accept": "application/json"})
+    assert sorted(row["word"]["value"] for row in response.json()["results"]["bindings"]) == ["a", "b"]
+    assert native_endpoint.get("/metrics").json()["native_queries"] == 0
+
+
+hybrid_queries = [
+    """SELECT ?s ?word WHERE {
+        ?s a ex:Person ; rdfs:label ?label ; ex:age ?age .
+        FILTER(?age > 30 && STRLEN(?label) > 3)
+        BIND(func:split(?label) AS ?word)
+    }""",
+    """SELECT ?s ?o ?age ?name WHERE {
+        ?s ex:knows ?o .
+        OPTIONAL { ?o ex:age ?age FILTER(?age IN (22, 25, 31)) }
+        BIND(func:split(STR(?o)) AS ?name)
+        ?o rdfs:label ?label
+    }""",
+    """SELECT ?s ?word ?graph WHERE {
+        { ?s ex:age 21 } UNION { ?s ex:age ?age FILTER(?age * 2 - 1 = 49) }
+        BIND(func:split(STR(?s)) AS ?word)
+        GRAPH ?g { ?s a ?c }
+        MINUS { ?s ex:knows ex:person0 }
+        BIND(CONCAT(STR(?g), "-", LANG("a"@en)) AS ?graph)
+    }""",
+]
+
+
+@pytest.mark.parametrize("query", hybrid_queries)
+def test_hybrid_queries(query: str) -> None:
+    results = []
+    for store in ("Oxigraph", "Memory"):
+        ds = DatasetExt(store=store, default_union=True)
+        people = ds.graph(URIRef(f"{EX}people"))
+        for i in range(12):
+            person = URIRef(f"{EX}person{i}")
+            people.add((person, RDF.type, URIRef(f"{EX}Person")))
+            people.add((person, RDFS.label, Literal(f"Person number {i}", lang="en")))
+            people.add((person, URIRef(f"{EX}age"), Literal(20 + i)))
+            if i % 3:
+                people.add((person, URIRef(f"{EX}knows"), URIRef(f"{EX}person{(i * 5) % 12}")))
+
+        @ds.extension_function()
+        def split(input_str: str) -> list:
+            """Split a string."""
+            return input_str.split(" ")
+
+        client = TestClient(SparqlEndpoint(graph=ds))
+        response = client.get(
+            "/",
+            params={"query": f"PREFIX func: <urn:sparql-function:> PREFIX ex: <{EX}> {query}"},
+            headers={"accept": "application/json"},
+        )
+        assert response.status_code == 200
+        bindings = response.json()["results"]["bindings"]
+        results.append(sorted(sorted((var, value["value"]) for var, value in row.items()) for row in bindings))
+        if store == "Oxigraph":
+            # The graph patterns without custom functions are evaluated by Oxigraph
+            assert client.get("/metrics").json()["native_subqueries"] > 0
+    assert results[0] == results[1]
+    assert results[0]
+
+
 label_select = """PREFIX rdfs: <http://www.w3.org/2000/01/rdf-schema#>
 SELECT ?label WHERE {
     ?s rdfs:label ?label .
@@ -2,14 +2,16 @@ from typing import Any, List, Tuple
 
 import pytest
 from fastapi.testclient import TestClient
-from rdflib import RDFS, Graph, Literal, URIRef, Variable
+from rdflib import RDFS, Dataset, Graph, Literal, URIRef, Variable
 from rdflib.plugins.sparql.evalutils import _eval
 from rdflib.plugins.sparql.parserutils import CompValue
 from rdflib.plugins.sparql.sparql import QueryContext
 
-from rdflib_endpoint import SparqlEndpoint
+from rdflib_endpoint import SparqlEndpoint, SparqlRouter
 from rdflib_endpoint.sparql_router import SD
 
+VOID_TRIPLES = URIRef("http://rdfs.org/ns/void#triples")
+
 # graph = Dataset(default_union=False)
 graph = Graph()
 
@@ -74,7 +76,7 @@ def test_service_description():
     g.parse(data=response.text, format="turtle")
     assert any(g.triples((None, SD.endpoint, None))), "Missing sd:endpoint in service description"
     assert any(g.triples((None, SD.extensionFunction, None))), "Missing sd:extensionFunction in service description"
-    assert len(list(g.triples((None, SD.extensionFunction, None)))) >= 1, "Expected at least 1 extension function"
+    assert len(list(g.triples((None, SD.extensionFunction, None)))) == 1, "Expected only the endpoint own function"
 
     # Check POST XML
     response = endpoint.post("/", headers={"accept": "application/xml"})
@@ -83,7 +85,22 @@ def test_service_description():
     g.parse(data=response.text, format="xml")
     assert any(g.triples((None, SD.endpoint, None))), "Missing sd:endpoint in service description"
     assert any(g.triples((None, SD.extensionFunction, None))), "Missing sd:extensionFunction in service description"
-    assert len(list(g.triples((None, SD.extensionFunction, None)))) >= 1, "Expected at least 1 extension function"
+    assert len(list(g.triples((None, SD.extensionFunction, None)))) == 1, "Expected only the endpoint own function"
+
+
+def test_service_description_named_graphs():
+    ds = Dataset()
+    ds.add((URIRef("http://example.com/s"), RDFS.label, Literal("default")))
+    for i in range(3):
+        ds.graph(URIRef(f"http://example.com/graph{i}")).add((URIRef("http://example.com/s"), RDFS.label, Literal(i)))
+    ds.graph(URIRef("http://example.com/graph2")).add((URIRef("http://example.com/s"), RDFS.comment, Literal("2")))
+    ds.graph(URIRef("http://example.com/empty"))
+    g = SparqlRouter(graph=ds).service_description
+    counts = {
+        g.value(named_graph, SD.name): g.value(g.value(named_graph, SD.graph), VOID_TRIPLES).toPython()
+        for named_graph in g.objects(None, SD.namedGraph)
+    }
+    assert counts == {URIRef(f"http://example.com/graph{i}"): 1 if i < 2 else 2 for i in range(3)}
 
 
 def test_custom_concat_json():
@@ -254,6 +271,25 @@ def test_bad_request():
     assert response.status_code == 400
 
 
+def test_batch_queries():
+    response = endpoint.post(
+        "/batch",
+        json=[concat_select, {"query": custom_concat_construct, "accept": "text/turtle"}, "figarofigarofigaro"],
+    )
+    assert response.status_code == 200
+    select_result, construct_result, bad_result = response.json()
+    assert select_result["status"] == 200
+    assert select_result["results"]["results"]["bindings"][0]["concat"]["value"] == "Firstlast"
+    assert select_result["seconds"] >= 0
+    assert construct_result["content_type"] == "text/turtle"
+    assert "Firstlast" in construct_result["results"]
+    assert bad_result["status"] == 400
+    assert "error" in bad_result
+
+    assert endpoint.post("/batch", json={"query": concat_select}).status_code == 400
+    assert endpoint.post("/batch", json=[{"accept": "text/csv"}]).status_code == 400
+
+
 concat_select = """PREFIX myfunctions: <urn:sparql-function:>
 SELECT ?concat ?concatLength WHERE {
     BIND("First" AS ?first)
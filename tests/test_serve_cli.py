@@ -4,6 +4,8 @@ import tempfile
 from unittest.mock import MagicMock, patch
 
 from click.testing import CliRunner
+from fastapi.testclient import TestClient
+from rdflib import Dataset, URIRef
 
 from rdflib_endpoint.__main__ import cli
 
@@ -52,6 +54,72 @@ def test_convert_oxigraph() -> None:
         os.remove(f)
 
 
+def test_convert_compact() -> None:
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        out_file = os.path.join(tmp_dir, "merged.trig")
+        result = runner.invoke(
+            cli,
+            [
+                "convert",
+                "--store",
+                "compact",
+                "tests/resources/test.nq",
+                "tests/resources/test2.ttl",
+                "--output",
+                out_file,
+            ],
+        )
+        assert result.exit_code == 0
+        g = Dataset()
+        g.parse(out_file, format="trig")
+        assert (
+            URIRef("http://test/s"),
+            URIRef("http://test/p"),
+            URIRef("http://test/o"),
+            URIRef("http://test/graph"),
+        ) in g
+
+
+def test_convert_stream() -> None:
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        out_file = os.path.join(tmp_dir, "merged.nt")
+        result = runner.invoke(cli, ["convert", "tests/resources/test.nq", "--output", out_file])
+        assert result.exit_code == 0
+        assert "Streamed a total of" in result.output
+        with open(out_file) as f:
+            assert f.read() == "<http://test/s> <http://test/p> <http://test/o> .\n"
+
+
+def test_convert_parallel() -> None:
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        out_file = os.path.join(tmp_dir, "merged.trig")
+        result = runner.invoke(
+            cli,
+            [
+                "convert",
+                "--jobs",
+                "2",
+                "tests/resources/test.nq",
+                "tests/resources/test2.ttl",
+                "tests/resources/another.jsonld",
+                "--output",
+                out_file,
+            ],
+        )
+        assert result.exit_code == 0
+        assert "triples/s" in result.output
+        g = Dataset()
+        g.parse(out_file, format="trig")
+        assert (
+            URIRef("http://test/s"),
+            URIRef("http://test/p"),
+            URIRef("http://test/o"),
+            URIRef("http://test/graph"),
+        ) in g
+        assert len(list(g.quads((URIRef("http://another/s"), None, None, None)))) == 1
+        assert len(list(g.quads((URIRef("http://test2/s"), None, None, None)))) == 1
+
+
 # NOTE: Needs to run last tests, for some reason patching uvicorn as a side effects on follow up tests
 
 
@@ -87,3 +155,77 @@ def test_serve_oxigraph(mock_run: MagicMock) -> None:
         ],
     )
     assert result.exit_code == 0
+
+
+@patch("rdflib_endpoint.__main__.uvicorn.run")
+def test_serve_snapshot(mock_run: MagicMock) -> None:
+    """Test serve twice with a snapshot dir, the second start should load from the snapshot"""
+    mock_run.return_value = None
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        args = ["serve", "--snapshot-dir", tmp_dir, "tests/resources/test.nq", "tests/resources/test2.ttl"]
+        result = runner.invoke(cli, args)
+        assert result.exit_code == 0
+        assert "snapshot" not in result.output
+        result = runner.invoke(cli, args)
+        assert result.exit_code == 0
+        assert "loaded from snapshot" in result.output
+
+
+@patch("rdflib_endpoint.__main__.uvicorn.run")
+def test_serve_index(mock_run: MagicMock) -> None:
+    """Test converting files to an index file, and serving it with the memory-mapped store"""
+    mock_run.return_value = None
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        index_file = os.path.join(tmp_dir, "data.rdfidx")
+        result = runner.invoke(
+            cli, ["convert", "tests/resources/test.nq", "tests/resources/test2.ttl", "--output", index_file]
+        )
+        assert result.exit_code == 0
+        total = result.output.splitlines()[-1]
+        result = runner.invoke(cli, ["serve", index_file])
+        assert result.exit_code == 0
+        assert "Memory-mapped index file" in result.output
+        assert result.output.splitlines()[-1] == total
+
+
+@patch("rdflib_endpoint.__main__.uvicorn.run")
+def test_serve_background(mock_run: MagicMock) -> None:
+    """Test serve loading the files in the background"""
+    mock_run.return_value = None
+    result = runner.invoke(cli, ["serve", "--background", "tests/resources/test.nq", "tests/resources/test2.ttl"])
+    assert result.exit_code == 0
+    assert "in the background" in result.output
+
+    result = runner.invoke(cli, ["serve", "--serve-partial", "tests/resources/test.nq"])
+    assert result.exit_code == 2
+    assert "--serve-partial requires --background" in result.output
+    with tempfile.NamedTemporaryFile(suffix=".rdfidx") as index_file:
+        result = runner.invoke(cli, ["serve", "--background", index_file.name])
+        assert result.exit_code == 2
+
+
+@patch("rdflib_endpoint.__main__.uvicorn.run")
+def test_serve_watch(mock_run: MagicMock) -> None:
+    """Test serve watching the files for changes"""
+    mock_run.return_value = None
+    result = runner.invoke(cli, ["serve", "--watch", "tests/resources/test.nq", "tests/resources/test2.ttl"])
+    assert result.exit_code == 0
+    assert "Loaded a total of" in result.output
+
+    for option in (["--background"], ["--snapshot-dir", "snapshots"]):
+        result = runner.invoke(cli, ["serve", "--watch", *option, "tests/resources/test.nq"])
+        assert result.exit_code == 2
+        assert "--watch cannot be combined" in result.output
+    with tempfile.NamedTemporaryFile(suffix=".rdfidx") as index_file:
+        result = runner.invoke(cli, ["serve", "--watch", index_file.name])
+        assert result.exit_code == 2
+
+
+@patch("rdflib_endpoint.__main__.uvicorn.run")
+def test_serve_void(mock_run: MagicMock) -> None:
+    """Test serve with VoID statistics"""
+    mock_run.return_value = None
+    result = runner.invoke(cli, ["serve", "--void", "tests/resources/test.nq", "tests/resources/test2.ttl"])
+    assert result.exit_code == 0
+    response = TestClient(mock_run.call_args[0][0]).get("/.well-known/void")
+    assert response.status_code == 200
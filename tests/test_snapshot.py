@@ -0,0 +1,42 @@
+import os
+import shutil
+import tempfile
+
+from rdflib import XSD, BNode, Dataset, Literal, URIRef
+
+from rdflib_endpoint.snapshot import iter_snapshot_quads, load_with_snapshot, snapshot_path, write_snapshot
+
+files = ["tests/resources/test.nq", "tests/resources/test2.ttl"]
+
+
+def test_snapshot_roundtrip() -> None:
+    graph = URIRef("http://test/graph")
+    quads = [
+        (URIRef("http://s"), URIRef("http://p"), Literal("hello\nworld", lang="en"), graph),
+        (URIRef("http://s"), URIRef("http://p"), Literal("42", datatype=XSD.integer), graph),
+        (BNode("b0"), URIRef("http://p"), Literal("plain \x1f value"), URIRef("urn:x-rdflib:default")),
+    ]
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        path = os.path.join(tmp_dir, "test.rdfsnap")
+        assert write_snapshot(path, quads, {}) == 3
+        assert list(iter_snapshot_quads(path)) == quads
+
+
+def test_load_with_snapshot() -> None:
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        snapshot_dir = os.path.join(tmp_dir, "snapshots")
+        source_files = [shutil.copy(file, tmp_dir) for file in files]
+        g = Dataset(default_union=True)
+        assert not load_with_snapshot(g, source_files, snapshot_dir)
+        assert os.path.exists(snapshot_path(snapshot_dir, source_files))
+
+        g_snapshot = Dataset(default_union=True)
+        assert load_with_snapshot(g_snapshot, source_files, snapshot_dir)
+        assert set(g_snapshot.quads()) == set(g.quads())
+
+        # Changing a source file invalidates the snapshot
+        with open(source_files[1], "a") as f:
+            f.write("<http://test2/s2> <http://test2/p> <http://test2/o> .\n")
+        g_changed = Dataset(default_union=True)
+        assert not load_with_snapshot(g_changed, source_files, snapshot_dir)
+        assert (URIRef("http://test2/s2"), URIRef("http://test2/p"), URIRef("http://test2/o")) in g_changed
@@ -0,0 +1,102 @@
+import tracemalloc
+
+from fastapi.testclient import TestClient
+from rdflib import Literal, URIRef, Variable
+from rdflib.plugins.sparql.sparql import FrozenDict
+
+from rdflib_endpoint import DatasetExt, SparqlEndpoint, spill
+from rdflib_endpoint.spill import external_sort
+
+ds = DatasetExt(default_union=True)
+for i in range(200):
+    subject = URIRef(f"http://example.com/s{i}")
+    ds.add((subject, URIRef("http://example.com/group"), Literal(i % 7)))
+    if i % 3:
+        ds.add((subject, URIRef("http://example.com/label"), Literal(f"label {i % 11}")))
+
+calls = []
+
+
+@ds.extension_function()
+def double(value: int) -> int:
+    """Double a value."""
+    calls.append(value)
+    return int(value) * 2
+
+
+@ds.extension_function()
+def numbers(count: int):
+    """Generate numbers up to count."""
+    yield from range(int(count))
+
+
+def select(client: TestClient, query: str) -> list[dict]:
+    response = client.get("/", params={"query": query}, headers={"accept": "application/json"})
+    assert response.status_code == 200
+    return response.json()["results"]["bindings"]
+
+
+def test_order_by_memory_budget():
+    query = """SELECT ?s ?group ?label WHERE {
+        ?s <http://example.com/group> ?group .
+        OPTIONAL { ?s <http://example.com/label> ?label }
+    } ORDER BY DESC(?group) ?label"""
+    expected = select(TestClient(SparqlEndpoint(graph=ds)), query)
+    # A few solutions per sorted file
+    client = TestClient(SparqlEndpoint(graph=ds, memory_budget=2000))
+    assert select(client, query) == expected
+    assert select(client, f"{query} LIMIT 5 OFFSET 10") == expected[10:15]
+
+
+def test_external_sort():
+    x = Variable("x")
+    values = [FrozenDict({x: Literal(i % 10), Variable("i"): Literal(i)}) for i in range(100)]
+    sorted_values = list(external_sort(values, key=lambda s: s[x], max_bytes=1000))
+    # The sort is stable, like sorted
+    assert sorted_values == sorted(values, key=lambda s: s[x])
+
+
+def test_external_sort_merge_within_budget(monkeypatch):
+    x = Variable("x")
+    runs = []
+
+    class RecordedRun(spill._SortedRun):
+        def __init__(self, solutions):
+            super().__init__(solutions)
+            runs.append(self)
+
+    monkeypatch.setattr(spill, "_SortedRun", RecordedRun)
+    values = [FrozenDict({x: Literal(i)}) for i in range(1050)]
+    size = spill.estimate_size(values[0])
+    sorted_values = list(external_sort(reversed(values), key=lambda s: s[x], max_bytes=100 * size))
+    assert sorted_values == values
+    # The last solutions are written as a run too, the batches read by the merge fit in the budget
+    assert sum(run.count for run in runs) == len(values)
+    assert sum(run.read_batch for run in runs) * size <= 100 * size
+
+
+def test_extension_function_lazy():
+    calls.clear()
+    query = """PREFIX func: <urn:sparql-function:>
+    SELECT ?s ?doubled WHERE {
+        ?s <http://example.com/group> ?group .
+        BIND(func:double(?group) AS ?doubled)
+    } LIMIT 3"""
+    assert len(select(TestClient(SparqlEndpoint(graph=ds)), query)) == 3
+    assert len(calls) < 200
+
+
+def test_generator_function_memory_budget():
+    query = """PREFIX func: <urn:sparql-function:>
+    SELECT ?n WHERE { BIND(func:numbers(20000) AS ?n) } ORDER BY DESC(?n) LIMIT 3"""
+    peaks = []
+    for budget in (None, 50_000):
+        client = TestClient(SparqlEndpoint(graph=ds, memory_budget=budget))
+        tracemalloc.start()
+        try:
+            assert [row["n"]["value"] for row in select(client, query)] == ["19999", "19998", "19997"]
+            peaks.append(tracemalloc.get_traced_memory()[1])
+        finally:
+            tracemalloc.stop()
+    # The results of the generator are streamed to the sort, which keeps them within the budget
+    assert peaks[1] < peaks[0] / 4
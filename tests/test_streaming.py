@@ -0,0 +1,47 @@
+import gzip
+import os
+import tempfile
+
+from rdflib import BNode, Dataset, Literal, URIRef
+
+from rdflib_endpoint.streaming import can_stream, stream_convert
+
+nt_content = """<http://test/s> <http://test/p> "multi\\nline"@en .
+# comment
+_:b0 <http://test/p> <http://test/o> .
+"""
+nq_content = """<http://test/s> <http://test/p> <http://test/o> <http://test/graph> .
+_:b0 <http://test/p> "1"^^<http://www.w3.org/2001/XMLSchema#integer> .
+"""
+
+
+def test_can_stream() -> None:
+    assert can_stream(["a.nt", "b.nq.gz"], "out.nq.gz")
+    assert not can_stream(["a.nt", "b.ttl"], "out.nq")
+    assert not can_stream(["a.nt"], "out.ttl")
+
+
+def test_stream_convert() -> None:
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        nt_file, nq_file = os.path.join(tmp_dir, "a.nt"), os.path.join(tmp_dir, "b.nq.gz")
+        with open(nt_file, "w") as f:
+            f.write(nt_content)
+        with gzip.open(nq_file, "wt") as f:
+            f.write(nq_content)
+        converted = []
+        out_file = os.path.join(tmp_dir, "out.nq.gz")
+        assert stream_convert([nt_file, nq_file], out_file, on_converted=converted.append) == 4
+        assert [loaded.triples for loaded in converted] == [2, 2]
+
+        g = Dataset()
+        with gzip.open(out_file, "rt") as f:
+            g.parse(data=f.read(), format="nquads")
+        assert (
+            URIRef("http://test/s"),
+            URIRef("http://test/p"),
+            URIRef("http://test/o"),
+            URIRef("http://test/graph"),
+        ) in g
+        assert (URIRef("http://test/s"), URIRef("http://test/p"), Literal("multi\nline", lang="en")) in g
+        # Blank nodes with the same label in different files stay distinct
+        assert len({s for s in g.subjects() if isinstance(s, BNode)}) == 2
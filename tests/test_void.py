@@ -0,0 +1,111 @@
+from pathlib import Path
+from typing import Any
+
+import pytest
+from fastapi.testclient import TestClient
+from rdflib import RDF, Dataset, Graph, Literal, URIRef
+from rdflib.plugins.sparql import prepareUpdate
+
+import rdflib_endpoint  # noqa: F401, registers the Compact store plugin
+from rdflib_endpoint import SparqlEndpoint
+from rdflib_endpoint.void import VOID, VoidStatistics
+
+EX = "http://example.com/"
+
+nquads = f"""<{EX}alice> <{RDF.type}> <{EX}Person> <{EX}g1> .
+<{EX}alice> <{EX}name> "Alice" <{EX}g1> .
+<{EX}alice> <{EX}knows> <{EX}bob> <{EX}g1> .
+<{EX}bob> <{RDF.type}> <{EX}Person> <{EX}g1> .
+<{EX}bob> <{EX}name> "Bob" <{EX}g1> .
+<{EX}bob> <{RDF.type}> <{EX}Person> <{EX}g2> .
+<{EX}acme> <{RDF.type}> <{EX}Company> .
+<{EX}acme> <{EX}name> "ACME" .
+"""
+
+updates = [
+    f'INSERT DATA {{ GRAPH <{EX}g2> {{ <{EX}carol> a <{EX}Person> ; <{EX}name> "Carol" . <{EX}bob> a <{EX}Person> }} }}',
+    f"INSERT DATA {{ GRAPH <{EX}g2> {{ <{EX}acme> a <{EX}Company> }} }}",
+    f"DELETE DATA {{ GRAPH <{EX}g1> {{ <{EX}alice> a <{EX}Person> }} }}",
+    f"DELETE DATA {{ <{EX}acme> a <{EX}Company> }}",
+    f"DELETE {{ ?s <{EX}knows> ?o }} INSERT {{ ?o <{EX}knows> ?s }} WHERE {{ GRAPH ?g {{ ?s <{EX}knows> ?o }} }}",
+    f"CLEAR GRAPH <{EX}g1>",
+    f"INSERT {{ GRAPH <{EX}g3> {{ ?s a <{EX}Agent> }} }} WHERE {{ ?s a <{EX}Person> }}",
+    f"ADD <{EX}g2> TO <{EX}g3>",
+    f"MOVE <{EX}g3> TO <{EX}g4>",
+    f"DROP GRAPH <{EX}g2>",
+    f"LOAD <{Path('tests/resources/test2.ttl').absolute().as_uri()}> INTO GRAPH <{EX}g5>",
+    f"DELETE WHERE {{ GRAPH <{EX}g5> {{ ?s ?p ?o }} }} ; CLEAR DEFAULT",
+]
+
+
+def build_dataset(store: str = "default") -> Dataset:
+    ds = Dataset(store=store, default_union=True)
+    ds.parse(data=nquads, format="nquads")
+    return ds
+
+
+def summary(statistics: VoidStatistics) -> Any:
+    return (
+        statistics.triples,
+        len(statistics.subjects),
+        len(statistics.objects),
+        statistics.class_partitions(),
+        statistics.property_partitions(),
+    )
+
+
+def test_compute_statistics() -> None:
+    statistics = VoidStatistics.from_graph(build_dataset())
+    assert statistics.triples == 8
+    assert len(statistics.subjects) == 3
+    assert len(statistics.objects) == 6
+    assert statistics.class_partitions() == {URIRef(f"{EX}Person"): 2, URIRef(f"{EX}Company"): 1}
+    assert statistics.property_partitions() == {RDF.type: 4, URIRef(f"{EX}name"): 3, URIRef(f"{EX}knows"): 1}
+
+
+@pytest.mark.parametrize("store", ["default", "Compact", "Oxigraph"])
+def test_apply_update(store: str, monkeypatch: pytest.MonkeyPatch) -> None:
+    ds = build_dataset(store)
+    statistics = VoidStatistics.from_graph(ds)
+    # The statistics are updated from the statements changed, without scanning the dataset again
+    monkeypatch.setattr(statistics, "compute", None)
+    for update in updates:
+        statistics.apply_update(ds, prepareUpdate(update))
+        assert summary(statistics) == summary(VoidStatistics.from_graph(ds)), update
+
+
+def test_void_endpoint() -> None:
+    ds = build_dataset()
+    client = TestClient(SparqlEndpoint(graph=ds, enable_update=True, void_statistics=True))
+
+    response = client.get("/.well-known/void")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/turtle")
+    void = Graph().parse(data=response.text, format="turtle")
+    dataset_node = next(void.subjects(RDF.type, VOID.Dataset))
+    assert void.value(dataset_node, VOID.triples) == Literal(8)
+    assert void.value(dataset_node, VOID.classes) == Literal(2)
+    partitions = {
+        void.value(partition, VOID["class"]): void.value(partition, VOID.entities).toPython()
+        for partition in void.objects(dataset_node, VOID.classPartition)
+    }
+    assert partitions == {URIRef(f"{EX}Person"): 2, URIRef(f"{EX}Company"): 1}
+
+    response = client.post("/", data={"update": updates[0]})
+    assert response.status_code == 204
+    response = client.get("/", headers={"accept": "text/turtle"})
+    sd = Graph().parse(data=response.text, format="turtle")
+    dataset_node = next(sd.subjects(RDF.type, VOID.Dataset))
+    assert sd.value(dataset_node, VOID.triples) == Literal(10)
+    assert len(list(sd.objects(dataset_node, VOID.triples))) == 1
+
+    response = client.get("/.well-known/void", headers={"accept": "application/rdf+xml"})
+    assert response.headers["content-type"].startswith("application/rdf+xml")
+    void = Graph().parse(data=response.text, format="xml")
+    assert (None, VOID.triples, Literal(10)) in void
+
+
+def test_void_endpoint_path() -> None:
+    client = TestClient(SparqlEndpoint(graph=build_dataset(), path="/sparql", void_statistics=True))
+    assert client.get("/sparql/.well-known/void").status_code == 200
+    assert client.get("/.well-known/void").status_code == 404
@@ -0,0 +1,118 @@
+import os
+import tempfile
+import time
+from array import array
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from rdflib import RDF, Dataset, Graph, Literal, URIRef
+
+from rdflib_endpoint import SparqlEndpoint, SparqlRouter
+from rdflib_endpoint.void import VOID
+from rdflib_endpoint.watcher import FileWatcher
+
+shared = "<http://test/shared> <http://test/p> <http://test/o> .\n"
+
+
+def write(path: str, content: str) -> None:
+    with open(path, "w") as f:
+        f.write(content)
+
+
+def test_file_watcher_reload() -> None:
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        file_a, file_b = os.path.join(tmp_dir, "a.nt"), os.path.join(tmp_dir, "b.nt")
+        write(file_a, shared + "<http://test/a> <http://test/p> <http://test/o> .\n")
+        write(file_b, shared)
+        g = Dataset(default_union=True)
+        watcher = FileWatcher(g, [file_a, file_b])
+        watcher.load()
+        assert len(g) == 2
+        assert watcher.changed_files() == []
+
+        # The shared triple is still provided by b.nt
+        write(file_a, "<http://test/a2> <http://test/p> <http://test/o> .\n")
+        assert watcher.changed_files() == [file_a]
+        reload = watcher.reload(file_a)
+        assert (reload.added, reload.removed) == (1, 1)
+        assert (URIRef("http://test/shared"), URIRef("http://test/p"), URIRef("http://test/o")) in g
+        assert (URIRef("http://test/a"), URIRef("http://test/p"), URIRef("http://test/o")) not in g
+
+        os.remove(file_b)
+        reload = watcher.reload(file_b)
+        assert reload.removed == 1
+        assert len(g) == 1
+
+
+def test_file_watcher_hash_collision() -> None:
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        file_a, file_b = os.path.join(tmp_dir, "a.nt"), os.path.join(tmp_dir, "b.nt")
+        write(file_a, "<http://test/a> <http://test/p> <http://test/o> .\n")
+        write(file_b, shared)
+        g = Dataset(default_union=True)
+        watcher = FileWatcher(g, [file_a, file_b])
+        watcher.load()
+        # b.nt seems to provide the quads of a.nt when their hashes collide, its previous parse tells it does not
+        watcher._provenance[file_b] = array("q", sorted([*watcher._provenance[file_a], *watcher._provenance[file_b]]))
+        write(file_a, "")
+        reload = watcher.reload(file_a)
+        assert (reload.added, reload.removed) == (0, 1)
+        assert len(g) == 1
+
+
+def test_endpoint_watch() -> None:
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        file = os.path.join(tmp_dir, "data.nq")
+        write(file, "<http://test/s> <http://test/p> <http://test/o> <http://test/graph> .\n")
+        g = Dataset(default_union=True)
+        watcher = FileWatcher(g, [file], interval=0.05)
+        watcher.load()
+        query = "SELECT (COUNT(*) AS ?count) WHERE { ?s ?p ?o }"
+        with TestClient(SparqlEndpoint(graph=g, watcher=watcher)) as endpoint:
+            write(file, "<http://test/s> <http://test/p> <http://test/o2> <http://test/graph2> .\n")
+            for _ in range(100):
+                if watcher.reloads:
+                    break
+                time.sleep(0.05)
+            response = endpoint.get("/", params={"query": query}, headers={"accept": "application/json"})
+            assert response.json()["results"]["bindings"][0]["count"]["value"] == "1"
+            for _ in range(100):
+                description = endpoint.get("/", headers={"accept": "text/turtle"}).text
+                if "<http://test/graph2>" in description:
+                    break
+                time.sleep(0.05)
+            assert "<http://test/graph2>" in description
+            assert "<http://test/graph>" not in description
+
+
+def test_endpoint_watch_void_statistics() -> None:
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        file = os.path.join(tmp_dir, "data.nt")
+        write(file, shared + '<http://test/s> <http://test/name> "S" .\n')
+        g = Dataset(default_union=True)
+        watcher = FileWatcher(g, [file], interval=0.05)
+        watcher.load()
+        router = SparqlRouter(graph=g, watcher=watcher, void_statistics=True)
+        app = FastAPI()
+        app.include_router(router)
+        with TestClient(app) as endpoint:
+            assert router.statistics is not None
+            # The statistics are updated from the reloaded quads, without scanning the dataset again
+            router.statistics.compute = None  # type: ignore[assignment,method-assign]
+            write(
+                file,
+                shared
+                + f'<http://test/s2> <http://test/name> "S2" .\n<http://test/s2> <{RDF.type}> <http://test/C> .\n',
+            )
+            for _ in range(100):
+                void = Graph().parse(data=endpoint.get("/.well-known/void").text, format="turtle")
+                if void.value(predicate=VOID.triples, object=Literal(3)) is not None:
+                    break
+                time.sleep(0.05)
+            assert void.value(predicate=VOID.triples, object=Literal(3)) is not None
+            assert router.statistics.property_partitions() == {
+                URIRef("http://test/p"): 1,
+                URIRef("http://test/name"): 1,
+                RDF.type: 1,
+            }
+            assert set(router.statistics.subjects) == {URIRef("http://test/shared"), URIRef("http://test/s2")}